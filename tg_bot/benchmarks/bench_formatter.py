@@ -0,0 +1,109 @@
+"""
+Микробенчмарк форматирования уведомлений.
+
+Измеряет стоимость форматирования одного события для каждой пары (таблица, действие)
+из wal-listener/config.yml. Сравниваются старый вариант (async-метод с цепочкой
+if/elif и выводом payload в stdout) и табличный MessageFormatter.
+
+Запуск из корня репозитория:
+    TELEGRAM_BOT_TOKEN=123:abc python -m tg_bot.benchmarks.bench_formatter
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from tg_bot.formatter import formatter
+
+FIELDS = {"promo_offer": "title", "promo_category": "name", "promo_city": "name", "promo_partner": "name"}
+
+
+def make_event(table, action):
+    field = FIELDS[table]
+    new = {"id": 1, field: "Новое значение"}
+    old = {"id": 1, field: "Старое значение"}
+    if action == "INSERT":
+        return {"action": action, "table": table, "data": new, "dataOld": {}}
+    if action == "UPDATE":
+        return {"action": action, "table": table, "data": new, "dataOld": old}
+    return {"action": action, "table": table, "data": {}, "dataOld": old}
+
+
+async def legacy_format_message(data):
+    """Старое форматирование: цепочка if/elif и вывод payload"""
+    print(f"Форматирование сообщения: {data}")
+    action = data["action"]
+    table = data["table"]
+    print(f"Действие: {action}, Таблица: {table}")
+
+    if table == "promo_category":
+        if action == "INSERT":
+            return f"🆕 Новая категория: {data['data']['name']}"
+        elif action == "UPDATE":
+            return f"📝 Обновлена категория: {data.get('dataOld', {}).get('name', '')} → {data['data']['name']}"
+        elif action == "DELETE":
+            return f"❌ Удалена категория: {data.get('dataOld', {}).get('name', 'Неизвестная категория')}"
+    elif table == "promo_offer":
+        if action == "INSERT":
+            return f"🆕 Новое предложение: {data['data']['title']}"
+        elif action == "UPDATE":
+            return f"📝 Обновлено предложение: {data.get('dataOld', {}).get('title', '')} → {data['data']['title']}"
+        elif action == "DELETE":
+            return f"❌ Удалено предложение: {data.get('dataOld', {}).get('title', 'Неизвестное предложение')}"
+    elif table == "promo_city":
+        if action == "INSERT":
+            return f"🏙️ Новый город: {data['data']['name']}"
+        elif action == "UPDATE":
+            return f"📝 Обновлен город: {data.get('dataOld', {}).get('name', '')} → {data['data']['name']}"
+        elif action == "DELETE":
+            return f"❌ Удален город: {data.get('dataOld', {}).get('name', 'Неизвестный город')}"
+    elif table == "promo_partner":
+        if action == "INSERT":
+            return f"🤝 Новый партнер: {data['data']['name']}"
+        elif action == "UPDATE":
+            return f"📝 Обновлен партнер: {data.get('dataOld', {}).get('name', '')} → {data['data']['name']}"
+        elif action == "DELETE":
+            return f"❌ Удален партнер: {data.get('dataOld', {}).get('name', 'Неизвестный партнер')}"
+    return f"Изменение в {table}: {action}"
+
+
+async def measure_legacy(event, iterations):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await legacy_format_message(event)
+        return time.perf_counter() - start
+
+
+async def legacy_format_message_quiet(event):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await legacy_format_message(event)
+
+
+def measure_table(event, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        formatter.format(event)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000, help="число форматирований для каждого события")
+    args = parser.parse_args()
+
+    print(f"Стоимость форматирования одного события, мкс ({args.iterations} итераций)")
+    print(f"{'таблица':>15} {'действие':>8} {'legacy':>8} {'table':>8} {'ускорение':>10}")
+    for table in FIELDS:
+        for action in ("INSERT", "UPDATE", "DELETE"):
+            event = make_event(table, action)
+            assert asyncio.run(legacy_format_message_quiet(event)) == formatter.format(event)
+            legacy = asyncio.run(measure_legacy(event, args.iterations)) / args.iterations * 1e6
+            table_driven = measure_table(event, args.iterations) / args.iterations * 1e6
+            print(f"{table:>15} {action:>8} {legacy:8.2f} {table_driven:8.2f} {legacy / table_driven:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Бенчмарк задержки обработчиков бота под нагрузкой из Kafka.
+
+Имитирует диспетчер aiogram задачей, которая каждые 10 мс "обрабатывает команду",
+и измеряет, насколько позже запланированного она реально выполняется, пока
+параллельно идет чтение из Kafka. Сравниваются старый вариант (poll прямо в event
+loop) и текущий TelegramKafkaConsumer (poll в отдельном потоке).
+
+Запуск из корня репозитория:
+    TELEGRAM_BOT_TOKEN=123:abc python -m tg_bot.benchmarks.bench_handler_latency
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+from unittest.mock import patch
+
+from tg_bot.kafka_consumer import TelegramKafkaConsumer
+from tg_bot.subscription_store import FileSubscriptionStore
+
+
+class FakeTopicPartition:
+    def __init__(self, topic):
+        self.topic = topic
+
+
+class FakeRecord:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeKafkaConsumer:
+    """Имитация KafkaConsumer: poll блокирует поток на poll_ms и возвращает пачку сообщений"""
+
+    def __init__(self, *args, poll_ms=200, batch_size=50, **kwargs):
+        self.poll_ms = poll_ms
+        self.batch_size = batch_size
+        self.tp = FakeTopicPartition("wal_listener.promo_offers")
+
+    def subscription(self):
+        return {self.tp.topic}
+
+    def poll(self, timeout_ms=1000):
+        time.sleep(self.poll_ms / 1000)
+        records = [
+            FakeRecord({"action": "INSERT", "table": "promo_offer", "data": {"id": i, "title": f"Акция {i}"}})
+            for i in range(self.batch_size)
+        ]
+        return {self.tp: records}
+
+    def close(self):
+        pass
+
+
+class FakeRegistry:
+    def __init__(self, user_ids):
+        self._user_ids = frozenset(user_ids)
+
+    def user_ids(self):
+        return self._user_ids
+
+
+class FakeBot:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(0.001)
+
+
+async def measure_handler_lag(duration, interval=0.01):
+    """Имитирует обработку команд и возвращает задержки их выполнения (в мс)"""
+    lags = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        scheduled = time.monotonic() + interval
+        await asyncio.sleep(interval)
+        lags.append((time.monotonic() - scheduled) * 1000)
+    return lags
+
+
+async def legacy_process_messages(consumer):
+    """Старый цикл обработки: синхронный poll прямо в event loop"""
+    while True:
+        messages = consumer.consumer.poll(timeout_ms=1000)
+        for tp, msgs in messages.items():
+            for message in msgs:
+                text = consumer.format_message(message)
+                async for user_ids in consumer.subscriptions.iter_user_ids():
+                    consumer.delivery.broadcast(user_ids, text)
+        await asyncio.sleep(0.1)
+
+
+async def run(mode, duration, poll_ms, batch_size, subscribers):
+    fake_kafka = lambda *a, **kw: FakeKafkaConsumer(poll_ms=poll_ms, batch_size=batch_size)  # noqa: E731
+    with (
+        patch("tg_bot.kafka_consumer.KafkaConsumer", fake_kafka),
+        patch("tg_bot.kafka_consumer.Bot", FakeBot),
+        patch("tg_bot.kafka_consumer.OUTBOX_PATH", ":memory:"),
+    ):
+        with contextlib.redirect_stdout(io.StringIO()):
+            consumer = TelegramKafkaConsumer([])
+        consumer.subscriptions = FileSubscriptionStore(FakeRegistry(range(subscribers)))
+
+        if mode == "legacy":
+            await consumer.delivery.start()
+            task = asyncio.create_task(legacy_process_messages(consumer))
+        else:
+            task = asyncio.create_task(consumer.process_messages())
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            lags = await measure_handler_lag(duration)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await consumer.delivery.stop()
+            consumer.close()
+    return lags
+
+
+def report(mode, lags):
+    lags = sorted(lags)
+    p = lambda q: lags[min(len(lags) - 1, int(len(lags) * q))]  # noqa: E731
+    print(
+        f"{mode:>8}: handlers={len(lags):5d}  p50={statistics.median(lags):7.2f} мс  "
+        f"p95={p(0.95):7.2f} мс  p99={p(0.99):7.2f} мс  max={lags[-1]:7.2f} мс"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="длительность замера для каждого режима, с")
+    parser.add_argument("--poll-ms", type=int, default=200, help="время блокировки одного poll, мс")
+    parser.add_argument("--batch-size", type=int, default=50, help="сообщений в одной пачке из Kafka")
+    parser.add_argument("--subscribers", type=int, default=100, help="число подписчиков")
+    args = parser.parse_args()
+
+    print(f"Задержка обработчиков (poll={args.poll_ms} мс, пачка={args.batch_size}, подписчиков={args.subscribers})")
+    for mode in ("legacy", "async"):
+        lags = asyncio.run(run(mode, args.duration, args.poll_ms, args.batch_size, args.subscribers))
+        report(mode, lags)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,12 @@ from dotenv import load_dotenv
 from tg_bot.config import TELEGRAM_BOT_TOKEN
 from tg_bot.db_utils import get_all_subscribed_users, load_subscribers, save_subscribers
 from tg_bot.handlers.common import router as common_router
+from tg_bot.handlers.filters import router as filters_router
 from tg_bot.handlers.subscription import router as subscription_router
 from tg_bot.kafka_consumer import TelegramKafkaConsumer
+from tg_bot.log import setup_logging
+from tg_bot.metrics import start_metrics_server
+from tg_bot.subscription_store import subscriptions
 from tg_bot.keyboards.reply import get_main_keyboard
 
 SUBSCRIBERS_FILE = "subscribers.txt"
@@ -20,7 +24,8 @@ subscribed_users = load_subscribers()
 
 load_dotenv()  # чтобы переменные из .env подхватились
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Получаем токен из переменных окружения
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -36,14 +41,18 @@ async def main():
     # Подключаем роутеры
     dp.include_router(common_router)
     dp.include_router(subscription_router)
+    dp.include_router(filters_router)
 
-    print("Бот запущен...")
-    
-    # Инициализируем Kafka consumer
-    kafka_consumer = TelegramKafkaConsumer(subscribed_users)
-    
-    # Запускаем обе задачи параллельно
+    logger.info("Бот запущен...")
+    metrics_server = start_metrics_server()
+
+    # Запускаем обработку команд сразу, не дожидаясь подключения к Kafka
     polling_task = asyncio.create_task(dp.start_polling(bot))
+
+    # Инициализируем Kafka consumer в отдельном потоке: повторные попытки
+    # подключения используют time.sleep и не должны блокировать event loop
+    loop = asyncio.get_running_loop()
+    kafka_consumer = await loop.run_in_executor(None, TelegramKafkaConsumer, subscribed_users)
     kafka_task = asyncio.create_task(kafka_consumer.process_messages())
     
     try:
@@ -53,12 +62,15 @@ async def main():
         kafka_task.cancel()
         await asyncio.gather(polling_task, kafka_task, return_exceptions=True)
     finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
         await bot.session.close()
-        kafka_consumer.consumer.close()
+        await subscriptions.close()
+        kafka_consumer.close()
 
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("Бот остановлен")
+        logger.info("Бот остановлен")
@@ -0,0 +1,142 @@
+import itertools
+import time
+
+from tg_bot.config import COALESCE_DIGEST_THRESHOLD, COALESCE_MAX_EVENTS, COALESCE_WINDOW
+
+# Подписи для сводки: (таблица, действие) -> формы для 1, 2-4 и 5+ объектов
+DIGEST_LABELS = {
+    ("promo_offer", "INSERT"): ("новое предложение", "новых предложения", "новых предложений"),
+    ("promo_offer", "UPDATE"): ("обновленное предложение", "обновленных предложения", "обновленных предложений"),
+    ("promo_offer", "DELETE"): ("удаленное предложение", "удаленных предложения", "удаленных предложений"),
+    ("promo_category", "INSERT"): ("новая категория", "новые категории", "новых категорий"),
+    ("promo_category", "UPDATE"): ("обновленная категория", "обновленные категории", "обновленных категорий"),
+    ("promo_category", "DELETE"): ("удаленная категория", "удаленные категории", "удаленных категорий"),
+    ("promo_city", "INSERT"): ("новый город", "новых города", "новых городов"),
+    ("promo_city", "UPDATE"): ("обновленный город", "обновленных города", "обновленных городов"),
+    ("promo_city", "DELETE"): ("удаленный город", "удаленных города", "удаленных городов"),
+    ("promo_partner", "INSERT"): ("новый партнер", "новых партнера", "новых партнеров"),
+    ("promo_partner", "UPDATE"): ("обновленный партнер", "обновленных партнера", "обновленных партнеров"),
+    ("promo_partner", "DELETE"): ("удаленный партнер", "удаленных партнера", "удаленных партнеров"),
+}
+
+
+def plural(count, forms):
+    """Выбирает форму слова для числа по правилам русского языка."""
+    if count % 10 == 1 and count % 100 != 11:
+        return forms[0]
+    if 2 <= count % 10 <= 4 and not 12 <= count % 100 <= 14:
+        return forms[1]
+    return forms[2]
+
+
+def merge_events(first, second):
+    """
+    Объединяет два события об одной и той же строке.
+    Возвращает итоговое событие или None, если изменения взаимно уничтожились
+    (строка была создана и удалена в пределах одного окна).
+    """
+    actions = (first["action"], second["action"])
+    if actions == ("INSERT", "DELETE"):
+        return None
+    if actions == ("INSERT", "UPDATE"):
+        return {**second, "action": "INSERT", "dataOld": {}}
+    if actions == ("UPDATE", "UPDATE"):
+        return {**second, "dataOld": first.get("dataOld", {})}
+    if actions == ("DELETE", "INSERT"):
+        return {**second, "action": "UPDATE", "dataOld": first.get("dataOld", {})}
+    return second
+
+
+class CoalescedEvent:
+    """Событие после объединения; как и сообщение Kafka, хранит данные в value."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class EventCoalescer:
+    """
+    Группирует события WAL по (таблица, первичный ключ) в пределах временного окна.
+
+    Повторные изменения одной строки схлопываются в одно событие. Если после
+    окна событий больше digest_threshold, вместо отдельных уведомлений
+    отправляется одна сводка ("12 новых предложений, 3 обновленных партнера").
+    """
+
+    def __init__(
+        self, window=COALESCE_WINDOW, max_events=COALESCE_MAX_EVENTS, digest_threshold=COALESCE_DIGEST_THRESHOLD
+    ):
+        self.window = window
+        self.max_events = max_events
+        self.digest_threshold = digest_threshold
+        self._events = {}
+        self._opened_at = None
+        self._anonymous = itertools.count()
+
+    def __len__(self):
+        return len(self._events)
+
+    def _key(self, data):
+        row = data.get("data") or data.get("dataOld") or {}
+        if "id" in row:
+            return (data.get("table"), row["id"])
+        # Без первичного ключа событие не с чем объединять
+        return (data.get("table"), "anonymous", next(self._anonymous))
+
+    def add(self, data):
+        """Добавляет событие WAL (словарь из сообщения Kafka) в текущее окно."""
+        if self._opened_at is None:
+            self._opened_at = time.monotonic()
+        key = self._key(data)
+        previous = self._events.pop(key, None)
+        merged = data if previous is None else merge_events(previous, data)
+        if merged is not None:
+            self._events[key] = merged
+
+    @property
+    def pending(self):
+        """Есть ли открытое окно (даже если все события в нем взаимно уничтожились)."""
+        return self._opened_at is not None
+
+    def time_left(self):
+        """Сколько секунд осталось до закрытия окна (None, если окно не открыто)."""
+        if self._opened_at is None:
+            return None
+        return max(0.0, self._opened_at + self.window - time.monotonic())
+
+    def ready(self):
+        """Пора ли закрывать окно."""
+        if self._opened_at is None:
+            return False
+        return len(self._events) >= self.max_events or self.time_left() == 0
+
+    def drain(self):
+        """Закрывает окно и возвращает объединенные события в порядке поступления."""
+        events = [CoalescedEvent(data) for data in self._events.values()]
+        self._events = {}
+        self._opened_at = None
+        return events
+
+    def needs_digest(self, events):
+        return len(events) > self.digest_threshold
+
+    def digest(self, events):
+        """Формирует одно сводное сообщение для набора событий."""
+        counts = {}
+        for event in events:
+            key = (event.value.get("table"), event.value.get("action"))
+            counts[key] = counts.get(key, 0) + 1
+
+        parts = []
+        other = 0
+        for key, count in counts.items():
+            forms = DIGEST_LABELS.get(key)
+            if forms is None:
+                other += count
+            else:
+                parts.append(f"{count} {plural(count, forms)}")
+        if other:
+            parts.append(f"{other} {plural(other, ('другое изменение', 'других изменения', 'других изменений'))}")
+        return "📋 Сводка изменений: " + ", ".join(parts)
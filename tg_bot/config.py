@@ -7,3 +7,55 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not TELEGRAM_BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN не найден в переменных окружения")
+
+# Параметры рассылки уведомлений подписчикам
+DELIVERY_CONCURRENCY = int(os.getenv("DELIVERY_CONCURRENCY", "20"))
+DELIVERY_RATE_LIMIT = float(os.getenv("DELIVERY_RATE_LIMIT", "30"))
+DELIVERY_PER_CHAT_INTERVAL = float(os.getenv("DELIVERY_PER_CHAT_INTERVAL", "1"))
+DELIVERY_MAX_RETRIES = int(os.getenv("DELIVERY_MAX_RETRIES", "3"))
+DELIVERY_REPORT_INTERVAL = float(os.getenv("DELIVERY_REPORT_INTERVAL", "30"))
+
+# Параметры чтения из Kafka
+KAFKA_POLL_TIMEOUT_MS = int(os.getenv("KAFKA_POLL_TIMEOUT_MS", "1000"))
+KAFKA_BATCH_QUEUE_SIZE = int(os.getenv("KAFKA_BATCH_QUEUE_SIZE", "100"))
+
+# Как часто (в секундах) проверять файл подписчиков на изменения
+SUBSCRIBERS_CHECK_INTERVAL = float(os.getenv("SUBSCRIBERS_CHECK_INTERVAL", "1"))
+
+# Хранилище подписок: "file" (subscribers.txt) или "postgres" (таблица TelegramSubscription)
+SUBSCRIPTION_BACKEND = os.getenv("SUBSCRIPTION_BACKEND", "file")
+SUBSCRIPTION_POOL_MIN_SIZE = int(os.getenv("SUBSCRIPTION_POOL_MIN_SIZE", "1"))
+SUBSCRIPTION_POOL_MAX_SIZE = int(os.getenv("SUBSCRIPTION_POOL_MAX_SIZE", "10"))
+SUBSCRIPTION_BATCH_SIZE = int(os.getenv("SUBSCRIPTION_BATCH_SIZE", "500"))
+SUBSCRIPTION_FLUSH_INTERVAL = float(os.getenv("SUBSCRIPTION_FLUSH_INTERVAL", "0.05"))
+SUBSCRIPTION_STREAM_BATCH_SIZE = int(os.getenv("SUBSCRIPTION_STREAM_BATCH_SIZE", "1000"))
+
+# Подключение к базе данных Django (те же переменные, что и в ufanet_project/.env)
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = int(os.getenv("DB_PORT") or "5432")
+
+# Персистентная очередь исходящих уведомлений (SQLite)
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", os.path.join(os.path.dirname(__file__), "outbox.sqlite3"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_FLUSH_INTERVAL = float(os.getenv("OUTBOX_FLUSH_INTERVAL", "0.5"))
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", "86400"))
+
+# Объединение событий WAL: окно (с), максимум событий в окне и порог, после которого отправляется сводка
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "3"))
+COALESCE_MAX_EVENTS = int(os.getenv("COALESCE_MAX_EVENTS", "1000"))
+COALESCE_DIGEST_THRESHOLD = int(os.getenv("COALESCE_DIGEST_THRESHOLD", "5"))
+
+# Логирование: уровень, формат ("text" или "json") и доля записей, которые пишутся
+# для частых событий горячего пути (каждое сообщение из Kafka, каждая отправка)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Адрес эндпоинта метрик Prometheus (как monitoring.promAddr в wal-listener); пустая строка - отключить
+METRICS_ADDR = os.getenv("METRICS_ADDR", ":2113")
+
+# Как часто (в секундах) Kafka consumer перечитывает фильтры подписок из хранилища
+ROUTING_REFRESH_INTERVAL = float(os.getenv("ROUTING_REFRESH_INTERVAL", "30"))
@@ -1,6 +1,8 @@
 import os
 
 SUBSCRIBERS_FILE = os.path.join(os.path.dirname(__file__), "subscribers.txt")
+# Фильтры подписок для файлового хранилища: строки "user_id вид id_объекта"
+FILTERS_FILE = os.path.join(os.path.dirname(__file__), "subscription_filters.txt")
 
 
 def get_all_subscribed_users():
@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from tg_bot.config import (
+    DELIVERY_CONCURRENCY,
+    DELIVERY_MAX_RETRIES,
+    DELIVERY_PER_CHAT_INTERVAL,
+    DELIVERY_RATE_LIMIT,
+    DELIVERY_REPORT_INTERVAL,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_FLUSH_INTERVAL,
+)
+from tg_bot.log import SAMPLED
+from tg_bot.metrics import DELIVERY_QUEUE_DEPTH, FANOUT_LAG_SECONDS, SEND_ERRORS, SEND_SECONDS, SENT_MESSAGES
+from tg_bot.outbox import DELIVERED, FAILED
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Глобальный ограничитель скорости отправки (token bucket).
+    По умолчанию настроен на лимит Telegram ~30 сообщений в секунду.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """
+        Приостанавливает выдачу токенов (например, после RetryAfter).
+        Время паузы не копит токены: после нее bucket наполняется с нуля со скоростью rate.
+        """
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = self._paused_until
+
+    async def acquire(self):
+        """Ожидает, пока не освободится токен на отправку одного сообщения."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DeliveryEngine:
+    """
+    Движок рассылки уведомлений подписчикам.
+
+    Сообщения ставятся в очередь и отправляются пулом воркеров с ограничением
+    параллелизма, глобальным token bucket и паузой между сообщениями в один чат.
+    Постановка в очередь не блокирует обработку следующих событий из Kafka.
+
+    Если передан outbox, сообщения забираются из персистентной очереди пачками,
+    а результаты доставки записываются обратно (at-least-once: после сбоя могут
+    повториться только сообщения, результат которых еще не был сохранен).
+    """
+
+    def __init__(
+        self,
+        bot,
+        concurrency=DELIVERY_CONCURRENCY,
+        rate_limit=DELIVERY_RATE_LIMIT,
+        per_chat_interval=DELIVERY_PER_CHAT_INTERVAL,
+        max_retries=DELIVERY_MAX_RETRIES,
+        report_interval=DELIVERY_REPORT_INTERVAL,
+        outbox=None,
+        claim_batch_size=OUTBOX_BATCH_SIZE,
+        flush_interval=OUTBOX_FLUSH_INTERVAL,
+    ):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.bucket = TokenBucket(rate_limit)
+        self.queue = asyncio.Queue()
+        self.outbox = outbox
+        self.claim_batch_size = claim_batch_size
+        self.flush_interval = flush_interval
+        self._workers = []
+        self._background = []
+        self._wakeup = asyncio.Event()
+        self._last_claimed_id = 0
+        self._results = []
+        self._chat_ready_at = {}
+        self._delayed = 0
+        self._sent_times = deque(maxlen=10000)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    async def start(self):
+        """Запускает воркеры рассылки."""
+        if self.running:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        DELIVERY_QUEUE_DEPTH.set_function(self.queue_depth)
+        if self.report_interval:
+            self._background.append(asyncio.create_task(self._report_loop()))
+        if self.outbox is not None:
+            # После перезапуска очередь outbox читается с начала: недоставленные сообщения досылаются
+            self._last_claimed_id = 0
+            self._background.append(asyncio.create_task(self._feed_loop()))
+            self._background.append(asyncio.create_task(self._flush_loop()))
+
+    async def stop(self):
+        """Останавливает воркеры. Неотправленные сообщения остаются в очереди (и в outbox)."""
+        tasks = self._workers + self._background
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._background = []
+        if self.outbox is not None:
+            await self._flush_results()
+
+    def notify(self):
+        """Сообщает, что в outbox появились новые сообщения."""
+        self._wakeup.set()
+
+    def broadcast(self, user_ids, text):
+        """Ставит сообщение в очередь для каждого получателя. Возвращает число получателей."""
+        count = 0
+        created_at = time.time()
+        for user_id in user_ids:
+            self.queue.put_nowait((user_id, text, 0, None, created_at))
+            count += 1
+        return count
+
+    async def join(self):
+        """Ожидает, пока очередь не будет полностью разобрана (включая отложенные сообщения)."""
+        while True:
+            await self.queue.join()
+            if not self._delayed:
+                return
+            await asyncio.sleep(0.01)
+
+    def queue_depth(self):
+        """Количество сообщений, ожидающих отправки (включая отложенные)."""
+        return self.queue.qsize() + self._delayed
+
+    def throughput(self, window=10.0):
+        """Средняя скорость отправки (сообщений в секунду) за последние window секунд."""
+        border = time.monotonic() - window
+        recent = sum(1 for ts in self._sent_times if ts >= border)
+        return recent / window
+
+    def stats(self):
+        """Сводная статистика рассылки."""
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "queue_depth": self.queue_depth(),
+            "throughput": round(self.throughput(), 2),
+        }
+
+    def _requeue_later(self, delay, item):
+        """Возвращает сообщение в очередь через delay секунд, не занимая воркер."""
+        self._delayed += 1
+
+        def _put():
+            self._delayed -= 1
+            self.queue.put_nowait(item)
+
+        asyncio.get_running_loop().call_later(delay, _put)
+
+    def _chat_delay(self, chat_id, now):
+        """Сколько ещё нужно подождать перед следующим сообщением в этот чат."""
+        ready_at = self._chat_ready_at.get(chat_id)
+        if ready_at is None or ready_at <= now:
+            return 0
+        return ready_at - now
+
+    def _mark_chat(self, chat_id, now):
+        self._chat_ready_at[chat_id] = now + self.per_chat_interval
+        if len(self._chat_ready_at) > 100000:
+            self._chat_ready_at = {cid: ts for cid, ts in self._chat_ready_at.items() if ts > now}
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                status = await self._deliver(item)
+                if status is not None and item[3] is not None:
+                    self._results.append((item[3], status))
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, item):
+        """Отправляет одно сообщение. Возвращает итоговый статус или None, если сообщение отложено."""
+        chat_id, text, attempt, delivery_id, created_at = item
+        delay = self._chat_delay(chat_id, time.monotonic())
+        if delay:
+            self._requeue_later(delay, item)
+            return None
+
+        await self.bucket.acquire()
+        self._mark_chat(chat_id, time.monotonic())
+        started = time.perf_counter()
+        try:
+            await self.bot.send_message(chat_id, text)
+        except Exception as e:
+            SEND_SECONDS.observe(time.perf_counter() - started)
+            SEND_ERRORS.labels(type(e).__name__).inc()
+            return self._handle_send_error(e, item)
+        SEND_SECONDS.observe(time.perf_counter() - started)
+        self.sent += 1
+        self._sent_times.append(time.monotonic())
+        SENT_MESSAGES.inc()
+        FANOUT_LAG_SECONDS.observe(max(0.0, time.time() - created_at))
+        return DELIVERED
+
+    def _handle_send_error(self, error, item):
+        """Решает, что делать с неотправленным сообщением: отложить повтор или считать недоставленным."""
+        chat_id, text, attempt, delivery_id, created_at = item
+        if isinstance(error, TelegramRetryAfter):
+            logger.warning("Telegram просит подождать %s с (пользователь %s)", error.retry_after, chat_id)
+            self.bucket.pause(error.retry_after)
+            self.retried += 1
+            self._requeue_later(error.retry_after, item)
+            return None
+        if isinstance(error, TelegramForbiddenError):
+            # Пользователь заблокировал бота - повторять бессмысленно
+            self.failed += 1
+            logger.info("Пользователь %s недоступен: %s", chat_id, error, extra=SAMPLED)
+            return FAILED
+        if isinstance(error, (TelegramNetworkError, TelegramServerError)) and attempt < self.max_retries:
+            self.retried += 1
+            self._requeue_later(2**attempt, (chat_id, text, attempt + 1, delivery_id, created_at))
+            return None
+        self.failed += 1
+        logger.warning("Ошибка отправки сообщения пользователю %s: %s", chat_id, error, extra=SAMPLED)
+        return FAILED
+
+    async def _feed_loop(self):
+        """Забирает недоставленные сообщения из outbox пачками, пока очередь не переполнена"""
+        low_watermark = max(self.claim_batch_size, self.concurrency)
+        while True:
+            if self.queue.qsize() >= low_watermark:
+                await asyncio.sleep(0.05)
+                continue
+            self._wakeup.clear()
+            rows = await self.outbox.claim(self._last_claimed_id, self.claim_batch_size)
+            if rows:
+                self._last_claimed_id = rows[-1][0]
+                for delivery_id, user_id, text, created_at in rows:
+                    self.queue.put_nowait((user_id, text, 0, delivery_id, created_at))
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush_results(self):
+        results, self._results = self._results, []
+        try:
+            await self.outbox.mark(results)
+        except Exception:
+            self._results = results + self._results
+            raise
+
+    async def _flush_loop(self):
+        """Периодически сохраняет результаты доставки в outbox и удаляет старые уведомления"""
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._flush_results()
+                if time.monotonic() - last_purge > 60:
+                    await self.outbox.purge()
+                    last_purge = time.monotonic()
+            except Exception as e:
+                logger.error("Ошибка записи результатов доставки: %s", e)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            if self.queue_depth() or self.throughput():
+                stats = self.stats()
+                logger.info("Статистика рассылки: %s", stats, extra=stats)
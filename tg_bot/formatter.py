@@ -0,0 +1,84 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _new_values(data):
+    return data["data"]
+
+
+def _old_values(data):
+    return data.get("dataOld") or {}
+
+
+def entity_renderers(field, inserted, updated, deleted, unknown):
+    """
+    Создает рендеры INSERT/UPDATE/DELETE для таблицы, у которой в уведомлении выводится одно поле.
+    Шаблоны компилируются один раз: в словаре хранятся связанные методы str.format.
+    """
+    render_inserted = f"{inserted}: {{}}".format
+    render_updated = f"{updated}: {{}} → {{}}".format
+    render_deleted = f"{deleted}: {{}}".format
+
+    return {
+        "INSERT": lambda data: render_inserted(_new_values(data)[field]),
+        "UPDATE": lambda data: render_updated(_old_values(data).get(field, ""), _new_values(data)[field]),
+        "DELETE": lambda data: render_deleted(_old_values(data).get(field, unknown)),
+    }
+
+
+class MessageFormatter:
+    """
+    Форматирование событий WAL в текст уведомлений.
+
+    Рендеры хранятся в словаре по ключу (таблица, действие), поэтому выбор
+    шаблона - один поиск в словаре вместо цепочки if/elif. Рендер получает
+    словарь события и возвращает строку; новые таблицы подключаются через register.
+    """
+
+    def __init__(self):
+        self._renderers = {}
+
+    def register(self, table, action, renderer):
+        """Регистрирует рендер для пары (таблица, действие)."""
+        self._renderers[(table, action)] = renderer
+
+    def register_table(self, table, renderers):
+        """Регистрирует рендеры таблицы: словарь действие -> рендер."""
+        for action, renderer in renderers.items():
+            self.register(table, action, renderer)
+
+    def format(self, data):
+        """Возвращает текст уведомления для события WAL (словарь из сообщения Kafka)."""
+        table = data["table"]
+        action = data["action"]
+        renderer = self._renderers.get((table, action))
+        if renderer is None:
+            return f"Изменение в {table}: {action}"
+        try:
+            return renderer(data)
+        except Exception as e:
+            logger.warning("Ошибка при форматировании сообщения %s/%s: %s", table, action, e)
+            return f"Произошло изменение в {table}: {action}"
+
+
+# Таблицы, изменения которых wal-listener отправляет в Kafka (wal-listener/config.yml)
+formatter = MessageFormatter()
+formatter.register_table(
+    "promo_category",
+    entity_renderers("name", "🆕 Новая категория", "📝 Обновлена категория", "❌ Удалена категория", "Неизвестная категория"),
+)
+formatter.register_table(
+    "promo_offer",
+    entity_renderers(
+        "title", "🆕 Новое предложение", "📝 Обновлено предложение", "❌ Удалено предложение", "Неизвестное предложение"
+    ),
+)
+formatter.register_table(
+    "promo_city",
+    entity_renderers("name", "🏙️ Новый город", "📝 Обновлен город", "❌ Удален город", "Неизвестный город"),
+)
+formatter.register_table(
+    "promo_partner",
+    entity_renderers("name", "🤝 Новый партнер", "📝 Обновлен партнер", "❌ Удален партнер", "Неизвестный партнер"),
+)
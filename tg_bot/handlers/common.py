@@ -21,6 +21,9 @@ async def cmd_help(message: Message):
     Доступные команды:
     /start - Начать работу с ботом
     /help - Показать это сообщение
+    /city, /category, /partner - Получать уведомления только по выбранным городам, категориям или партнерам
+    /filters - Показать фильтры
+    /reset_filters - Сбросить фильтры
 
     Кнопки:
     📝 Подписаться на уведомления - Подписаться на уведомления
@@ -37,6 +40,9 @@ async def help_button(message: Message):
     Доступные команды:
     /start - Начать работу с ботом
     /help - Показать это сообщение
+    /city, /category, /partner - Получать уведомления только по выбранным городам, категориям или партнерам
+    /filters - Показать фильтры
+    /reset_filters - Сбросить фильтры
 
     Кнопки:
     📝 Подписаться на уведомления - Подписаться на уведомления
@@ -0,0 +1,118 @@
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message
+from tg_bot.keyboards import get_filter_keyboard
+from tg_bot.routing import routing
+from tg_bot.subscription_store import subscriptions
+
+router = Router()
+
+# Вид фильтра -> (название в сообщениях, заголовок списка)
+KIND_LABELS = {
+    "city": ("город", "Города"),
+    "category": ("категория", "Категории"),
+    "partner": ("партнер", "Партнеры"),
+}
+
+
+async def toggle_filter(user_id, kind, object_id):
+    """Включает фильтр, если его не было, иначе выключает. Возвращает True, если фильтр включен."""
+    await routing.refresh(subscriptions)
+    if object_id in routing.filters(user_id).get(kind, ()):
+        await subscriptions.remove_filter(user_id, kind, object_id)
+        routing.remove(user_id, kind, object_id)
+        return False
+    await subscriptions.add_filter(user_id, kind, object_id)
+    routing.add(user_id, kind, object_id)
+    return True
+
+
+async def choose_filter(message: Message, command: CommandObject, kind):
+    user_id = message.from_user.id
+    label, title = KIND_LABELS[kind]
+
+    if not await subscriptions.is_subscribed(user_id):
+        await message.answer("Сначала подпишитесь на уведомления!")
+        return
+
+    if command.args:
+        if not command.args.strip().isdigit():
+            await message.answer(f"Укажите id: /{kind} 5")
+            return
+        object_id = int(command.args.strip())
+        enabled = await toggle_filter(user_id, kind, object_id)
+        action = "добавлен в фильтр" if enabled else "удален из фильтра"
+        await message.answer(f"{label.capitalize()} {object_id} {action}.")
+        return
+
+    objects = await subscriptions.catalog(kind)
+    if not objects:
+        await message.answer(f"Укажите id: /{kind} 5")
+        return
+    await routing.refresh(subscriptions)
+    selected = routing.filters(user_id).get(kind, set())
+    await message.answer(
+        f"{title}: выберите, о чем присылать уведомления", reply_markup=get_filter_keyboard(kind, objects, selected)
+    )
+
+
+@router.message(Command("city"))
+async def choose_city(message: Message, command: CommandObject):
+    """Обработчик выбора городов"""
+    await choose_filter(message, command, "city")
+
+
+@router.message(Command("category"))
+async def choose_category(message: Message, command: CommandObject):
+    """Обработчик выбора категорий"""
+    await choose_filter(message, command, "category")
+
+
+@router.message(Command("partner"))
+async def choose_partner(message: Message, command: CommandObject):
+    """Обработчик выбора партнеров"""
+    await choose_filter(message, command, "partner")
+
+
+@router.callback_query(F.data.startswith("filter:"))
+async def filter_button(callback: CallbackQuery):
+    """Обработчик кнопок клавиатуры фильтров"""
+    parts = callback.data.split(":")
+    user_id = callback.from_user.id
+    if len(parts) != 3 or parts[1] not in KIND_LABELS or not parts[2].isdigit():
+        await callback.answer("Неизвестная кнопка: откройте список фильтров заново.")
+        return
+
+    # Старая клавиатура остается в чате и после отписки
+    if not await subscriptions.is_subscribed(user_id):
+        await callback.answer("Сначала подпишитесь на уведомления!")
+        return
+
+    _, kind, object_id = parts
+    enabled = await toggle_filter(user_id, kind, int(object_id))
+    await callback.answer("Фильтр включен" if enabled else "Фильтр выключен")
+
+    objects = await subscriptions.catalog(kind)
+    selected = routing.filters(user_id).get(kind, set())
+    await callback.message.edit_reply_markup(reply_markup=get_filter_keyboard(kind, objects, selected))
+
+
+@router.message(Command("filters"))
+async def show_filters(message: Message):
+    """Обработчик просмотра фильтров"""
+    await routing.refresh(subscriptions)
+    filters = routing.filters(message.from_user.id)
+    if not filters:
+        await message.answer("Фильтров нет: вы получаете все уведомления.")
+        return
+    lines = [f"{KIND_LABELS[kind][1]}: {', '.join(map(str, sorted(ids)))}" for kind, ids in sorted(filters.items())]
+    await message.answer("Ваши фильтры:\n" + "\n".join(lines))
+
+
+@router.message(Command("reset_filters"))
+async def reset_filters(message: Message):
+    """Обработчик сброса фильтров"""
+    user_id = message.from_user.id
+    await subscriptions.clear_filters(user_id)
+    routing.remove_user(user_id)
+    await message.answer("Фильтры сброшены: вы будете получать все уведомления.")
@@ -1,7 +1,7 @@
-import asyncio
 from aiogram import F, Router
 from aiogram.types import Message
-from tg_bot.db_utils import load_subscribers, save_subscribers
+from tg_bot.routing import routing
+from tg_bot.subscription_store import subscriptions
 
 router = Router()
 
@@ -10,14 +10,13 @@ router = Router()
 async def subscribe_to_notifications(message: Message):
     """Обработчик подписки на уведомления"""
     user_id = message.from_user.id
-    subscribed_users = load_subscribers()
 
-    if user_id in subscribed_users:
+    if not await subscriptions.subscribe(user_id, message.from_user.username):
         await message.answer("Вы уже подписаны на уведомления!")
         return
+    # Фильтры, сохраненные до отписки, снова начинают действовать
+    routing.invalidate()
 
-    subscribed_users.add(user_id)
-    save_subscribers(subscribed_users)
     await message.answer("Вы подписались на уведомления о новых акциях и предложениях!")
 
 
@@ -25,12 +24,10 @@ async def subscribe_to_notifications(message: Message):
 async def unsubscribe_from_notifications(message: Message):
     """Обработчик отписки от уведомлений"""
     user_id = message.from_user.id
-    subscribed_users = load_subscribers()
 
-    if user_id not in subscribed_users:
+    if not await subscriptions.unsubscribe(user_id):
         await message.answer("Вы не были подписаны на уведомления!")
         return
+    routing.remove_user(user_id)
 
-    subscribed_users.remove(user_id)
-    save_subscribers(subscribed_users)
     await message.answer("Вы отписались от уведомлений о новых акциях и предложениях.")
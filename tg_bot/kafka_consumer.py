@@ -1,29 +1,49 @@
 import asyncio
+import functools
+import hashlib
 import json
+import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from aiogram import Bot
-from kafka import KafkaConsumer
+from kafka import KafkaConsumer, OffsetAndMetadata
 from kafka.errors import NoBrokersAvailable
 
-from tg_bot.config import TELEGRAM_BOT_TOKEN
-from tg_bot.db_utils import get_all_subscribed_users
+from tg_bot.coalescer import EventCoalescer
+from tg_bot.config import KAFKA_BATCH_QUEUE_SIZE, KAFKA_POLL_TIMEOUT_MS, OUTBOX_PATH, TELEGRAM_BOT_TOKEN
+from tg_bot.delivery import DeliveryEngine
+from tg_bot.formatter import formatter
+from tg_bot.log import SAMPLED
+from tg_bot.metrics import FORMAT_SECONDS, KAFKA_MESSAGES, KAFKA_POLL_SECONDS
+from tg_bot.outbox import DeliveryOutbox
+from tg_bot.routing import routing
+from tg_bot.subscription_store import subscriptions
+
+logger = logging.getLogger(__name__)
 
 
 class TelegramKafkaConsumer:
     def __init__(self, _):
-        print("Инициализация бота...")
+        logger.info("Инициализация бота...")
         self.bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        print("Подключение к Kafka...")
+        self.outbox = DeliveryOutbox(OUTBOX_PATH)
+        self.delivery = DeliveryEngine(self.bot, outbox=self.outbox)
+        self.batches = asyncio.Queue(maxsize=KAFKA_BATCH_QUEUE_SIZE)
+        self.coalescer = EventCoalescer()
+        self._pending_offsets = {}
+        self._kafka_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-poller")
+        logger.info("Подключение к Kafka...")
         self.consumer = self._connect_to_kafka()
-        print("Бот инициализирован")
-        self.get_subscribers = get_all_subscribed_users
+        logger.info("Бот инициализирован")
+        self.subscriptions = subscriptions
+        self.routing = routing
 
     def _connect_to_kafka(self, max_retries=30, retry_delay=1):
         """Подключение к Kafka с повторными попытками"""
         for attempt in range(max_retries):
             try:
-                print(f"Попытка подключения к Kafka (попытка {attempt + 1}/{max_retries})...")
+                logger.info("Попытка подключения к Kafka (попытка %d/%d)...", attempt + 1, max_retries)
                 consumer = KafkaConsumer(
                     'wal_listener.promo_categories',
                     'wal_listener.promo_offers',
@@ -31,7 +51,8 @@ class TelegramKafkaConsumer:
                     'wal_listener.partners',
                     bootstrap_servers='kafka:9092',
                     auto_offset_reset='earliest',
-                    enable_auto_commit=True,
+                    # Offset коммитится вручную после сохранения уведомлений в outbox
+                    enable_auto_commit=False,
                     group_id='telegram_bot_group',
                     value_deserializer=lambda x: json.loads(x.decode('utf-8')),
                     session_timeout_ms=30000,
@@ -39,127 +60,225 @@ class TelegramKafkaConsumer:
                     max_poll_interval_ms=300000,
                     request_timeout_ms=305000,
                 )
-                print("Успешное подключение к Kafka!")
+                logger.info("Успешное подключение к Kafka")
                 return consumer
             except NoBrokersAvailable:
                 if attempt < max_retries - 1:
-                    print(f"Не удалось подключиться к Kafka. Повторная попытка через {retry_delay} секунд...")
+                    logger.warning("Не удалось подключиться к Kafka. Повторная попытка через %s с...", retry_delay)
                     time.sleep(retry_delay)
                 else:
-                    print("Превышено максимальное количество попыток подключения к Kafka")
+                    logger.error("Превышено максимальное количество попыток подключения к Kafka")
                     raise
 
-    async def format_message(self, message):
+    def format_message(self, message):
         """Форматирование сообщения для Telegram"""
-        print(f"Форматирование сообщения: {message.value}")
-        data = message.value
-        action = data["action"]
-        table = data["table"]
+        with FORMAT_SECONDS.time():
+            return formatter.format(message.value)
+
+    async def _run_in_kafka_thread(self, func, *args, **kwargs):
+        """
+        Выполняет блокирующий вызов kafka-python в выделенном потоке.
+        Все обращения к KafkaConsumer идут через один поток, т.к. он не потокобезопасен.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._kafka_executor, functools.partial(func, *args, **kwargs))
+
+    async def _poll_loop(self):
+        """Читает пачки сообщений из Kafka в отдельном потоке и передает их в очередь"""
+        while True:
+            try:
+                with KAFKA_POLL_SECONDS.time():
+                    messages = await self._run_in_kafka_thread(self.consumer.poll, timeout_ms=KAFKA_POLL_TIMEOUT_MS)
+            except Exception as e:
+                logger.error("Ошибка при получении сообщений: %s", e)
+                # Пробуем переподключиться, не блокируя event loop
+                try:
+                    self.consumer = await self._run_in_kafka_thread(self._connect_to_kafka)
+                except Exception as reconnect_error:
+                    logger.error("Ошибка при переподключении: %s", reconnect_error)
+                    await asyncio.sleep(5)
+                continue
+
+            if messages:
+                # Если обработчик не успевает, ожидание освобождения очереди притормаживает чтение
+                await self.batches.put(messages)
+
+    async def _handle_loop(self):
+        """Обрабатывает пачки сообщений из очереди и закрывает окна объединения событий по таймеру"""
+        while True:
+            try:
+                messages = await asyncio.wait_for(self.batches.get(), timeout=self.coalescer.time_left())
+            except asyncio.TimeoutError:
+                await self._flush_coalesced()
+                continue
+            try:
+                await self._handle_batch(messages)
+            except Exception as e:
+                logger.exception("Ошибка обработки пачки сообщений: %s", e)
+            finally:
+                self.batches.task_done()
+
+    async def _handle_batch(self, messages):
+        read = {(tp.topic, tp.partition): (msgs[0].offset, msgs[-1].offset) for tp, msgs in messages.items() if msgs}
+        processed = await self._processed_ranges(read)
+        for tp, msgs in messages.items():
+            KAFKA_MESSAGES.labels(tp.topic).inc(len(msgs))
+            logger.debug("Получены сообщения из топика %s: %d", tp.topic, len(msgs), extra=SAMPLED)
+            ranges = processed.get((tp.topic, tp.partition), ())
+            for message in msgs:
+                if any(first <= message.offset <= last for first, last in ranges):
+                    # Сообщение уже вошло в сохраненное окно, но offset не был закоммичен (сбой или ребалансировка)
+                    continue
+                try:
+                    self.coalescer.add(message.value)
+                except Exception as e:
+                    logger.warning("Ошибка обработки сообщения: %s", e, extra={"payload": message.value})
+            if msgs:
+                first_offset = self._pending_offsets.get(tp, (msgs[0].offset, None))[0]
+                self._pending_offsets[tp] = (first_offset, msgs[-1].offset)
+
+        # Если все сообщения уже были обработаны, окно не открывается, и offset коммитится сразу
+        if self.coalescer.ready() or (self._pending_offsets and not self.coalescer.pending):
+            await self._flush_coalesced()
+
+    async def _flush_coalesced(self):
+        """Закрывает окно объединения: ставит уведомления в очередь рассылки и коммитит offset"""
+        events = self.coalescer.drain()
+        offsets, self._pending_offsets = self._pending_offsets, {}
+        # Идентификатор окна для ключей уведомлений; от повторной рассылки после сбоя защищают
+        # сохраненные вместе с уведомлениями диапазоны offset (см. _processed_ranges)
+        source = ",".join(
+            f"{tp.topic}:{tp.partition}:{first}-{last}"
+            for tp, (first, last) in sorted(offsets.items(), key=lambda item: (item[0].topic, item[0].partition))
+        )
+        notifications = []
+        if events:
+            notifications = await self._notifications(source, events)
+        await self._enqueue_window(notifications, {(tp.topic, tp.partition): r for tp, r in offsets.items()})
+
+        # Offset коммитится только после того, как уведомления сохранены в outbox
+        await self._commit({tp: OffsetAndMetadata(last + 1, "") for tp, (first, last) in offsets.items()})
 
-        print(f"Действие: {action}, Таблица: {table}")
+    async def _notifications(self, source, events):
+        """Уведомления окна: [(ключ, текст, получатели)] - сводки и отдельные сообщения о событиях."""
+        unfiltered, routes = await self._recipients(events)
+        notifications = []
 
+        # Получатели каждого события, которым оно отправляется отдельным сообщением
+        individual = {}
+        if self.coalescer.needs_digest(events):
+            logger.info("Объединено %d событий в сводку", len(events))
+            notifications.append((f"digest:{source}", self.coalescer.digest(events), unfiltered))
+        elif unfiltered:
+            individual = {index: list(unfiltered) for index in range(len(events))}
+
+        # Пользователи с фильтрами получают только подходящие события, а при их большом числе - свою сводку
+        groups = {}
+        for user_id, indices in routes.items():
+            groups.setdefault(tuple(indices), []).append(user_id)
+        for indices, user_ids in groups.items():
+            if self.coalescer.needs_digest(indices):
+                key = hashlib.sha1(",".join(map(str, indices)).encode()).hexdigest()[:12]
+                digest = self.coalescer.digest([events[index] for index in indices])
+                notifications.append((f"digest:{source}:{key}", digest, user_ids))
+            else:
+                for index in indices:
+                    individual.setdefault(index, []).extend(user_ids)
+
+        for index, user_ids in sorted(individual.items()):
+            event = events[index]
+            try:
+                formatted_message = self.format_message(event)
+            except Exception as e:
+                logger.warning("Ошибка обработки сообщения: %s", e, extra={"payload": event.value})
+                continue
+            notifications.append((f"{source}#{index}", formatted_message, user_ids))
+        return notifications
+
+    async def _recipients(self, events):
+        """
+        Возвращает подписчиков без фильтров (получают все события) и маршруты
+        подписчиков с фильтрами: {user_id: [индексы подходящих событий]}.
+        При ошибке хранилища повторяет попытку: пропустить события нельзя, иначе их offset будет закоммичен.
+        """
+        while True:
+            try:
+                await self.routing.refresh(self.subscriptions)
+                filtered = self.routing.filtered_users
+                unfiltered = []
+                async for batch in self.subscriptions.iter_user_ids():
+                    unfiltered.extend(user_id for user_id in batch if user_id not in filtered)
+                return unfiltered, self.routing.route(events)
+            except Exception as e:
+                logger.error("Не удалось получить список подписчиков: %s. Повтор через 1 с", e)
+                await asyncio.sleep(1)
+
+    async def _processed_ranges(self, offsets):
+        """
+        Диапазоны offset из outbox, уже вошедшие в сохраненные окна: {(topic, partition): [(first, last)]}.
+        При ошибке повторяет попытку: иначе уже разосланные события могут быть отправлены повторно.
+        """
+        if not offsets:
+            return {}
+        while True:
+            try:
+                return await self.outbox.processed_ranges(offsets)
+            except Exception as e:
+                logger.error("Не удалось прочитать обработанные offset из outbox: %s. Повтор через 1 с", e)
+                await asyncio.sleep(1)
+
+    async def _enqueue_window(self, notifications, offsets):
+        """
+        Сохраняет уведомления окна и диапазоны offset его сообщений в персистентную очередь рассылки
+        одной транзакцией: повторно прочитанные из Kafka сообщения окна будут пропущены.
+        При ошибке повторяет попытку: пропустить окно нельзя, иначе его offset будет закоммичен.
+        """
+        while True:
+            try:
+                queued = await self.outbox.enqueue_window(notifications, offsets)
+                break
+            except Exception as e:
+                logger.error("Не удалось сохранить уведомления в очередь рассылки: %s. Повтор через 1 с", e)
+                await asyncio.sleep(1)
+        if queued:
+            self.delivery.notify()
+            logger.debug("Поставлено в очередь сообщений: %d", queued, extra=SAMPLED)
+
+    async def _commit(self, offsets):
+        if not offsets:
+            return
         try:
-            if table == "promo_category":
-                if action == "INSERT":
-                    return f"🆕 Новая категория: {data['data']['name']}"
-                elif action == "UPDATE":
-                    old_name = data.get("dataOld", {}).get("name", "")
-                    new_name = data["data"]["name"]
-                    return f"📝 Обновлена категория: {old_name} → {new_name}"
-                elif action == "DELETE":
-                    return f"❌ Удалена категория: {data.get('dataOld', {}).get('name', 'Неизвестная категория')}"
-
-            elif table == "promo_offer":
-                if action == "INSERT":
-                    return f"🆕 Новое предложение: {data['data']['title']}"
-                elif action == "UPDATE":
-                    old_title = data.get("dataOld", {}).get("title", "")
-                    new_title = data["data"]["title"]
-                    return f"📝 Обновлено предложение: {old_title} → {new_title}"
-                elif action == "DELETE":
-                    return f"❌ Удалено предложение: {data.get('dataOld', {}).get('title', 'Неизвестное предложение')}"
-
-            elif table == "promo_city":
-                if action == "INSERT":
-                    return f"🏙️ Новый город: {data['data']['name']}"
-                elif action == "UPDATE":
-                    old_name = data.get("dataOld", {}).get("name", "")
-                    new_name = data["data"]["name"]
-                    return f"📝 Обновлен город: {old_name} → {new_name}"
-                elif action == "DELETE":
-                    return f"❌ Удален город: {data.get('dataOld', {}).get('name', 'Неизвестный город')}"
-
-            elif table == "promo_partner":
-                if action == "INSERT":
-                    return f"🤝 Новый партнер: {data['data']['name']}"
-                elif action == "UPDATE":
-                    old_name = data.get("dataOld", {}).get("name", "")
-                    new_name = data["data"]["name"]
-                    return f"📝 Обновлен партнер: {old_name} → {new_name}"
-                elif action == "DELETE":
-                    return f"❌ Удален партнер: {data.get('dataOld', {}).get('name', 'Неизвестный партнер')}"
-
-            return f"Изменение в {table}: {action}"
+            await self._run_in_kafka_thread(self.consumer.commit, offsets)
         except Exception as e:
-            print(f"Ошибка при форматировании сообщения: {e}")
-            print(f"Данные сообщения: {data}")
-            return f"Произошло изменение в {table}: {action}"
+            # Сообщения будут прочитаны повторно, outbox отбросит их как дубликаты
+            logger.warning("Ошибка при коммите offset: %s", e)
 
     async def process_messages(self):
-        """Обработка сообщений из Kafka"""
-        print("Начинаем обработку сообщений из Kafka...")
-        print(f"Подключенные топики: {self.consumer.subscription()}")
+        """
+        Обработка сообщений из Kafka.
+        Чтение из Kafka, обработка сообщений и рассылка выполняются параллельно
+        и не блокируют event loop, на котором работает диспетчер aiogram.
+        """
+        logger.info("Начинаем обработку сообщений из Kafka, топики: %s", self.consumer.subscription())
+        await self.delivery.start()
 
+        poll_task = asyncio.create_task(self._poll_loop())
+        handle_task = asyncio.create_task(self._handle_loop())
         try:
-            print("Ожидаем сообщения из Kafka...")
-            while True:
-                try:
-                    # Получаем актуальный список подписчиков
-                    subscribed_users = self.get_subscribers()  # get_all_subscribed_users()
-                    print(f"Актуальные подписчики: {subscribed_users}")
-
-                    # Получаем сообщения из Kafka
-                    messages = self.consumer.poll(timeout_ms=1000)
-                    print(f"Получено сообщений из Kafka: {len(messages)}")
-
-                    for tp, msgs in messages.items():
-                        print(f"Получены сообщения из топика {tp.topic}: {len(msgs)} сообщений")
-                        for message in msgs:
-                            try:
-                                print(f"Получено сообщение: {message.value}")
-                                formatted_message = await self.format_message(message)
-                                print(f"Отформатированное сообщение: {formatted_message}")
-
-                                # Отправляем сообщение всем подписанным пользователям
-                                for user_id in subscribed_users:
-                                    try:
-                                        await self.bot.send_message(user_id, formatted_message)
-                                        print(f"Сообщение отправлено пользователю {user_id}")
-                                    except Exception as e:
-                                        print(f"Ошибка отправки сообщения пользователю {user_id}: {e}")
-
-                            except Exception as e:
-                                print(f"Ошибка обработки сообщения: {e}")
-                                print(f"Содержимое сообщения: {message.value}")
-
-                    # Даем возможность другим задачам выполниться
-                    await asyncio.sleep(0.1)
-
-                except Exception as e:
-                    print(f"Ошибка при получении сообщений: {e}")
-                    # Пробуем переподключиться
-                    try:
-                        self.consumer = self._connect_to_kafka()
-                    except Exception as reconnect_error:
-                        print(f"Ошибка при переподключении: {reconnect_error}")
-                        await asyncio.sleep(5)
-
+            await asyncio.gather(poll_task, handle_task)
         except asyncio.CancelledError:
-            print("Получен сигнал отмены, завершаем работу...")
+            logger.info("Получен сигнал отмены, завершаем работу...")
             raise
         except Exception as e:
-            print(f"Ошибка при обработке сообщений: {e}")
-            print(f"Тип ошибки: {type(e)}")
-            import traceback
+            logger.exception("Ошибка при обработке сообщений: %s", e)
+        finally:
+            poll_task.cancel()
+            handle_task.cancel()
+            await asyncio.gather(poll_task, handle_task, return_exceptions=True)
+            await self.delivery.stop()
 
-            print(f"Traceback: {traceback.format_exc()}")
+    def close(self):
+        """Закрывает соединение с Kafka после завершения текущего poll и базу outbox"""
+        self._kafka_executor.shutdown(wait=True)
+        self.consumer.close()
+        self.outbox.close()
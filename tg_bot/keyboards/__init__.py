@@ -1,3 +1,4 @@
+from .inline import get_filter_keyboard
 from .reply import get_main_keyboard
 
-__all__ = ["get_main_keyboard"]
+__all__ = ["get_filter_keyboard", "get_main_keyboard"]
@@ -0,0 +1,17 @@
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+def get_filter_keyboard(kind, objects, selected) -> InlineKeyboardMarkup:
+    """Создает клавиатуру выбора фильтров: по кнопке на объект, выбранные отмечены галочкой"""
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"✅ {name}" if object_id in selected else name,
+                    callback_data=f"filter:{kind}:{object_id}",
+                )
+            ]
+            for object_id, name in objects
+        ]
+    )
+    return keyboard
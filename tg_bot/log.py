@@ -0,0 +1,74 @@
+import json
+import logging
+import sys
+
+from tg_bot.config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATE
+
+# Атрибуты LogRecord, которые есть у любой записи; все остальные пришли из extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sampled"}
+
+# Для частых событий горячего пути: logger.debug(..., extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Прореживает записи, помеченные extra={"sampled": True}: пропускается каждая
+    1/rate-я запись с тем же шаблоном сообщения. Остальные записи не фильтруются.
+    """
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self._every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counters = {}
+
+    def filter(self, record):
+        if not getattr(record, "sampled", False):
+            return True
+        if not self._every:
+            return False
+        key = (record.name, record.msg)
+        count = self._counters.get(key, 0)
+        self._counters[key] = count + 1
+        if count % self._every:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение и поля из extra."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_rate=LOG_SAMPLE_RATE):
+    """Настраивает корневой логгер: уровень, формат ("text" или "json") и прореживание."""
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # aiogram пишет каждый апдейт на уровне INFO
+    logging.getLogger("aiogram.event").setLevel(max(root.level, logging.WARNING))
+    return handler
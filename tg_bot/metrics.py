@@ -0,0 +1,55 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, disable_created_metrics, start_http_server
+
+from tg_bot.config import METRICS_ADDR
+
+# Границы корзин гистограмм по умолчанию (секунды): до 5 минут для poll, отправки и задержки рассылки
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Без служебных рядов *_created (время создания каждого счетчика и гистограммы)
+disable_created_metrics()
+
+
+def parse_addr(addr):
+    """Разбирает адрес вида ":2113" или "0.0.0.0:2113" (как monitoring.promAddr в wal-listener)."""
+    host, _, port = addr.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+def start_metrics_server(addr=METRICS_ADDR, metrics_registry=None):
+    """
+    Запускает HTTP-эндпоинт /metrics (prometheus_client.start_http_server) в фоновом потоке,
+    чтобы запросы Prometheus не занимали event loop бота.
+    Возвращает HTTP-сервер (остановка - shutdown()) или None, если адрес не задан.
+    """
+    if not addr:
+        return None
+    host, port = parse_addr(addr)
+    server, _ = start_http_server(port, host, registry=metrics_registry or registry)
+    return server
+
+
+# Метрики бота
+registry = CollectorRegistry()
+
+KAFKA_POLL_SECONDS = Histogram(
+    "tg_bot_kafka_poll_seconds", "Длительность одного poll из Kafka", buckets=DEFAULT_BUCKETS, registry=registry
+)
+KAFKA_MESSAGES = Counter("tg_bot_kafka_messages", "Сообщения, прочитанные из Kafka", ["topic"], registry=registry)
+FORMAT_SECONDS = Histogram(
+    "tg_bot_format_seconds",
+    "Время форматирования одного уведомления",
+    buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.01),
+    registry=registry,
+)
+SEND_SECONDS = Histogram(
+    "tg_bot_send_seconds", "Длительность запроса send_message к Telegram", buckets=DEFAULT_BUCKETS, registry=registry
+)
+SENT_MESSAGES = Counter("tg_bot_sent_messages", "Доставленные сообщения", registry=registry)
+SEND_ERRORS = Counter("tg_bot_send_errors", "Ошибки отправки по типу исключения", ["error"], registry=registry)
+FANOUT_LAG_SECONDS = Histogram(
+    "tg_bot_fanout_lag_seconds",
+    "Время от сохранения уведомления в outbox до доставки получателю",
+    buckets=DEFAULT_BUCKETS,
+    registry=registry,
+)
+DELIVERY_QUEUE_DEPTH = Gauge("tg_bot_delivery_queue_depth", "Сообщения в очереди рассылки", registry=registry)
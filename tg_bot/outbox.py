@@ -0,0 +1,217 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tg_bot.config import OUTBOX_PATH, OUTBOX_RETENTION
+
+# Статусы доставки сообщения получателю
+PENDING = 0
+DELIVERED = 1
+FAILED = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY,
+    notification_id INTEGER NOT NULL REFERENCES notifications (id),
+    user_id INTEGER NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    UNIQUE (notification_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS deliveries_pending ON deliveries (id) WHERE status = 0;
+CREATE TABLE IF NOT EXISTS windows (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    first_offset INTEGER NOT NULL,
+    last_offset INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS windows_offsets ON windows (topic, partition, last_offset);
+"""
+
+
+class DeliveryOutbox:
+    """
+    Персистентная очередь исходящих уведомлений в SQLite.
+
+    Каждое событие из Kafka сохраняется вместе со списком получателей до того,
+    как будет закоммичен offset. Для каждого получателя хранится статус доставки,
+    поэтому после перезапуска рассылка продолжается с того места, где остановилась,
+    и уже получившие сообщение пользователи не уведомляются повторно.
+
+    Для окна объединения событий вместе с уведомлениями сохраняются диапазоны offset
+    прочитанных сообщений (windows): повторно прочитанные после сбоя сообщения из этих
+    диапазонов пропускаются, даже если новое окно закроется на других границах.
+
+    sqlite3 не потокобезопасен, поэтому все операции выполняются в одном
+    выделенном потоке и не блокируют event loop.
+    """
+
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    async def enqueue(self, source, text, user_ids):
+        """
+        Сохраняет уведомление и получателей одной транзакцией.
+        source - уникальный идентификатор события (topic:partition:offset): повторно
+        прочитанное из Kafka событие не создает дубликатов. Возвращает число добавленных получателей.
+        """
+        return await self._run(self._enqueue, source, text, list(user_ids))
+
+    def _enqueue(self, source, text, user_ids):
+        conn = self._connection()
+        with conn:
+            return self._insert(conn, source, text, user_ids, time.time())
+
+    def _insert(self, conn, source, text, user_ids, now):
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO notifications (source, text, created_at) VALUES (?, ?, ?)",
+            (source, text, now),
+        )
+        if not cursor.rowcount:
+            return 0
+        notification_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO deliveries (notification_id, user_id) VALUES (?, ?)",
+            ((notification_id, user_id) for user_id in user_ids),
+        )
+        return len(user_ids)
+
+    async def enqueue_window(self, notifications, offsets):
+        """
+        Сохраняет уведомления окна объединения событий и диапазоны offset его сообщений одной транзакцией.
+        notifications - [(source, text, user_ids)], offsets - {(topic, partition): (first, last)}.
+        Возвращает число добавленных получателей.
+        """
+        notifications = [(source, text, list(user_ids)) for source, text, user_ids in notifications if user_ids]
+        return await self._run(self._enqueue_window, notifications, dict(offsets))
+
+    def _enqueue_window(self, notifications, offsets):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            queued = sum(self._insert(conn, source, text, user_ids, now) for source, text, user_ids in notifications)
+            conn.executemany(
+                "INSERT INTO windows (topic, partition, first_offset, last_offset, created_at) VALUES (?, ?, ?, ?, ?)",
+                ((topic, partition, first, last, now) for (topic, partition), (first, last) in offsets.items()),
+            )
+        return queued
+
+    async def processed_ranges(self, offsets):
+        """
+        Сохраненные диапазоны offset, пересекающиеся с прочитанными: offsets - {(topic, partition): (first, last)},
+        результат - {(topic, partition): [(first, last), ...]} (только партиции с пересечениями).
+        """
+        return await self._run(self._processed_ranges, dict(offsets))
+
+    def _processed_ranges(self, offsets):
+        conn = self._connection()
+        ranges = {}
+        for (topic, partition), (first, last) in offsets.items():
+            rows = conn.execute(
+                """
+                SELECT first_offset, last_offset FROM windows
+                WHERE topic = ? AND partition = ? AND last_offset >= ? AND first_offset <= ?
+                """,
+                (topic, partition, first, last),
+            ).fetchall()
+            if rows:
+                ranges[(topic, partition)] = rows
+        return ranges
+
+    async def claim(self, after_id, limit):
+        """
+        Возвращает до limit недоставленных сообщений с id больше after_id:
+        [(id, user_id, text, created_at)], created_at - время сохранения уведомления (unix time).
+        """
+        return await self._run(self._claim, after_id, limit)
+
+    def _claim(self, after_id, limit):
+        return self._connection().execute(
+            """
+            SELECT d.id, d.user_id, n.text, n.created_at
+            FROM deliveries d JOIN notifications n ON n.id = d.notification_id
+            WHERE d.status = 0 AND d.id > ?
+            ORDER BY d.id
+            LIMIT ?
+            """,
+            (after_id, limit),
+        ).fetchall()
+
+    async def mark(self, results):
+        """Сохраняет результаты доставки пачкой: [(delivery_id, status)]."""
+        if results:
+            await self._run(self._mark, list(results))
+
+    def _mark(self, results):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "UPDATE deliveries SET status = ?, updated_at = ? WHERE id = ?",
+                ((status, now, delivery_id) for delivery_id, status in results),
+            )
+
+    async def pending_count(self):
+        """Количество недоставленных сообщений."""
+        return await self._run(self._pending_count)
+
+    def _pending_count(self):
+        return self._connection().execute("SELECT count(*) FROM deliveries WHERE status = 0").fetchone()[0]
+
+    async def purge(self, retention=OUTBOX_RETENTION):
+        """
+        Удаляет полностью обработанные уведомления старше retention секунд.
+        Уведомления хранятся какое-то время после доставки, чтобы повторно прочитанное
+        из Kafka событие распознавалось как дубликат.
+        """
+        await self._run(self._purge, retention)
+
+    def _purge(self, retention):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                """
+                DELETE FROM notifications WHERE created_at < ? AND NOT EXISTS (
+                    SELECT 1 FROM deliveries d WHERE d.notification_id = notifications.id AND d.status = 0
+                )
+                """,
+                (time.time() - retention,),
+            )
+            conn.execute(
+                "DELETE FROM deliveries WHERE notification_id NOT IN (SELECT id FROM notifications)"
+            )
+            conn.execute("DELETE FROM windows WHERE created_at < ?", (time.time() - retention,))
+
+    def close(self):
+        """Дожидается завершения операций и закрывает базу."""
+        self._executor.submit(self._close).result()
+        self._executor.shutdown(wait=True)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
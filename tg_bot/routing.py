@@ -0,0 +1,127 @@
+import time
+
+from tg_bot.config import ROUTING_REFRESH_INTERVAL
+
+# Виды фильтров подписки и соответствующие таблицы/поля
+FILTER_KINDS = ("city", "category", "partner")
+KIND_TABLES = {"city": "promo_city", "category": "promo_category", "partner": "promo_partner"}
+TABLE_KINDS = {table: kind for kind, table in KIND_TABLES.items()}
+OFFER_FIELDS = {"city": "city_id", "category": "category_id", "partner": "partner_id"}
+
+
+def _row(data):
+    return data.get("data") or data.get("dataOld") or {}
+
+
+class RoutingIndex:
+    """
+    Инвертированный индекс фильтров подписки: (вид, id объекта) -> множество user_id.
+
+    Пользователь без фильтров получает все уведомления. Пользователь с фильтрами
+    получает акцию, если она подходит под фильтр каждого выбранного вида
+    (например, "город Уфа" и "категория Еда"), а изменения справочников - только
+    об объектах, на которые он подписан. Для события перебираются только
+    пользователи из индекса по его city_id/category_id/partner_id, а не весь список.
+    """
+
+    def __init__(self, refresh_interval=ROUTING_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._users_by_key = {}
+        self._keys_by_user = {}
+        self._loaded_at = None
+
+    def __len__(self):
+        return len(self._keys_by_user)
+
+    @property
+    def filtered_users(self):
+        """Пользователи, у которых есть хотя бы один фильтр."""
+        return self._keys_by_user.keys()
+
+    def is_stale(self):
+        """Пора ли перечитать фильтры из хранилища (их могли изменить другие экземпляры бота)."""
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    def invalidate(self):
+        """Помечает индекс устаревшим: при следующем refresh фильтры будут перечитаны."""
+        self._loaded_at = None
+
+    async def refresh(self, store, force=False):
+        """Перечитывает фильтры активных подписчиков из хранилища, если индекс устарел."""
+        if force or self.is_stale():
+            self.load(await store.active_filters())
+
+    def load(self, rows):
+        """Перестраивает индекс по строкам (user_id, вид, id объекта)."""
+        self._users_by_key = {}
+        self._keys_by_user = {}
+        for user_id, kind, object_id in rows:
+            self.add(user_id, kind, object_id)
+        self._loaded_at = time.monotonic()
+
+    def add(self, user_id, kind, object_id):
+        key = (kind, int(object_id))
+        self._users_by_key.setdefault(key, set()).add(user_id)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+
+    def remove(self, user_id, kind, object_id):
+        key = (kind, int(object_id))
+        self._discard(self._users_by_key, key, user_id)
+        self._discard(self._keys_by_user, user_id, key)
+
+    def remove_user(self, user_id):
+        """Удаляет все фильтры пользователя (например, после отписки)."""
+        for key in self._keys_by_user.pop(user_id, ()):
+            self._discard(self._users_by_key, key, user_id)
+
+    @staticmethod
+    def _discard(index, key, value):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    def filters(self, user_id):
+        """Фильтры пользователя: {вид: множество id}."""
+        result = {}
+        for kind, object_id in self._keys_by_user.get(user_id, ()):
+            result.setdefault(kind, set()).add(object_id)
+        return result
+
+    def match(self, data):
+        """Пользователи с фильтрами, которым подходит событие WAL (словарь из сообщения Kafka)."""
+        table = data.get("table")
+        row = _row(data)
+        kind = TABLE_KINDS.get(table)
+        if kind is not None:
+            return set(self._users_by_key.get((kind, row.get("id")), ()))
+        if table != "promo_offer":
+            return set()
+
+        matched = {}
+        for kind, field in OFFER_FIELDS.items():
+            users = self._users_by_key.get((kind, row.get(field)))
+            if users:
+                matched[kind] = users
+        if not matched:
+            return set()
+
+        candidates = set().union(*matched.values())
+        return {
+            user_id
+            for user_id in candidates
+            if all(user_id in matched.get(kind, ()) for kind, _ in self._keys_by_user[user_id])
+        }
+
+    def route(self, events):
+        """Для набора событий возвращает {user_id: [индексы подходящих событий]} по пользователям с фильтрами."""
+        routes = {}
+        for index, event in enumerate(events):
+            for user_id in self.match(event.value):
+                routes.setdefault(user_id, []).append(index)
+        return routes
+
+
+# Общий индекс для обработчиков бота и Kafka consumer
+routing = RoutingIndex()
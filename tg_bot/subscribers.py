@@ -0,0 +1,117 @@
+import os
+import tempfile
+import time
+
+from tg_bot import db_utils
+from tg_bot.config import SUBSCRIBERS_CHECK_INTERVAL
+
+
+class SubscriberRegistry:
+    """
+    Реестр подписчиков в памяти поверх файла subscribers.txt.
+
+    Множество подписчиков хранится в памяти, проверка подписки выполняется за O(1).
+    Файл перечитывается только при изменении (по mtime и размеру), и не чаще
+    одного раза в check_interval секунд. Подписка дописывает одну строку в конец
+    файла, отписка атомарно перезаписывает файл.
+    """
+
+    def __init__(self, path=None, check_interval=SUBSCRIBERS_CHECK_INTERVAL):
+        self._path = path
+        self.check_interval = check_interval
+        self._users = set()
+        self._snapshot = None
+        self._signature = None
+        self._checked_at = None
+
+    @property
+    def path(self):
+        return self._path or db_utils.SUBSCRIBERS_FILE
+
+    def _file_signature(self):
+        path = self.path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return (path, None, None)
+        return (path, stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self, force=False):
+        """Перечитывает файл, если он изменился. Возвращает True, если данные были перезагружены."""
+        now = time.monotonic()
+        same_path = self._signature is not None and self._signature[0] == self.path
+        if not force and same_path and now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+
+        signature = self._file_signature()
+        if not force and signature == self._signature:
+            return False
+
+        users = set()
+        if signature[1] is not None:
+            with open(self.path, "r") as f:
+                users = set(int(line.strip()) for line in f if line.strip().isdigit())
+        self._users = users
+        self._snapshot = None
+        self._signature = signature
+        return True
+
+    def is_subscribed(self, user_id):
+        """Проверяет, подписан ли пользователь."""
+        self.refresh()
+        return user_id in self._users
+
+    __contains__ = is_subscribed
+
+    def user_ids(self):
+        """Возвращает неизменяемый снимок множества подписчиков (пересоздается только после изменений)."""
+        self.refresh()
+        if self._snapshot is None:
+            self._snapshot = frozenset(self._users)
+        return self._snapshot
+
+    def __len__(self):
+        self.refresh()
+        return len(self._users)
+
+    def add(self, user_id):
+        """Добавляет подписчика. Возвращает False, если пользователь уже подписан."""
+        self.refresh()
+        if user_id in self._users:
+            return False
+        with open(self.path, "a") as f:
+            f.write(f"{user_id}\n")
+        self._users.add(user_id)
+        self._snapshot = None
+        self._signature = self._file_signature()
+        return True
+
+    def remove(self, user_id):
+        """Удаляет подписчика. Возвращает False, если пользователь не был подписан."""
+        self.refresh()
+        if user_id not in self._users:
+            return False
+        self._users.discard(user_id)
+        self._snapshot = None
+        self._rewrite()
+        return True
+
+    def _rewrite(self):
+        """Атомарно перезаписывает файл текущим множеством подписчиков."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".subscribers-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for user_id in self._users:
+                    f.write(f"{user_id}\n")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._signature = self._file_signature()
+
+
+# Общий реестр для обработчиков бота и Kafka consumer
+registry = SubscriberRegistry()
@@ -0,0 +1,374 @@
+import asyncio
+import os
+import tempfile
+
+from tg_bot import db_utils
+from tg_bot.config import (
+    DB_HOST,
+    DB_NAME,
+    DB_PASSWORD,
+    DB_PORT,
+    DB_USER,
+    SUBSCRIPTION_BACKEND,
+    SUBSCRIPTION_BATCH_SIZE,
+    SUBSCRIPTION_FLUSH_INTERVAL,
+    SUBSCRIPTION_POOL_MAX_SIZE,
+    SUBSCRIPTION_POOL_MIN_SIZE,
+    SUBSCRIPTION_STREAM_BATCH_SIZE,
+)
+from tg_bot.subscribers import registry
+
+SUBSCRIPTION_TABLE = "promo_telegramsubscription"
+FILTER_TABLE = "promo_telegramsubscriptionfilter"
+
+# Пакетная подписка: одним запросом вставляет/активирует подписки и возвращает
+# предыдущее значение is_active (NULL - подписки не было).
+SUBSCRIBE_SQL = f"""
+    WITH input AS (
+        SELECT * FROM unnest($1::bigint[], $2::varchar[]) AS t(user_id, username)
+    ), prev AS (
+        SELECT s.user_id, s.is_active FROM {SUBSCRIPTION_TABLE} s JOIN input USING (user_id)
+    )
+    INSERT INTO {SUBSCRIPTION_TABLE} AS s (user_id, username, is_active, subscribed_at)
+    SELECT user_id, username, TRUE, now() FROM input
+    ON CONFLICT (user_id) DO UPDATE
+        SET is_active = TRUE, username = COALESCE(EXCLUDED.username, s.username)
+    RETURNING s.user_id, (SELECT prev.is_active FROM prev WHERE prev.user_id = s.user_id) AS was_active
+"""
+
+# Пакетная отписка: возвращает только тех, у кого подписка действительно была активна
+UNSUBSCRIBE_SQL = f"""
+    UPDATE {SUBSCRIPTION_TABLE} SET is_active = FALSE
+    WHERE user_id = ANY($1::bigint[]) AND is_active
+    RETURNING user_id
+"""
+
+IS_SUBSCRIBED_SQL = f"SELECT is_active FROM {SUBSCRIPTION_TABLE} WHERE user_id = $1"
+
+# Keyset-пагинация по уникальному индексу user_id: каждая страница - index range scan без OFFSET
+ACTIVE_USER_IDS_SQL = f"""
+    SELECT user_id FROM {SUBSCRIPTION_TABLE}
+    WHERE is_active AND user_id > $1
+    ORDER BY user_id
+    LIMIT $2
+"""
+
+ADD_FILTER_SQL = f"""
+    INSERT INTO {FILTER_TABLE} (user_id, kind, object_id) VALUES ($1, $2, $3)
+    ON CONFLICT (user_id, kind, object_id) DO NOTHING
+    RETURNING user_id
+"""
+
+REMOVE_FILTER_SQL = f"DELETE FROM {FILTER_TABLE} WHERE user_id = $1 AND kind = $2 AND object_id = $3 RETURNING user_id"
+
+CLEAR_FILTERS_SQL = f"DELETE FROM {FILTER_TABLE} WHERE user_id = $1"
+
+# Фильтры только активных подписчиков: по ним Kafka consumer строит индекс маршрутизации
+ACTIVE_FILTERS_SQL = f"""
+    SELECT f.user_id, f.kind, f.object_id
+    FROM {FILTER_TABLE} f JOIN {SUBSCRIPTION_TABLE} s USING (user_id)
+    WHERE s.is_active
+"""
+
+# Справочники, по которым можно фильтровать подписку
+CATALOG_SQL = {
+    "city": "SELECT id, name FROM promo_city ORDER BY name LIMIT $1",
+    "category": "SELECT id, name FROM promo_category ORDER BY name LIMIT $1",
+    "partner": "SELECT id, name FROM promo_partner ORDER BY name LIMIT $1",
+}
+
+
+class FileSubscriptionStore:
+    """Хранилище подписок поверх файлового реестра (для одного экземпляра бота)."""
+
+    def __init__(self, subscriber_registry, filters_path=None):
+        self.registry = subscriber_registry
+        self._filters_path = filters_path
+        self._filters = None
+
+    @property
+    def filters_path(self):
+        return self._filters_path or db_utils.FILTERS_FILE
+
+    def _load_filters(self):
+        if self._filters is None:
+            filters = set()
+            try:
+                with open(self.filters_path, "r") as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) == 3 and parts[0].isdigit() and parts[2].isdigit():
+                            filters.add((int(parts[0]), parts[1], int(parts[2])))
+            except FileNotFoundError:
+                pass
+            self._filters = filters
+        return self._filters
+
+    def _rewrite_filters(self):
+        """Атомарно перезаписывает файл фильтров."""
+        directory = os.path.dirname(os.path.abspath(self.filters_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".filters-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for user_id, kind, object_id in sorted(self._filters):
+                    f.write(f"{user_id} {kind} {object_id}\n")
+            os.replace(tmp_path, self.filters_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def close(self):
+        pass
+
+    async def is_subscribed(self, user_id):
+        return self.registry.is_subscribed(user_id)
+
+    async def subscribe(self, user_id, username=None):
+        """Подписывает пользователя. Возвращает False, если он уже был подписан."""
+        return self.registry.add(user_id)
+
+    async def unsubscribe(self, user_id):
+        """Отписывает пользователя. Возвращает False, если он не был подписан."""
+        return self.registry.remove(user_id)
+
+    async def iter_user_ids(self, batch_size=SUBSCRIPTION_STREAM_BATCH_SIZE):
+        """Отдает id активных подписчиков пачками."""
+        user_ids = list(self.registry.user_ids())
+        for start in range(0, len(user_ids), batch_size):
+            yield user_ids[start : start + batch_size]
+
+    async def add_filter(self, user_id, kind, object_id):
+        """Добавляет фильтр подписки. Возвращает False, если он уже был."""
+        filters = self._load_filters()
+        if (user_id, kind, object_id) in filters:
+            return False
+        with open(self.filters_path, "a") as f:
+            f.write(f"{user_id} {kind} {object_id}\n")
+        filters.add((user_id, kind, object_id))
+        return True
+
+    async def remove_filter(self, user_id, kind, object_id):
+        """Удаляет фильтр подписки. Возвращает False, если его не было."""
+        filters = self._load_filters()
+        if (user_id, kind, object_id) not in filters:
+            return False
+        filters.discard((user_id, kind, object_id))
+        self._rewrite_filters()
+        return True
+
+    async def clear_filters(self, user_id):
+        """Удаляет все фильтры пользователя."""
+        filters = self._load_filters()
+        removed = {row for row in filters if row[0] == user_id}
+        if removed:
+            filters.difference_update(removed)
+            self._rewrite_filters()
+        return len(removed)
+
+    async def active_filters(self):
+        """Фильтры активных подписчиков: [(user_id, вид, id объекта)]."""
+        subscribed = self.registry.user_ids()
+        return [row for row in self._load_filters() if row[0] in subscribed]
+
+    async def catalog(self, kind, limit=50):
+        """Справочник для выбора фильтра; файловому хранилищу он недоступен."""
+        return []
+
+
+class PostgresSubscriptionStore:
+    """
+    Хранилище подписок в таблице TelegramSubscription (promo_telegramsubscription).
+
+    Использует асинхронный пул соединений asyncpg, поэтому несколько экземпляров
+    бота работают с общим набором подписчиков. Подписки и отписки, пришедшие
+    почти одновременно, объединяются и записываются одним запросом.
+    """
+
+    def __init__(
+        self,
+        dsn=None,
+        min_size=SUBSCRIPTION_POOL_MIN_SIZE,
+        max_size=SUBSCRIPTION_POOL_MAX_SIZE,
+        batch_size=SUBSCRIPTION_BATCH_SIZE,
+        flush_interval=SUBSCRIPTION_FLUSH_INTERVAL,
+        pool=None,
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pool = pool
+        self._pool_lock = asyncio.Lock()
+        self._pending = []
+        self._flush_handle = None
+        self._flush_tasks = set()
+
+    async def _get_pool(self):
+        if self.pool is None:
+            async with self._pool_lock:
+                if self.pool is None:
+                    import asyncpg
+
+                    connect_kwargs = {"dsn": self.dsn} if self.dsn else {
+                        "host": DB_HOST,
+                        "port": DB_PORT,
+                        "user": DB_USER,
+                        "password": DB_PASSWORD,
+                        "database": DB_NAME,
+                    }
+                    self.pool = await asyncpg.create_pool(
+                        min_size=self.min_size, max_size=self.max_size, **connect_kwargs
+                    )
+        return self.pool
+
+    async def close(self):
+        """Записывает накопленные изменения и закрывает пул соединений."""
+        if self._pending:
+            await self._flush()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def is_subscribed(self, user_id):
+        pool = await self._get_pool()
+        return bool(await pool.fetchval(IS_SUBSCRIBED_SQL, user_id))
+
+    async def subscribe(self, user_id, username=None):
+        """Подписывает пользователя. Возвращает False, если он уже был подписан."""
+        return await self._enqueue("subscribe", user_id, username)
+
+    async def unsubscribe(self, user_id):
+        """Отписывает пользователя. Возвращает False, если он не был подписан."""
+        return await self._enqueue("unsubscribe", user_id, None)
+
+    async def iter_user_ids(self, batch_size=SUBSCRIPTION_STREAM_BATCH_SIZE):
+        """Потоково отдает id активных подписчиков пачками (keyset-пагинация по user_id)."""
+        pool = await self._get_pool()
+        last_id = -(2**63)
+        while True:
+            rows = await pool.fetch(ACTIVE_USER_IDS_SQL, last_id, batch_size)
+            if not rows:
+                return
+            user_ids = [row["user_id"] for row in rows]
+            yield user_ids
+            if len(rows) < batch_size:
+                return
+            last_id = user_ids[-1]
+
+    async def add_filter(self, user_id, kind, object_id):
+        """Добавляет фильтр подписки. Возвращает False, если он уже был."""
+        pool = await self._get_pool()
+        return await pool.fetchval(ADD_FILTER_SQL, user_id, kind, object_id) is not None
+
+    async def remove_filter(self, user_id, kind, object_id):
+        """Удаляет фильтр подписки. Возвращает False, если его не было."""
+        pool = await self._get_pool()
+        return await pool.fetchval(REMOVE_FILTER_SQL, user_id, kind, object_id) is not None
+
+    async def clear_filters(self, user_id):
+        """Удаляет все фильтры пользователя. Возвращает число удаленных фильтров."""
+        pool = await self._get_pool()
+        status = await pool.execute(CLEAR_FILTERS_SQL, user_id)
+        return int(status.split()[-1])
+
+    async def active_filters(self):
+        """Фильтры активных подписчиков: [(user_id, вид, id объекта)]."""
+        pool = await self._get_pool()
+        return [(row["user_id"], row["kind"], row["object_id"]) for row in await pool.fetch(ACTIVE_FILTERS_SQL)]
+
+    async def catalog(self, kind, limit=50):
+        """Справочник для выбора фильтра: [(id, название)]."""
+        pool = await self._get_pool()
+        return [(row["id"], row["name"]) for row in await pool.fetch(CATALOG_SQL[kind], limit)]
+
+    async def _enqueue(self, kind, user_id, username):
+        """Добавляет операцию в пакет и ждет, пока пакет будет записан."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((kind, user_id, username, future))
+        if len(self._pending) >= self.batch_size:
+            self._schedule_flush(0)
+        elif self._flush_handle is None:
+            self._schedule_flush(self.flush_interval)
+        return await future
+
+    def _schedule_flush(self, delay):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        task = asyncio.create_task(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self):
+        ops, self._pending = self._pending, []
+        if not ops:
+            return
+        results = []
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    for kind, run in split_into_runs(ops):
+                        results.extend(await self._apply_run(conn, kind, run))
+        except Exception as e:
+            for op in ops:
+                if not op[3].done():
+                    op[3].set_exception(e)
+            return
+        # Результаты отдаются только после коммита: при ошибке следующей группы
+        # или COMMIT ни одна операция пакета не считается выполненной
+        for future, result in results:
+            if not future.done():
+                future.set_result(result)
+
+    async def _apply_run(self, conn, kind, run):
+        """Выполняет группу операций одним запросом; возвращает [(future, изменилась ли подписка)]."""
+        user_ids = [op[1] for op in run]
+        if kind == "subscribe":
+            rows = await conn.fetch(SUBSCRIBE_SQL, user_ids, [op[2] for op in run])
+            changed = {row["user_id"] for row in rows if not row["was_active"]}
+        else:
+            rows = await conn.fetch(UNSUBSCRIBE_SQL, user_ids)
+            changed = {row["user_id"] for row in rows}
+        return [(future, user_id in changed) for _, user_id, _, future in run]
+
+
+def split_into_runs(ops):
+    """
+    Делит список операций на последовательные группы одного типа без повторов user_id.
+    Порядок операций одного пользователя сохраняется, а каждая группа
+    выполняется одним запросом (ON CONFLICT не допускает повторов в одном INSERT).
+    """
+    runs = []
+    kind, run, seen = None, [], set()
+    for op in ops:
+        if op[0] != kind or op[1] in seen:
+            if run:
+                runs.append((kind, run))
+            kind, run, seen = op[0], [], set()
+        run.append(op)
+        seen.add(op[1])
+    if run:
+        runs.append((kind, run))
+    return runs
+
+
+def create_subscription_store(backend=SUBSCRIPTION_BACKEND):
+    """Создает хранилище подписок по имени backend ("file" или "postgres")."""
+    if backend == "file":
+        return FileSubscriptionStore(registry)
+    if backend == "postgres":
+        return PostgresSubscriptionStore()
+    raise ValueError(f"Неизвестный backend подписок: {backend}")
+
+
+# Общее хранилище подписок для обработчиков бота и Kafka consumer
+subscriptions = create_subscription_store()
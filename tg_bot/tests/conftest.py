@@ -10,6 +10,8 @@ from aiogram.types import Chat, Message, User
 
 # Устанавливаем валидный тестовый токен для всех тестов
 os.environ["TELEGRAM_BOT_TOKEN"] = "123456789:TEST_FAKE_TOKEN_FOR_UNITTESTS"
+# Очередь рассылки в тестах хранится в памяти
+os.environ["OUTBOX_PATH"] = ":memory:"
 
 # Правильный мок kafka для избежания проблем с Python 3.11
 
@@ -50,6 +52,7 @@ def mock_message():
     message = Mock(spec=Message)
     message.from_user = Mock(spec=User)
     message.from_user.id = 123456789
+    message.from_user.username = "test_user"
     message.text = "📝 Подписаться на уведомления"
     message.answer = AsyncMock()
     return message
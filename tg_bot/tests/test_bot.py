@@ -1,9 +1,10 @@
 from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
-from aiogram.types import Message, ReplyKeyboardMarkup, User
+from aiogram.types import CallbackQuery, Message, ReplyKeyboardMarkup, User
 
 from tg_bot.handlers.common import cmd_start
+from tg_bot.handlers.filters import filter_button
 from tg_bot.handlers.subscription import subscribe_to_notifications, unsubscribe_from_notifications
 
 
@@ -29,15 +30,16 @@ class TestBotHandlers:
         message = Mock(spec=Message)
         message.from_user = Mock(spec=User)
         message.from_user.id = 123456789
+        message.from_user.username = "test_user"
         message.text = "📝 Подписаться на уведомления"
         message.answer = AsyncMock()
 
-        with patch("tg_bot.handlers.subscription.load_subscribers", return_value=set()) as mock_load:
-            with patch("tg_bot.handlers.subscription.save_subscribers") as mock_save:
-                await subscribe_to_notifications(message)
+        with patch("tg_bot.handlers.subscription.subscriptions") as mock_subscriptions:
+            mock_subscriptions.subscribe = AsyncMock(return_value=True)
+            await subscribe_to_notifications(message)
 
-                mock_save.assert_called_once()
-                message.answer.assert_called_once_with("Вы подписались на уведомления о новых акциях и предложениях!")
+            mock_subscriptions.subscribe.assert_called_once_with(123456789, "test_user")
+            message.answer.assert_called_once_with("Вы подписались на уведомления о новых акциях и предложениях!")
 
     @pytest.mark.asyncio
     async def test_subscribe_to_notifications_existing_user(self):
@@ -45,15 +47,15 @@ class TestBotHandlers:
         message = Mock(spec=Message)
         message.from_user = Mock(spec=User)
         message.from_user.id = 123456789
+        message.from_user.username = "test_user"
         message.text = "📝 Подписаться на уведомления"
         message.answer = AsyncMock()
 
-        with patch("tg_bot.handlers.subscription.load_subscribers", return_value={123456789}) as mock_load:
-            with patch("tg_bot.handlers.subscription.save_subscribers") as mock_save:
-                await subscribe_to_notifications(message)
+        with patch("tg_bot.handlers.subscription.subscriptions") as mock_subscriptions:
+            mock_subscriptions.subscribe = AsyncMock(return_value=False)
+            await subscribe_to_notifications(message)
 
-                mock_save.assert_not_called()
-                message.answer.assert_called_once_with("Вы уже подписаны на уведомления!")
+            message.answer.assert_called_once_with("Вы уже подписаны на уведомления!")
 
     @pytest.mark.asyncio
     async def test_unsubscribe_from_notifications(self):
@@ -61,15 +63,16 @@ class TestBotHandlers:
         message = Mock(spec=Message)
         message.from_user = Mock(spec=User)
         message.from_user.id = 123456789
+        message.from_user.username = "test_user"
         message.text = "Отписаться от уведомлений"
         message.answer = AsyncMock()
 
-        with patch("tg_bot.handlers.subscription.load_subscribers", return_value={123456789}) as mock_load:
-            with patch("tg_bot.handlers.subscription.save_subscribers") as mock_save:
-                await unsubscribe_from_notifications(message)
+        with patch("tg_bot.handlers.subscription.subscriptions") as mock_subscriptions:
+            mock_subscriptions.unsubscribe = AsyncMock(return_value=True)
+            await unsubscribe_from_notifications(message)
 
-                mock_save.assert_called_once()
-                message.answer.assert_called_once_with("Вы отписались от уведомлений о новых акциях и предложениях.")
+            mock_subscriptions.unsubscribe.assert_called_once_with(123456789)
+            message.answer.assert_called_once_with("Вы отписались от уведомлений о новых акциях и предложениях.")
 
     @pytest.mark.asyncio
     async def test_unsubscribe_from_notifications_non_existing_user(self):
@@ -77,12 +80,71 @@ class TestBotHandlers:
         message = Mock(spec=Message)
         message.from_user = Mock(spec=User)
         message.from_user.id = 123456789
+        message.from_user.username = "test_user"
         message.text = "Отписаться от уведомлений"
         message.answer = AsyncMock()
 
-        with patch("tg_bot.handlers.subscription.load_subscribers", return_value=set()) as mock_load:
-            with patch("tg_bot.handlers.subscription.save_subscribers") as mock_save:
-                await unsubscribe_from_notifications(message)
+        with patch("tg_bot.handlers.subscription.subscriptions") as mock_subscriptions:
+            mock_subscriptions.unsubscribe = AsyncMock(return_value=False)
+            await unsubscribe_from_notifications(message)
 
-                mock_save.assert_not_called()
-                message.answer.assert_called_once_with("Вы не были подписаны на уведомления!")
+            message.answer.assert_called_once_with("Вы не были подписаны на уведомления!")
+
+    @staticmethod
+    def filter_callback(data):
+        callback = Mock(spec=CallbackQuery)
+        callback.data = data
+        callback.from_user = Mock(spec=User)
+        callback.from_user.id = 123456789
+        callback.answer = AsyncMock()
+        callback.message = Mock(spec=Message)
+        callback.message.edit_reply_markup = AsyncMock()
+        return callback
+
+    @pytest.mark.asyncio
+    async def test_filter_button(self):
+        """Тест кнопки фильтра у подписанного пользователя"""
+        callback = self.filter_callback("filter:city:5")
+
+        with (
+            patch("tg_bot.handlers.filters.subscriptions") as mock_subscriptions,
+            patch("tg_bot.handlers.filters.toggle_filter", AsyncMock(return_value=True)) as toggle,
+        ):
+            mock_subscriptions.is_subscribed = AsyncMock(return_value=True)
+            mock_subscriptions.catalog = AsyncMock(return_value=[(5, "Уфа")])
+            await filter_button(callback)
+
+        toggle.assert_called_once_with(123456789, "city", 5)
+        callback.answer.assert_called_once_with("Фильтр включен")
+        callback.message.edit_reply_markup.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_filter_button_unsubscribed(self):
+        """Тест кнопки старой клавиатуры после отписки: фильтр не меняется"""
+        callback = self.filter_callback("filter:city:5")
+
+        with (
+            patch("tg_bot.handlers.filters.subscriptions") as mock_subscriptions,
+            patch("tg_bot.handlers.filters.toggle_filter", AsyncMock()) as toggle,
+        ):
+            mock_subscriptions.is_subscribed = AsyncMock(return_value=False)
+            await filter_button(callback)
+
+        toggle.assert_not_called()
+        callback.answer.assert_called_once_with("Сначала подпишитесь на уведомления!")
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("data", ["filter:city", "filter:city:abc", "filter:planet:5", "filter:city:5:6"])
+    async def test_filter_button_malformed(self, data):
+        """Тест кнопки с некорректными данными: ответ об ошибке без исключения"""
+        callback = self.filter_callback(data)
+
+        with (
+            patch("tg_bot.handlers.filters.subscriptions") as mock_subscriptions,
+            patch("tg_bot.handlers.filters.toggle_filter", AsyncMock()) as toggle,
+        ):
+            mock_subscriptions.is_subscribed = AsyncMock(return_value=True)
+            await filter_button(callback)
+
+        toggle.assert_not_called()
+        callback.answer.assert_called_once_with("Неизвестная кнопка: откройте список фильтров заново.")
@@ -0,0 +1,88 @@
+import time
+
+from tg_bot.coalescer import EventCoalescer, merge_events, plural
+
+
+def offer(action, offer_id, **data):
+    row = {"id": offer_id, **data}
+    if action == "DELETE":
+        return {"action": action, "table": "promo_offer", "data": {}, "dataOld": row}
+    return {"action": action, "table": "promo_offer", "data": row, "dataOld": {}}
+
+
+class TestMergeEvents:
+    """Тесты правил объединения событий одной строки"""
+
+    def test_insert_then_delete_cancels_out(self):
+        """Тест того, что созданная и удаленная в одном окне строка не порождает уведомлений"""
+        assert merge_events(offer("INSERT", 1), offer("DELETE", 1)) is None
+
+    def test_insert_then_update_is_insert_with_new_data(self):
+        """Тест того, что создание и последующее изменение дают одно событие создания"""
+        merged = merge_events(offer("INSERT", 1, name="Старое"), offer("UPDATE", 1, name="Новое"))
+        assert merged["action"] == "INSERT"
+        assert merged["data"]["name"] == "Новое"
+
+    def test_update_then_update_keeps_original_old_data(self):
+        """Тест того, что цепочка изменений сравнивается с исходным состоянием"""
+        first = {**offer("UPDATE", 1, name="Б"), "dataOld": {"id": 1, "name": "А"}}
+        second = {**offer("UPDATE", 1, name="В"), "dataOld": {"id": 1, "name": "Б"}}
+        merged = merge_events(first, second)
+        assert merged["dataOld"]["name"] == "А"
+        assert merged["data"]["name"] == "В"
+
+
+class TestEventCoalescer:
+    """Тесты для окна объединения событий"""
+
+    def test_repeated_changes_collapse_into_one_event(self):
+        """Тест схлопывания повторных изменений одной строки"""
+        coalescer = EventCoalescer(window=10)
+        for name in ("А", "Б", "В"):
+            coalescer.add(offer("UPDATE", 1, name=name))
+        coalescer.add(offer("UPDATE", 2, name="Другое"))
+
+        events = coalescer.drain()
+        assert [event.value["data"]["name"] for event in events] == ["В", "Другое"]
+        assert not coalescer.pending
+
+    def test_window_closes_after_timeout(self):
+        """Тест закрытия окна по времени"""
+        coalescer = EventCoalescer(window=0.05)
+        assert coalescer.time_left() is None
+        coalescer.add(offer("INSERT", 1))
+        assert not coalescer.ready()
+        time.sleep(0.06)
+        assert coalescer.ready()
+
+    def test_window_closes_when_full(self):
+        """Тест закрытия окна при достижении max_events"""
+        coalescer = EventCoalescer(window=10, max_events=3)
+        for offer_id in range(3):
+            coalescer.add(offer("INSERT", offer_id))
+        assert coalescer.ready()
+
+    def test_digest_counts_by_table_and_action(self):
+        """Тест текста сводки с русскими формами множественного числа"""
+        coalescer = EventCoalescer(window=10, digest_threshold=5)
+        for offer_id in range(12):
+            coalescer.add(offer("INSERT", offer_id))
+        for partner_id in range(3):
+            coalescer.add({"action": "UPDATE", "table": "promo_partner", "data": {"id": partner_id}, "dataOld": {}})
+
+        events = coalescer.drain()
+        assert coalescer.needs_digest(events)
+        assert coalescer.digest(events) == "📋 Сводка изменений: 12 новых предложений, 3 обновленных партнера"
+
+    def test_plural(self):
+        """Тест выбора формы слова по числу"""
+        forms = ("предложение", "предложения", "предложений")
+        assert [plural(n, forms) for n in (1, 2, 5, 11, 21, 22, 112)] == [
+            "предложение",
+            "предложения",
+            "предложений",
+            "предложений",
+            "предложение",
+            "предложения",
+            "предложений",
+        ]
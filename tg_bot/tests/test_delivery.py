@@ -0,0 +1,165 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from tg_bot.delivery import DeliveryEngine, TokenBucket
+
+
+def make_engine(bot, **kwargs):
+    params = {"concurrency": 5, "rate_limit": 1000, "per_chat_interval": 0, "report_interval": 0}
+    params.update(kwargs)
+    return DeliveryEngine(bot, **params)
+
+
+class TestTokenBucket:
+    """Тесты для ограничителя скорости"""
+
+    @pytest.mark.asyncio
+    async def test_acquire_respects_rate(self):
+        """Тест ограничения скорости выдачи токенов"""
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        # Первый токен выдается сразу, остальные пять - с интервалом 20 мс
+        assert time.monotonic() - start >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_pause_blocks_acquire(self):
+        """Тест паузы после RetryAfter"""
+        bucket = TokenBucket(rate=1000)
+        bucket.pause(0.05)
+        start = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - start >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_rate_after_pause(self):
+        """Тест того, что после паузы токены выдаются со скоростью rate, а не пачкой за время паузы"""
+        bucket = TokenBucket(rate=30)
+        bucket.pause(0.5)
+        await bucket.acquire()
+        resumed = time.monotonic()
+        acquired = 1
+        while time.monotonic() - resumed < 0.2:
+            await bucket.acquire()
+            acquired += 1
+        # За 0.2 с при 30 сообщениях/с - около 6 токенов (без исправления - 15 накопленных за паузу сразу)
+        assert acquired <= 10
+
+
+class TestDeliveryEngine:
+    """Тесты для движка рассылки"""
+
+    @pytest.mark.asyncio
+    async def test_broadcast_sends_to_all_subscribers(self):
+        """Тест отправки сообщения всем подписчикам"""
+        bot = Mock()
+        bot.send_message = AsyncMock()
+        engine = make_engine(bot)
+        await engine.start()
+        try:
+            assert engine.broadcast([1, 2, 3], "Привет") == 3
+            await asyncio.wait_for(engine.join(), timeout=1)
+        finally:
+            await engine.stop()
+
+        sent_to = sorted(call.args[0] for call in bot.send_message.call_args_list)
+        assert sent_to == [1, 2, 3]
+        assert engine.stats()["sent"] == 3
+        assert engine.stats()["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_broadcast_does_not_wait_for_delivery(self):
+        """Тест того, что постановка в очередь не ждет отправки"""
+        bot = Mock()
+        bot.send_message = AsyncMock()
+        engine = make_engine(bot)
+
+        engine.broadcast(range(1000), "Привет")
+
+        assert bot.send_message.call_count == 0
+        assert engine.queue_depth() == 1000
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """Тест ограничения числа одновременных отправок"""
+        in_flight = 0
+        peak = 0
+
+        async def send_message(chat_id, text):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        bot = Mock()
+        bot.send_message = send_message
+        engine = make_engine(bot, concurrency=3)
+        await engine.start()
+        try:
+            engine.broadcast(range(20), "Привет")
+            await asyncio.wait_for(engine.join(), timeout=1)
+        finally:
+            await engine.stop()
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_retry_after_requeues_message(self):
+        """Тест повторной отправки после RetryAfter"""
+        bot = Mock()
+        bot.send_message = AsyncMock(side_effect=[TelegramRetryAfter(Mock(), "Flood control", 0), None])
+        engine = make_engine(bot, concurrency=1)
+        await engine.start()
+        try:
+            engine.broadcast([1], "Привет")
+            await asyncio.wait_for(engine.join(), timeout=1)
+        finally:
+            await engine.stop()
+
+        assert bot.send_message.call_count == 2
+        assert engine.stats()["retried"] == 1
+        assert engine.stats()["sent"] == 1
+
+    @pytest.mark.asyncio
+    async def test_forbidden_is_not_retried(self):
+        """Тест того, что заблокировавший бота пользователь не получает повторных попыток"""
+        bot = Mock()
+        bot.send_message = AsyncMock(side_effect=TelegramForbiddenError(Mock(), "blocked"))
+        engine = make_engine(bot)
+        await engine.start()
+        try:
+            engine.broadcast([1], "Привет")
+            await asyncio.wait_for(engine.join(), timeout=1)
+        finally:
+            await engine.stop()
+
+        assert bot.send_message.call_count == 1
+        assert engine.stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_per_chat_interval(self):
+        """Тест паузы между сообщениями в один чат"""
+        send_times = []
+
+        async def send_message(chat_id, text):
+            send_times.append(time.monotonic())
+
+        bot = Mock()
+        bot.send_message = send_message
+        engine = make_engine(bot, per_chat_interval=0.05)
+        await engine.start()
+        try:
+            engine.broadcast([1], "Первое")
+            engine.broadcast([1], "Второе")
+            await asyncio.wait_for(engine.join(), timeout=1)
+        finally:
+            await engine.stop()
+
+        assert len(send_times) == 2
+        assert send_times[1] - send_times[0] >= 0.04
@@ -0,0 +1,36 @@
+from tg_bot.formatter import MessageFormatter, entity_renderers, formatter
+
+
+class TestMessageFormatter:
+    """Тесты для табличного форматирования уведомлений"""
+
+    def test_all_configured_tables_are_registered(self):
+        """Тест того, что для всех таблиц из wal-listener/config.yml есть шаблоны"""
+        for table in ("promo_offer", "promo_category", "promo_city", "promo_partner"):
+            for action in ("INSERT", "UPDATE", "DELETE"):
+                event = {"action": action, "table": table, "data": {"name": "Н", "title": "Н"}, "dataOld": {}}
+                assert not formatter.format(event).startswith("Изменение в")
+
+    def test_partner_insert(self):
+        """Тест форматирования нового партнера"""
+        event = {"action": "INSERT", "table": "promo_partner", "data": {"name": "Уфанет"}}
+        assert formatter.format(event) == "🤝 Новый партнер: Уфанет"
+
+    def test_delete_without_old_data_uses_placeholder(self):
+        """Тест удаления без dataOld"""
+        event = {"action": "DELETE", "table": "promo_offer", "dataOld": None}
+        assert formatter.format(event) == "❌ Удалено предложение: Неизвестное предложение"
+
+    def test_malformed_event_falls_back(self):
+        """Тест того, что ошибка в данных не прерывает обработку"""
+        event = {"action": "INSERT", "table": "promo_category", "data": {}}
+        assert formatter.format(event) == "Произошло изменение в promo_category: INSERT"
+
+    def test_register_custom_renderer(self):
+        """Тест подключения рендера для новой таблицы"""
+        custom = MessageFormatter()
+        custom.register_table("promo_tag", entity_renderers("label", "Новый тег", "Тег изменен", "Тег удален", "?"))
+        custom.register("promo_tag", "TRUNCATE", lambda data: "Теги очищены")
+
+        assert custom.format({"action": "INSERT", "table": "promo_tag", "data": {"label": "A"}}) == "Новый тег: A"
+        assert custom.format({"action": "TRUNCATE", "table": "promo_tag"}) == "Теги очищены"
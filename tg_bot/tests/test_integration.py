@@ -10,6 +10,8 @@ from tg_bot.handlers.common import cmd_start
 from tg_bot.handlers.subscription import subscribe_to_notifications, unsubscribe_from_notifications
 from tg_bot.db_utils import get_all_subscribed_users, load_subscribers, save_subscribers
 from tg_bot.kafka_consumer import TelegramKafkaConsumer
+from tg_bot.subscribers import SubscriberRegistry
+from tg_bot.subscription_store import FileSubscriptionStore
 
 
 class TestIntegration:
@@ -26,20 +28,19 @@ class TestIntegration:
                 message = Mock(spec=Message)
                 message.from_user = Mock(spec=User)
                 message.from_user.id = 123456789
+                message.from_user.username = "test_user"
                 message.text = "📝 Подписаться на уведомления"
                 message.answer = AsyncMock()
 
-                with patch("tg_bot.handlers.subscription.load_subscribers", return_value=set()) as mock_load:
-                    with patch("tg_bot.handlers.subscription.save_subscribers") as mock_save:
-                        await subscribe_to_notifications(message)
-                        mock_save.assert_called_once()
-                        message.answer.assert_called_once_with("Вы подписались на уведомления о новых акциях и предложениях!")
-                        # Явно сохраняем подписчика в файл
-                        save_subscribers({123456789})
-                        loaded_subscribers = load_subscribers()
-                        assert 123456789 in loaded_subscribers
-                        user_list = get_all_subscribed_users()
-                        assert 123456789 in user_list
+                with patch("tg_bot.handlers.subscription.subscriptions", FileSubscriptionStore(SubscriberRegistry())) as store:
+                    await subscribe_to_notifications(message)
+                    message.answer.assert_called_once_with("Вы подписались на уведомления о новых акциях и предложениях!")
+                    assert 123456789 in store.registry
+                    # Подписчик дописан в файл
+                    loaded_subscribers = load_subscribers()
+                    assert 123456789 in loaded_subscribers
+                    user_list = get_all_subscribed_users()
+                    assert 123456789 in user_list
         finally:
             if os.path.exists(temp_file):
                 os.unlink(temp_file)
@@ -56,15 +57,16 @@ class TestIntegration:
                 message = Mock(spec=Message)
                 message.from_user = Mock(spec=User)
                 message.from_user.id = 123456789
+                message.from_user.username = "test_user"
                 message.text = "Отписаться от уведомлений"
                 message.answer = AsyncMock()
 
-                with patch("tg_bot.handlers.subscription.load_subscribers", return_value={123456789, 987654321}) as mock_load:
-                    with patch("tg_bot.handlers.subscription.save_subscribers") as mock_save:
-                        await unsubscribe_from_notifications(message)
+                with patch("tg_bot.handlers.subscription.subscriptions", FileSubscriptionStore(SubscriberRegistry())) as store:
+                    await unsubscribe_from_notifications(message)
 
-                        mock_save.assert_called_once()
-                        message.answer.assert_called_once_with("Вы отписались от уведомлений о новых акциях и предложениях.")
+                    message.answer.assert_called_once_with("Вы отписались от уведомлений о новых акциях и предложениях.")
+                    assert 123456789 not in store.registry
+                    assert load_subscribers() == {987654321}
 
         finally:
             if os.path.exists(temp_file):
@@ -101,7 +103,7 @@ class TestIntegration:
                         ]
                         mock_kafka_class.return_value = mock_consumer
                         kafka_consumer = TelegramKafkaConsumer([])
-                        kafka_consumer.get_subscribers = lambda: get_all_subscribed_users()
+                        kafka_consumer.subscriptions = FileSubscriptionStore(SubscriberRegistry())
                         try:
                             await asyncio.wait_for(kafka_consumer.process_messages(), timeout=0.01)
                         except asyncio.TimeoutError:
@@ -4,13 +4,14 @@ from unittest.mock import AsyncMock, Mock, patch
 import pytest
 
 from tg_bot.kafka_consumer import TelegramKafkaConsumer
+from tg_bot.routing import RoutingIndex
+from tg_bot.subscription_store import FileSubscriptionStore
 
 
 class TestKafkaConsumer:
     """Тесты для Kafka consumer"""
 
-    @pytest.mark.asyncio
-    async def test_format_message_insert(self):
+    def test_format_message_insert(self):
         """Тест форматирования сообщения INSERT"""
         with patch("tg_bot.kafka_consumer.Bot"):
             consumer = TelegramKafkaConsumer([])
@@ -18,11 +19,10 @@ class TestKafkaConsumer:
             message = Mock()
             message.value = {"action": "INSERT", "table": "promo_category", "data": {"name": "Новая категория"}}
 
-            result = await consumer.format_message(message)
+            result = consumer.format_message(message)
             assert "🆕 Новая категория: Новая категория" in result
 
-    @pytest.mark.asyncio
-    async def test_format_message_update(self):
+    def test_format_message_update(self):
         """Тест форматирования сообщения UPDATE"""
         with patch("tg_bot.kafka_consumer.Bot"):
             consumer = TelegramKafkaConsumer([])
@@ -35,11 +35,10 @@ class TestKafkaConsumer:
                 "dataOld": {"title": "Старое название"},
             }
 
-            result = await consumer.format_message(message)
+            result = consumer.format_message(message)
             assert "📝 Обновлено предложение: Старое название → Новое название" in result
 
-    @pytest.mark.asyncio
-    async def test_format_message_delete(self):
+    def test_format_message_delete(self):
         """Тест форматирования сообщения DELETE"""
         with patch("tg_bot.kafka_consumer.Bot"):
             consumer = TelegramKafkaConsumer([])
@@ -47,17 +46,16 @@ class TestKafkaConsumer:
             message = Mock()
             message.value = {"action": "DELETE", "table": "promo_city", "dataOld": {"name": "Удаленный город"}}
 
-            result = await consumer.format_message(message)
+            result = consumer.format_message(message)
             assert "❌ Удален город: Удаленный город" in result
 
-    @pytest.mark.asyncio
-    async def test_format_message_unknown_action(self):
+    def test_format_message_unknown_action(self):
         """Тест форматирования сообщения с неизвестным действием"""
         with patch("tg_bot.kafka_consumer.Bot"):
             consumer = TelegramKafkaConsumer([])
             message = Mock()
             message.value = {"action": "UNKNOWN", "table": "test_table", "data": {"name": "Тест"}}
-            result = await consumer.format_message(message)
+            result = consumer.format_message(message)
             assert "Изменение в test_table: UNKNOWN" in result
 
     @pytest.mark.asyncio
@@ -159,3 +157,207 @@ class TestKafkaConsumer:
                     pass
                 # Ошибка в сообщении, send_message не вызывается
                 assert mock_bot.send_message.call_count == 0
+
+    @pytest.mark.asyncio
+    async def test_poll_does_not_block_event_loop(self):
+        """Тест того, что блокирующий poll выполняется вне event loop"""
+        import threading
+        import time
+
+        poll_threads = []
+
+        def blocking_poll(timeout_ms):
+            poll_threads.append(threading.current_thread().name)
+            time.sleep(0.2)
+            return {}
+
+        with patch("tg_bot.kafka_consumer.Bot"):
+            with patch("tg_bot.kafka_consumer.KafkaConsumer") as mock_kafka_class:
+                mock_consumer = Mock()
+                mock_consumer.poll.side_effect = blocking_poll
+                mock_kafka_class.return_value = mock_consumer
+                consumer = TelegramKafkaConsumer([])
+
+                task = asyncio.create_task(consumer.process_messages())
+                # Пока poll заблокирован, event loop должен откликаться без задержек
+                lags = []
+                for _ in range(10):
+                    start = time.monotonic()
+                    await asyncio.sleep(0.005)
+                    lags.append(time.monotonic() - start)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                consumer.close()
+
+        assert poll_threads
+        assert all(name.startswith("kafka-poller") for name in poll_threads)
+        assert max(lags) < 0.1
+
+    @pytest.mark.asyncio
+    async def test_process_messages_enqueues_and_commits(self):
+        """Тест сохранения уведомления в outbox и ручного коммита offset"""
+        with patch("tg_bot.kafka_consumer.Bot") as mock_bot_class:
+            with patch("tg_bot.kafka_consumer.KafkaConsumer") as mock_kafka_class:
+                mock_bot = Mock()
+                mock_bot.send_message = AsyncMock()
+                mock_bot_class.return_value = mock_bot
+                topic = Mock(topic="wal_listener.promo_categories", partition=0)
+                record = Mock(
+                    value={"action": "INSERT", "table": "promo_category", "data": {"name": "Категория"}},
+                    topic="wal_listener.promo_categories",
+                    partition=0,
+                    offset=41,
+                )
+                mock_consumer = Mock()
+                # Одно и то же сообщение приходит дважды (например, после ребалансировки)
+                mock_consumer.poll.side_effect = [{topic: [record]}, {topic: [record]}] + [{}] * 100
+                mock_kafka_class.return_value = mock_consumer
+                consumer = TelegramKafkaConsumer([])
+                consumer.subscriptions = FileSubscriptionStore(Mock(user_ids=Mock(return_value=[1, 2])))
+                consumer.delivery.flush_interval = 0.01
+                consumer.coalescer.window = 0
+
+                with patch("tg_bot.kafka_consumer.OffsetAndMetadata", lambda offset, metadata: offset):
+                    task = asyncio.create_task(consumer.process_messages())
+                    await asyncio.sleep(0.1)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                pending = await consumer.outbox.pending_count()
+                consumer.close()
+
+        sent_to = sorted(call.args[0] for call in mock_bot.send_message.call_args_list)
+        assert sent_to == [1, 2]
+        assert pending == 0
+        mock_consumer.commit.assert_called()
+        committed = mock_consumer.commit.call_args.args[0]
+        assert committed[topic] == 42
+
+    @pytest.mark.asyncio
+    async def test_burst_is_sent_as_single_digest(self):
+        """Тест объединения всплеска изменений в одно сводное уведомление"""
+        with patch("tg_bot.kafka_consumer.Bot") as mock_bot_class:
+            with patch("tg_bot.kafka_consumer.KafkaConsumer") as mock_kafka_class:
+                mock_bot = Mock()
+                mock_bot.send_message = AsyncMock()
+                mock_bot_class.return_value = mock_bot
+                topic = Mock(topic="wal_listener.promo_offers", partition=0)
+                records = [
+                    Mock(
+                        value={"action": "INSERT", "table": "promo_offer", "data": {"id": offer_id}, "dataOld": {}},
+                        offset=offer_id,
+                    )
+                    for offer_id in range(10)
+                ]
+                mock_consumer = Mock()
+                mock_consumer.poll.side_effect = [{topic: records[:5]}, {topic: records[5:]}] + [{}] * 100
+                mock_kafka_class.return_value = mock_consumer
+                consumer = TelegramKafkaConsumer([])
+                consumer.subscriptions = FileSubscriptionStore(Mock(user_ids=Mock(return_value=[1])))
+                consumer.delivery.flush_interval = 0.01
+                consumer.coalescer.window = 0.05
+
+                with patch("tg_bot.kafka_consumer.OffsetAndMetadata", lambda offset, metadata: offset):
+                    task = asyncio.create_task(consumer.process_messages())
+                    await asyncio.sleep(0.2)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                consumer.close()
+
+        assert mock_bot.send_message.call_count == 1
+        assert "10 новых предложений" in mock_bot.send_message.call_args.args[1]
+        assert mock_consumer.commit.call_args.args[0][topic] == 10
+
+    @pytest.mark.asyncio
+    async def test_filtered_subscribers_receive_only_matching_events(self):
+        """Тест того, что пользователь с фильтром получает только подходящие события"""
+        with patch("tg_bot.kafka_consumer.Bot") as mock_bot_class:
+            with patch("tg_bot.kafka_consumer.KafkaConsumer") as mock_kafka_class:
+                mock_bot = Mock()
+                mock_bot.send_message = AsyncMock()
+                mock_bot_class.return_value = mock_bot
+                topic = Mock(topic="wal_listener.promo_offers", partition=0)
+                records = [
+                    Mock(
+                        value={
+                            "action": "INSERT",
+                            "table": "promo_offer",
+                            "data": {"id": offer_id, "title": f"Акция {offer_id}", "city_id": offer_id, "category_id": 1},
+                            "dataOld": {},
+                        },
+                        offset=offer_id,
+                    )
+                    for offer_id in (1, 2)
+                ]
+                mock_consumer = Mock()
+                mock_consumer.poll.side_effect = [{topic: records}] + [{}] * 100
+                mock_kafka_class.return_value = mock_consumer
+                consumer = TelegramKafkaConsumer([])
+                consumer.subscriptions = FileSubscriptionStore(Mock(user_ids=Mock(return_value=[1, 2])))
+                consumer.routing = RoutingIndex()
+                consumer.routing.load([(2, "city", 2)])
+                consumer.delivery.flush_interval = 0.01
+                consumer.delivery.per_chat_interval = 0
+                consumer.coalescer.window = 0
+
+                with patch("tg_bot.kafka_consumer.OffsetAndMetadata", lambda offset, metadata: offset):
+                    task = asyncio.create_task(consumer.process_messages())
+                    await asyncio.sleep(0.1)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                consumer.close()
+
+        sent = sorted((call.args[0], call.args[1]) for call in mock_bot.send_message.call_args_list)
+        assert sent == [
+            (1, "🆕 Новое предложение: Акция 1"),
+            (1, "🆕 Новое предложение: Акция 2"),
+            (2, "🆕 Новое предложение: Акция 2"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_replay_with_other_window_boundaries_is_not_resent(self, tmp_path):
+        """Тест того, что после сбоя до коммита offset повторно прочитанные события не рассылаются снова"""
+        topic = Mock(topic="wal_listener.promo_offers", partition=0)
+        records = [
+            Mock(
+                value={
+                    "action": "INSERT",
+                    "table": "promo_offer",
+                    "data": {"id": offer_id, "title": f"Акция {offer_id}"},
+                    "dataOld": {},
+                },
+                offset=offer_id,
+            )
+            for offer_id in range(6)
+        ]
+        sent = []
+
+        async def run(batches):
+            with patch("tg_bot.kafka_consumer.Bot") as mock_bot_class:
+                with patch("tg_bot.kafka_consumer.KafkaConsumer") as mock_kafka_class:
+                    mock_bot = Mock()
+                    mock_bot.send_message = AsyncMock(side_effect=lambda chat_id, text, **kwargs: sent.append(text))
+                    mock_bot_class.return_value = mock_bot
+                    mock_consumer = Mock()
+                    mock_consumer.poll.side_effect = batches + [{}] * 100
+                    # Коммит не проходит: сообщения будут прочитаны повторно
+                    mock_consumer.commit.side_effect = Exception("Коммит не выполнен")
+                    mock_kafka_class.return_value = mock_consumer
+                    with patch("tg_bot.kafka_consumer.OUTBOX_PATH", str(tmp_path / "outbox.sqlite3")):
+                        consumer = TelegramKafkaConsumer([])
+                    consumer.subscriptions = FileSubscriptionStore(Mock(user_ids=Mock(return_value=[1])))
+                    consumer.delivery.flush_interval = 0.01
+                    consumer.delivery.per_chat_interval = 0
+                    consumer.coalescer.window = 0
+
+                    with patch("tg_bot.kafka_consumer.OffsetAndMetadata", lambda offset, metadata: offset):
+                        task = asyncio.create_task(consumer.process_messages())
+                        await asyncio.sleep(0.1)
+                        task.cancel()
+                        await asyncio.gather(task, return_exceptions=True)
+                    consumer.close()
+
+        await run([{topic: records[:4]}])
+        # После перезапуска те же offset приходят другими пачками, и окна закрываются на других границах
+        await run([{topic: records[:2]}, {topic: records[2:]}])
+
+        assert sorted(sent) == [f"🆕 Новое предложение: Акция {offer_id}" for offer_id in range(6)]
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+
+from urllib.request import urlopen
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter, generate_latest
+
+from tg_bot.log import SAMPLED, JsonFormatter, SamplingFilter
+from tg_bot.metrics import (
+    DELIVERY_QUEUE_DEPTH,
+    KAFKA_MESSAGES,
+    SEND_ERRORS,
+    SEND_SECONDS,
+    parse_addr,
+    registry,
+    start_metrics_server,
+)
+
+
+class TestMetrics:
+    """Тесты для метрик в формате Prometheus"""
+
+    def test_bot_metrics_names(self):
+        """Тест имен и типов метрик бота в выдаче /metrics"""
+        KAFKA_MESSAGES.labels("wal_listener.promo_offers").inc(3)
+        SEND_ERRORS.labels("TelegramForbiddenError").inc()
+        SEND_SECONDS.observe(0.02)
+        DELIVERY_QUEUE_DEPTH.set_function(lambda: 7)
+
+        text = generate_latest(registry).decode()
+        assert "# TYPE tg_bot_kafka_messages_total counter" in text
+        assert 'tg_bot_kafka_messages_total{topic="wal_listener.promo_offers"}' in text
+        assert 'tg_bot_send_errors_total{error="TelegramForbiddenError"}' in text
+        assert 'tg_bot_send_seconds_bucket{le="300.0"}' in text
+        assert "tg_bot_delivery_queue_depth 7.0" in text
+        assert "_created" not in text
+
+    def test_parse_addr(self):
+        """Тест разбора адреса в стиле monitoring.promAddr"""
+        assert parse_addr(":2113") == ("0.0.0.0", 2113)
+        assert parse_addr("127.0.0.1:9000") == ("127.0.0.1", 9000)
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self):
+        """Тест HTTP-эндпоинта /metrics"""
+        metrics_registry = CollectorRegistry()
+        Counter("requests", "Запросы", registry=metrics_registry).inc()
+        server = start_metrics_server("127.0.0.1:0", metrics_registry)
+        port = server.server_address[1]
+        try:
+            with await asyncio.to_thread(urlopen, f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                status, body = response.status, response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert status == 200
+        assert "requests_total 1.0" in body
+        assert start_metrics_server("") is None
+
+
+class TestLogging:
+    """Тесты для структурированного логирования"""
+
+    def make_record(self, msg, **extra):
+        record = logging.LogRecord("tg_bot.test", logging.DEBUG, __file__, 1, msg, (), None)
+        for key, value in extra.items():
+            setattr(record, key, value)
+        return record
+
+    def test_sampling_filter(self):
+        """Тест прореживания частых записей"""
+        sampler = SamplingFilter(rate=0.1)
+        passed = sum(sampler.filter(self.make_record("Получено сообщение", **SAMPLED)) for _ in range(100))
+        assert passed == 10
+        # Записи без пометки не прореживаются
+        assert all(sampler.filter(self.make_record("Ошибка")) for _ in range(10))
+
+    def test_json_formatter_includes_extra(self):
+        """Тест JSON-формата с полями из extra"""
+        entry = json.loads(JsonFormatter().format(self.make_record("Статистика", sent=5)))
+        assert entry["message"] == "Статистика"
+        assert entry["level"] == "DEBUG"
+        assert entry["sent"] == 5
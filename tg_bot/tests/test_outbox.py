@@ -0,0 +1,153 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from tg_bot.delivery import DeliveryEngine
+from tg_bot.outbox import DELIVERED, FAILED, DeliveryOutbox
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+
+def make_engine(bot, outbox):
+    return DeliveryEngine(
+        bot, concurrency=2, rate_limit=1000, per_chat_interval=0, report_interval=0, outbox=outbox, flush_interval=0.01
+    )
+
+
+class TestDeliveryOutbox:
+    """Тесты для персистентной очереди рассылки"""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_and_claim(self, outbox_path):
+        """Тест сохранения уведомления и выборки получателей пачками"""
+        outbox = DeliveryOutbox(outbox_path)
+        try:
+            assert await outbox.enqueue("topic:0:1", "Привет", [1, 2, 3]) == 3
+            first = await outbox.claim(0, 2)
+            second = await outbox.claim(first[-1][0], 2)
+        finally:
+            outbox.close()
+
+        assert [row[1] for row in first] == [1, 2]
+        assert [row[1] for row in second] == [3]
+        assert all(row[2] == "Привет" for row in first + second)
+
+    @pytest.mark.asyncio
+    async def test_duplicate_event_is_ignored(self, outbox_path):
+        """Тест того, что повторно прочитанное событие не создает дубликатов"""
+        outbox = DeliveryOutbox(outbox_path)
+        try:
+            await outbox.enqueue("topic:0:1", "Привет", [1, 2])
+            assert await outbox.enqueue("topic:0:1", "Привет", [1, 2]) == 0
+            assert await outbox.pending_count() == 2
+        finally:
+            outbox.close()
+
+    @pytest.mark.asyncio
+    async def test_mark_removes_from_pending(self, outbox_path):
+        """Тест сохранения результатов доставки"""
+        outbox = DeliveryOutbox(outbox_path)
+        try:
+            await outbox.enqueue("topic:0:1", "Привет", [1, 2, 3])
+            rows = await outbox.claim(0, 10)
+            await outbox.mark([(rows[0][0], DELIVERED), (rows[1][0], FAILED)])
+            remaining = await outbox.claim(0, 10)
+            await outbox.purge(retention=0)
+            assert await outbox.pending_count() == 1
+        finally:
+            outbox.close()
+
+        assert [row[1] for row in remaining] == [3]
+
+    @pytest.mark.asyncio
+    async def test_purge_keeps_pending_notifications(self, outbox_path):
+        """Тест того, что очистка не удаляет недоставленные уведомления"""
+        outbox = DeliveryOutbox(outbox_path)
+        try:
+            await outbox.enqueue("topic:0:1", "Первое", [1])
+            await outbox.enqueue("topic:0:2", "Второе", [1])
+            rows = await outbox.claim(0, 10)
+            await outbox.mark([(rows[0][0], DELIVERED)])
+            await outbox.purge(retention=0)
+            remaining = await outbox.claim(0, 10)
+            # Удаленное уведомление снова принимается, т.к. истек срок хранения
+            assert await outbox.enqueue("topic:0:1", "Первое", [1]) == 1
+        finally:
+            outbox.close()
+
+        assert [row[2] for row in remaining] == ["Второе"]
+
+    @pytest.mark.asyncio
+    async def test_enqueue_window_saves_processed_ranges(self, outbox_path):
+        """Тест сохранения диапазонов offset окна вместе с уведомлениями"""
+        outbox = DeliveryOutbox(outbox_path)
+        try:
+            queued = await outbox.enqueue_window(
+                [("topic:0:10-20#0", "Первое", [1, 2]), ("topic:0:10-20#1", "Второе", [])],
+                {("topic", 0): (10, 20)},
+            )
+            overlapping = await outbox.processed_ranges({("topic", 0): (15, 30), ("topic", 1): (15, 30)})
+            after = await outbox.processed_ranges({("topic", 0): (21, 30)})
+            await outbox.purge(retention=-1)
+            purged = await outbox.processed_ranges({("topic", 0): (15, 30)})
+        finally:
+            outbox.close()
+
+        assert queued == 2
+        assert overlapping == {("topic", 0): [(10, 20)]}
+        assert after == {}
+        assert purged == {}
+
+
+class TestDeliveryEngineWithOutbox:
+    """Тесты рассылки из персистентной очереди"""
+
+    @pytest.mark.asyncio
+    async def test_resume_after_restart(self, outbox_path):
+        """Тест продолжения рассылки после перезапуска без повторной отправки"""
+        outbox = DeliveryOutbox(outbox_path)
+        await outbox.enqueue("topic:0:1", "Привет", [1, 2, 3, 4])
+        # Первый запуск успел доставить сообщение двум пользователям и упал
+        rows = await outbox.claim(0, 2)
+        await outbox.mark([(row[0], DELIVERED) for row in rows])
+        outbox.close()
+
+        bot = Mock()
+        bot.send_message = AsyncMock()
+        outbox = DeliveryOutbox(outbox_path)
+        engine = make_engine(bot, outbox)
+        await engine.start()
+        try:
+            await asyncio.sleep(0.05)
+            await asyncio.wait_for(engine.join(), timeout=1)
+        finally:
+            await engine.stop()
+        pending = await outbox.pending_count()
+        outbox.close()
+
+        sent_to = sorted(call.args[0] for call in bot.send_message.call_args_list)
+        assert sent_to == [3, 4]
+        assert pending == 0
+
+    @pytest.mark.asyncio
+    async def test_notify_wakes_up_feeder(self, outbox_path):
+        """Тест того, что новые уведомления забираются сразу после notify"""
+        bot = Mock()
+        bot.send_message = AsyncMock()
+        outbox = DeliveryOutbox(outbox_path)
+        engine = make_engine(bot, outbox)
+        await engine.start()
+        try:
+            await asyncio.sleep(0.02)
+            await outbox.enqueue("topic:0:1", "Привет", [1])
+            engine.notify()
+            await asyncio.sleep(0.1)
+        finally:
+            await engine.stop()
+            outbox.close()
+
+        bot.send_message.assert_called_once_with(1, "Привет")
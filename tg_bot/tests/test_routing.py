@@ -0,0 +1,114 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from aiogram.filters import CommandObject
+
+from tg_bot.coalescer import CoalescedEvent
+from tg_bot.handlers import filters as filters_handlers
+from tg_bot.routing import RoutingIndex
+from tg_bot.subscribers import SubscriberRegistry
+from tg_bot.subscription_store import FileSubscriptionStore
+
+
+def offer(city_id, category_id, partner_id=1, action="INSERT"):
+    row = {"id": 1, "title": "Акция", "city_id": city_id, "category_id": category_id, "partner_id": partner_id}
+    return {"action": action, "table": "promo_offer", "data": row, "dataOld": {}}
+
+
+class TestRoutingIndex:
+    """Тесты для индекса маршрутизации уведомлений"""
+
+    def make_index(self):
+        index = RoutingIndex()
+        index.load(
+            [
+                (1, "city", 10),
+                (2, "city", 10),
+                (2, "category", 5),
+                (3, "category", 5),
+                (3, "category", 6),
+                (4, "partner", 7),
+            ]
+        )
+        return index
+
+    def test_offer_matches_all_filtered_kinds(self):
+        """Тест того, что акция должна подходить под фильтр каждого выбранного вида"""
+        index = self.make_index()
+        assert index.match(offer(city_id=10, category_id=5)) == {1, 2, 3}
+        assert index.match(offer(city_id=10, category_id=8)) == {1}
+        assert index.match(offer(city_id=11, category_id=6)) == {3}
+        assert index.match(offer(city_id=11, category_id=8, partner_id=7)) == {4}
+
+    def test_directory_event_goes_to_object_subscribers(self):
+        """Тест маршрутизации изменений справочников"""
+        index = self.make_index()
+        event = {"action": "UPDATE", "table": "promo_city", "data": {"id": 10, "name": "Уфа"}}
+        assert index.match(event) == {1, 2}
+
+    def test_delete_uses_old_data(self):
+        """Тест маршрутизации удаления по dataOld"""
+        index = self.make_index()
+        event = {"action": "DELETE", "table": "promo_offer", "data": {}, "dataOld": offer(10, 9)["data"]}
+        assert index.match(event) == {1}
+
+    def test_route_and_remove_user(self):
+        """Тест маршрутов по набору событий и удаления пользователя из индекса"""
+        index = self.make_index()
+        events = [CoalescedEvent(offer(10, 5)), CoalescedEvent(offer(12, 6))]
+        assert index.route(events) == {1: [0], 2: [0], 3: [0, 1]}
+
+        index.remove_user(3)
+        assert 3 not in index.filtered_users
+        assert index.route(events) == {1: [0], 2: [0]}
+
+
+class TestFilterStorage:
+    """Тесты хранения фильтров и обработчиков бота"""
+
+    @pytest.mark.asyncio
+    async def test_file_store_filters(self, tmp_path):
+        """Тест фильтров в файловом хранилище"""
+        registry = SubscriberRegistry(str(tmp_path / "subscribers.txt"))
+        store = FileSubscriptionStore(registry, filters_path=str(tmp_path / "filters.txt"))
+        await store.subscribe(1)
+
+        assert await store.add_filter(1, "city", 10) is True
+        assert await store.add_filter(1, "city", 10) is False
+        await store.add_filter(2, "city", 10)
+        # Фильтры неподписанных пользователей не участвуют в маршрутизации
+        assert await store.active_filters() == [(1, "city", 10)]
+
+        reloaded = FileSubscriptionStore(registry, filters_path=str(tmp_path / "filters.txt"))
+        assert await reloaded.remove_filter(1, "city", 10) is True
+        assert await reloaded.clear_filters(2) == 1
+        assert await FileSubscriptionStore(registry, str(tmp_path / "filters.txt")).active_filters() == []
+
+    @pytest.mark.asyncio
+    async def test_city_command_toggles_filter(self, tmp_path, mock_message, monkeypatch):
+        """Тест включения и выключения фильтра командой /city"""
+        registry = SubscriberRegistry(str(tmp_path / "subscribers.txt"))
+        store = FileSubscriptionStore(registry, filters_path=str(tmp_path / "filters.txt"))
+        index = RoutingIndex()
+        monkeypatch.setattr(filters_handlers, "subscriptions", store)
+        monkeypatch.setattr(filters_handlers, "routing", index)
+        await store.subscribe(mock_message.from_user.id)
+
+        command = CommandObject(command="city", args="10")
+        await filters_handlers.choose_city(mock_message, command)
+        assert index.filters(mock_message.from_user.id) == {"city": {10}}
+        assert "добавлен" in mock_message.answer.call_args.args[0]
+
+        await filters_handlers.choose_city(mock_message, command)
+        assert index.filters(mock_message.from_user.id) == {}
+        assert await store.active_filters() == []
+
+    @pytest.mark.asyncio
+    async def test_city_command_requires_subscription(self, mock_message, monkeypatch):
+        """Тест того, что фильтры доступны только подписчикам"""
+        store = Mock(is_subscribed=AsyncMock(return_value=False))
+        monkeypatch.setattr(filters_handlers, "subscriptions", store)
+
+        await filters_handlers.choose_city(mock_message, CommandObject(command="city", args="10"))
+
+        mock_message.answer.assert_called_once_with("Сначала подпишитесь на уведомления!")
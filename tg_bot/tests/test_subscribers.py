@@ -0,0 +1,97 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from tg_bot.subscribers import SubscriberRegistry
+
+
+@pytest.fixture
+def subscribers_path():
+    """Временный файл с двумя подписчиками"""
+    with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".txt") as f:
+        f.write("111\n222\n")
+        path = f.name
+    yield path
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+class TestSubscriberRegistry:
+    """Тесты для реестра подписчиков"""
+
+    def test_loads_subscribers_from_file(self, subscribers_path):
+        """Тест загрузки подписчиков из файла"""
+        registry = SubscriberRegistry(subscribers_path)
+        assert registry.user_ids() == {111, 222}
+        assert 111 in registry
+        assert 333 not in registry
+        assert len(registry) == 2
+
+    def test_missing_file(self):
+        """Тест работы без файла подписчиков"""
+        registry = SubscriberRegistry("/nonexistent/subscribers.txt")
+        assert registry.user_ids() == frozenset()
+        assert 111 not in registry
+
+    def test_file_is_not_reread_without_changes(self, subscribers_path):
+        """Тест того, что неизмененный файл не перечитывается"""
+        registry = SubscriberRegistry(subscribers_path, check_interval=0)
+        registry.user_ids()
+
+        with patch("builtins.open") as mock_open:
+            assert registry.refresh() is False
+            assert 111 in registry
+            mock_open.assert_not_called()
+
+    def test_reloads_after_external_change(self, subscribers_path):
+        """Тест перезагрузки после изменения файла другим процессом"""
+        registry = SubscriberRegistry(subscribers_path, check_interval=0)
+        assert 333 not in registry
+
+        with open(subscribers_path, "a") as f:
+            f.write("333\n")
+
+        assert 333 in registry
+
+    def test_check_interval_throttles_stat(self, subscribers_path):
+        """Тест того, что файл проверяется не чаще check_interval"""
+        registry = SubscriberRegistry(subscribers_path, check_interval=60)
+        registry.user_ids()
+
+        with patch("tg_bot.subscribers.os.stat") as mock_stat:
+            for _ in range(10):
+                assert 111 in registry
+            mock_stat.assert_not_called()
+
+    def test_add_appends_to_file(self, subscribers_path):
+        """Тест того, что подписка дописывает строку в конец файла"""
+        registry = SubscriberRegistry(subscribers_path)
+
+        assert registry.add(333) is True
+        assert registry.add(333) is False
+        assert 333 in registry
+
+        with open(subscribers_path) as f:
+            assert f.read() == "111\n222\n333\n"
+
+    def test_remove_rewrites_file(self, subscribers_path):
+        """Тест отписки"""
+        registry = SubscriberRegistry(subscribers_path)
+
+        assert registry.remove(111) is True
+        assert registry.remove(111) is False
+        assert registry.user_ids() == {222}
+
+        with open(subscribers_path) as f:
+            assert f.read() == "222\n"
+
+    def test_own_writes_do_not_trigger_reload(self, subscribers_path):
+        """Тест того, что собственные изменения не вызывают повторного чтения файла"""
+        registry = SubscriberRegistry(subscribers_path, check_interval=0)
+        registry.add(333)
+        registry.remove(111)
+
+        assert registry.refresh() is False
+        assert registry.user_ids() == {222, 333}
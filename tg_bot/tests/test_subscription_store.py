@@ -0,0 +1,154 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, Mock
+
+import pytest
+
+from tg_bot.subscribers import SubscriberRegistry
+from tg_bot.subscription_store import (
+    FileSubscriptionStore,
+    PostgresSubscriptionStore,
+    create_subscription_store,
+    split_into_runs,
+)
+
+
+def make_pool(connection):
+    """Создает мок пула asyncpg, отдающий переданное соединение"""
+    pool = Mock()
+    acquire = MagicMock()
+    acquire.__aenter__ = AsyncMock(return_value=connection)
+    acquire.__aexit__ = AsyncMock(return_value=False)
+    pool.acquire = Mock(return_value=acquire)
+    pool.close = AsyncMock()
+    return pool
+
+
+def make_connection():
+    connection = Mock()
+    transaction = MagicMock()
+    transaction.__aenter__ = AsyncMock()
+    transaction.__aexit__ = AsyncMock(return_value=False)
+    connection.transaction = Mock(return_value=transaction)
+    return connection
+
+
+class TestFileSubscriptionStore:
+    """Тесты для файлового хранилища подписок"""
+
+    @pytest.mark.asyncio
+    async def test_subscribe_and_stream(self, tmp_path):
+        """Тест подписки и потоковой выдачи подписчиков"""
+        store = FileSubscriptionStore(SubscriberRegistry(str(tmp_path / "subscribers.txt")))
+
+        assert await store.subscribe(1) is True
+        assert await store.subscribe(1) is False
+        assert await store.subscribe(2) is True
+        assert await store.unsubscribe(3) is False
+
+        batches = [batch async for batch in store.iter_user_ids(batch_size=1)]
+        assert sorted(user_id for batch in batches for user_id in batch) == [1, 2]
+        assert all(len(batch) == 1 for batch in batches)
+
+
+class TestPostgresSubscriptionStore:
+    """Тесты для хранилища подписок в PostgreSQL"""
+
+    def test_split_into_runs(self):
+        """Тест разбиения операций на группы без повторов пользователя"""
+        ops = [("subscribe", 1), ("subscribe", 2), ("subscribe", 1), ("unsubscribe", 2), ("unsubscribe", 3)]
+        runs = split_into_runs(ops)
+        assert [(kind, [op[1] for op in run]) for kind, run in runs] == [
+            ("subscribe", [1, 2]),
+            ("subscribe", [1]),
+            ("unsubscribe", [2, 3]),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_subscribes_are_batched(self):
+        """Тест того, что одновременные подписки записываются одним запросом"""
+        connection = make_connection()
+        connection.fetch = AsyncMock(
+            return_value=[
+                {"user_id": 1, "was_active": None},
+                {"user_id": 2, "was_active": True},
+                {"user_id": 3, "was_active": False},
+            ]
+        )
+        store = PostgresSubscriptionStore(pool=make_pool(connection), flush_interval=0.01)
+
+        results = await asyncio.gather(store.subscribe(1, "a"), store.subscribe(2, "b"), store.subscribe(3))
+
+        assert results == [True, False, True]
+        connection.fetch.assert_called_once()
+        args = connection.fetch.call_args.args
+        assert args[1] == [1, 2, 3]
+        assert args[2] == ["a", "b", None]
+
+    @pytest.mark.asyncio
+    async def test_batch_size_triggers_flush(self):
+        """Тест записи пакета при достижении batch_size без ожидания таймера"""
+        connection = make_connection()
+        connection.fetch = AsyncMock(return_value=[{"user_id": 1}, {"user_id": 2}])
+        store = PostgresSubscriptionStore(pool=make_pool(connection), batch_size=2, flush_interval=60)
+
+        results = await asyncio.wait_for(asyncio.gather(store.unsubscribe(1), store.unsubscribe(2)), timeout=1)
+
+        assert results == [True, True]
+        connection.fetch.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_flush_error_is_propagated(self):
+        """Тест передачи ошибки БД всем ожидающим операциям"""
+        connection = make_connection()
+        connection.fetch = AsyncMock(side_effect=RuntimeError("db is down"))
+        store = PostgresSubscriptionStore(pool=make_pool(connection), flush_interval=0)
+
+        with pytest.raises(RuntimeError):
+            await store.subscribe(1)
+
+    @pytest.mark.asyncio
+    async def test_results_are_reported_after_commit(self):
+        """Тест того, что при ошибке следующей группы или COMMIT ни одна операция пакета не считается выполненной"""
+        connection = make_connection()
+        # Первая группа (подписки 1 и 2) записана, вторая (повторная подписка 1) падает
+        connection.fetch = AsyncMock(
+            side_effect=[[{"user_id": 1, "was_active": None}, {"user_id": 2, "was_active": None}], RuntimeError("db")]
+        )
+        store = PostgresSubscriptionStore(pool=make_pool(connection), flush_interval=0.01)
+
+        results = await asyncio.gather(
+            store.subscribe(1), store.subscribe(2), store.subscribe(1), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        connection = make_connection()
+        connection.fetch = AsyncMock(return_value=[{"user_id": 1, "was_active": None}])
+        connection.transaction.return_value.__aexit__ = AsyncMock(side_effect=RuntimeError("commit failed"))
+        store = PostgresSubscriptionStore(pool=make_pool(connection), flush_interval=0)
+
+        with pytest.raises(RuntimeError):
+            await store.subscribe(1)
+
+    @pytest.mark.asyncio
+    async def test_iter_user_ids_uses_keyset_pagination(self):
+        """Тест потоковой выдачи подписчиков с keyset-пагинацией"""
+        pool = make_pool(make_connection())
+        pool.fetch = AsyncMock(
+            side_effect=[
+                [{"user_id": 1}, {"user_id": 5}],
+                [{"user_id": 7}, {"user_id": 9}],
+                [{"user_id": 12}],
+            ]
+        )
+        store = PostgresSubscriptionStore(pool=pool)
+
+        batches = [batch async for batch in store.iter_user_ids(batch_size=2)]
+
+        assert batches == [[1, 5], [7, 9], [12]]
+        last_ids = [call.args[1] for call in pool.fetch.call_args_list]
+        assert last_ids[1:] == [5, 9]
+
+    def test_create_unknown_backend(self):
+        """Тест неизвестного backend"""
+        with pytest.raises(ValueError):
+            create_subscription_store("redis")
@@ -1,8 +1,11 @@
 import asyncio
+import logging
 from datetime import datetime
 
 from aiogram import Bot
 
+logger = logging.getLogger(__name__)
+
 
 async def send_periodic_message(bot: Bot, user_id: int):
     """Отправка периодических сообщений"""
@@ -12,5 +15,5 @@ async def send_periodic_message(bot: Bot, user_id: int):
             await bot.send_message(user_id, f"Тестовое сообщение! Текущее время: {current_time}")
             await asyncio.sleep(10)  # Пауза 10 секунд
         except Exception as e:
-            print(f"Ошибка при отправке сообщения: {e}")
+            logger.warning("Ошибка при отправке сообщения: %s", e)
             await asyncio.sleep(10)
@@ -0,0 +1,199 @@
+"""
+Нагрузочный бенчмарк чтения: WSGI (gunicorn с потоками) против ASGI (uvicorn) с синхронными
+и асинхронными представлениями (PROMO_ASYNC_VIEWS) при большом числе одновременных запросов.
+
+Серверы запускаются отдельными процессами с базой из настроек проекта, поэтому каталог
+должен быть в БД (например, после seed_catalogue). Для каждого режима и набора URL
+клиент держит --concurrency одновременных запросов в течение --duration секунд и считает
+запросы в секунду, задержки (p50, p95, p99, максимум) и ошибки. Кэш ответов API
+по умолчанию выключен (--cache-timeout 0), чтобы каждый запрос шел в БД.
+
+Запуск из каталога ufanet_project:
+    python manage.py seed_catalogue --clear --offers 100000
+    python -m benchmarks.bench_asgi --concurrency 200 --duration 15
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ufanet_project.settings")
+django.setup()
+
+from promo.models import Offer  # noqa: E402
+
+# Команды запуска серверов: {port}, {workers} и {threads} подставляются из аргументов
+SERVERS = {
+    "wsgi": (
+        "gunicorn ufanet_project.wsgi:application --worker-class gthread --workers {workers} "
+        "--threads {threads} --bind 127.0.0.1:{port} --log-level warning",
+        {"PROMO_ASYNC_VIEWS": "False"},
+    ),
+    "asgi-sync": (
+        "uvicorn ufanet_project.asgi:application --workers {workers} --port {port} --log-level warning "
+        "--no-access-log",
+        {"PROMO_ASYNC_VIEWS": "False"},
+    ),
+    "asgi-async": (
+        "uvicorn ufanet_project.asgi:application --workers {workers} --port {port} --log-level warning "
+        "--no-access-log",
+        {"PROMO_ASYNC_VIEWS": "True"},
+    ),
+}
+
+
+def scenarios():
+    """Наборы URL: чтение API и страницы сайта; id берутся из текущего каталога."""
+    offer_ids = list(Offer.objects.order_by("?").values_list("id", flat=True)[:50])
+    if not offer_ids:
+        raise SystemExit("В БД нет акций: заполните каталог командой seed_catalogue")
+    return {
+        "api": [
+            "/api/offers/",
+            "/api/offers/?page=5",
+            "/api/offers/?search=пицца",
+            "/api/offers/?pagination=cursor&ordering=-valid_to",
+            "/api/cities/",
+            *(f"/api/offers/{pk}/" for pk in offer_ids[:10]),
+        ],
+        # Страницы поиска и категории без пагинации выводят весь список и в набор не входят
+        "html": [
+            "/",
+            "/offers/",
+            "/offers/?page=5",
+            *(f"/offer/{pk}/" for pk in offer_ids[10:20]),
+        ],
+    }
+
+
+def start_server(mode, args):
+    command, env = SERVERS[mode]
+    command = command.format(port=args.port, workers=args.workers, threads=args.threads)
+    env = {**os.environ, **env, "PROMO_API_CACHE_TIMEOUT": str(args.cache_timeout)}
+    # Отдельная группа процессов: при остановке завершаются и воркеры
+    return subprocess.Popen(command.split(), env=env, start_new_session=True)
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+async def wait_ready(session, base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("Сервер завершился при запуске")
+        try:
+            async with session.get(base_url + "/api/cities/") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("Сервер не запустился")
+
+
+async def run_load(session, base_url, urls, concurrency, duration):
+    """Держит concurrency одновременных запросов duration секунд; задержки успешных ответов и ошибки."""
+    latencies = []
+    errors = collections.Counter()
+    next_url = itertools.cycle(urls).__next__
+    deadline = time.monotonic() + duration
+
+    async def client():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.get(base_url + next_url()) as response:
+                    await response.read()
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                status = type(exc).__name__
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors[status] += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.monotonic() - started
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def bench_mode(mode, args, urls_by_scenario):
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = start_server(mode, args)
+    results = []
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await wait_ready(session, base_url, process)
+            for scenario, urls in urls_by_scenario.items():
+                # Прогрев: соединения, кэш версий таблиц и городов в воркерах
+                await run_load(session, base_url, urls, args.concurrency, min(args.duration, 3))
+                latencies, errors, elapsed = await run_load(session, base_url, urls, args.concurrency, args.duration)
+                latencies.sort()
+                results.append((mode, scenario, latencies, errors, elapsed))
+    finally:
+        stop_server(process)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument("--scenarios", nargs="+", choices=["api", "html"], default=["api", "html"])
+    parser.add_argument("--concurrency", type=int, default=200, help="одновременных запросов")
+    parser.add_argument("--duration", type=float, default=15, help="секунд нагрузки на режим и набор URL")
+    parser.add_argument("--workers", type=int, default=2, help="процессов сервера")
+    parser.add_argument("--threads", type=int, default=8, help="потоков в процессе gunicorn (WSGI)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-timeout", type=int, default=0, help="PROMO_API_CACHE_TIMEOUT серверов")
+    parser.add_argument("--request-timeout", type=float, default=30, help="таймаут запроса, с")
+    args = parser.parse_args()
+
+    urls_by_scenario = {name: urls for name, urls in scenarios().items() if name in args.scenarios}
+    results = []
+    for mode in args.modes:
+        print(f"{mode}: нагрузка...", file=sys.stderr)
+        results.extend(asyncio.run(bench_mode(mode, args, urls_by_scenario)))
+
+    print(
+        f"Конкуренция {args.concurrency}, {args.duration:.0f} с на замер, процессов {args.workers}, "
+        f"потоков WSGI {args.threads}; задержки в мс"
+    )
+    print(f"{'режим':>11} {'URL':>5} {'запр/с':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'макс':>7}  ошибки")
+    for mode, scenario, latencies, errors, elapsed in results:
+        # Ошибки: число ответов по статусу или исключению клиента
+        error_summary = ", ".join(f"{status}: {count}" for status, count in errors.most_common()) or "0"
+        if not latencies:
+            print(f"{mode:>11} {scenario:>5} {'-':>8} {'-':>7} {'-':>7} {'-':>7} {'-':>7}  {error_summary}")
+            continue
+        print(
+            f"{mode:>11} {scenario:>5} {len(latencies) / elapsed:8.0f} {statistics.median(latencies) * 1000:7.1f} "
+            f"{percentile(latencies, 0.95):7.1f} {percentile(latencies, 0.99):7.1f} {latencies[-1] * 1000:7.1f}  "
+            f"{error_summary}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Бенчмарк записи акций через API: N отдельных POST /api/offers/ против одного
+POST /api/offers/bulk/ с тем же списком (пакеты по --batch акций).
+
+Запросы выполняются в процессе через тестовый клиент DRF, все записи делаются
+во временной транзакции и откатываются. Нужна база Postgres из настроек проекта.
+
+Запуск из каталога ufanet_project:
+    python -m benchmarks.bench_bulk --offers 1000
+"""
+
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ufanet_project.settings")
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from promo.models import Category, City, Partner  # noqa: E402
+
+
+def offers_payload(count):
+    cities = City.objects.bulk_create(City(name=f"Город {index}") for index in range(10))
+    categories = Category.objects.bulk_create(Category(name=f"Категория {index}") for index in range(20))
+    partners = Partner.objects.bulk_create(Partner(name=f"Партнер {index}", description="") for index in range(50))
+    today = date.today()
+    return [
+        {
+            "title": f"Акция {index}",
+            "description": "Описание акции",
+            "discount": f"{5 + index % 40}%",
+            "promo_code": f"PROMO{index}",
+            "valid_from": str(today),
+            "valid_to": str(today + timedelta(days=30)),
+            "city_id": cities[index % len(cities)].id,
+            "category_id": categories[index % len(categories)].id,
+            "partner_id": partners[index % len(partners)].id,
+        }
+        for index in range(count)
+    ]
+
+
+def measure(send):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - start
+    return elapsed * 1000, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offers", type=int, default=1000, help="число создаваемых акций")
+    parser.add_argument("--batch", type=int, default=1000, help="акций в одном пакетном запросе")
+    args = parser.parse_args()
+
+    client = APIClient(HTTP_HOST="localhost")
+
+    def single_requests():
+        for item in payload:
+            response = client.post("/api/offers/", item, format="json")
+            assert response.status_code == 201, response.data
+
+    def bulk_requests():
+        for start in range(0, len(payload), args.batch):
+            response = client.post("/api/offers/bulk/", payload[start : start + args.batch], format="json")
+            assert response.status_code == 201, response.data
+
+    with transaction.atomic():
+        payload = offers_payload(args.offers)
+        single, single_queries = measure(single_requests)
+        bulk, bulk_queries = measure(bulk_requests)
+        print(f"Создание {args.offers} акций через API")
+        print(f"{'способ':>26} {'мс':>9} {'запросов к БД':>14}")
+        print(f"{'POST /api/offers/':>26} {single:9.1f} {single_queries:>14}")
+        print(f"{f'POST /api/offers/bulk/ x{args.batch}':>26} {bulk:9.1f} {bulk_queries:>14}")
+        print(f"{'ускорение':>26} {single / bulk:8.1f}x")
+        # Тестовые данные не сохраняются
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Бенчмарк поиска акций: ILIKE по title/description/partner__name (старый вариант
+SearchOffersListView) против полнотекстового поиска search_offers по GIN-индексам.
+
+Создает во временной транзакции N акций со случайными названиями и описаниями,
+для каждого запроса измеряет первую страницу результатов (COUNT + 20 строк, как
+в представлении) и откатывает транзакцию. Нужна база Postgres из настроек проекта.
+
+Запуск из каталога ufanet_project:
+    python -m benchmarks.bench_search --offers 50000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ufanet_project.settings")
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from promo.models import Category, City, Offer, Partner  # noqa: E402
+from promo.search import search_offers  # noqa: E402
+
+WORDS = (
+    "скидка ресторан кофе пицца суши фитнес бассейн кино театр музей книги одежда обувь "
+    "электроника ремонт такси доставка салон маникюр стрижка массаж йога танцы аквапарк "
+    "боулинг квест караоке цветы подарки игрушки зоомагазин аптека оптика автомойка шиномонтаж"
+).split()
+QUERIES = ["ресторан", "фитнес бассейн", "кофе", "шиномонтаж", "доставка пиццы"]
+PAGE_SIZE = 20
+
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def create_offers(count, seed):
+    rng = random.Random(seed)
+    city = City.objects.create(name="Уфа")
+    category = Category.objects.create(name="Бенчмарк")
+    partners = Partner.objects.bulk_create(
+        Partner(name=f"{text(rng, 2)} {index}", description="") for index in range(max(1, count // 100))
+    )
+    today = date.today()
+    Offer.objects.bulk_create(
+        (
+            Offer(
+                title=text(rng, 3),
+                description=text(rng, 25),
+                discount="10%",
+                valid_from=today - timedelta(days=rng.randint(0, 60)),
+                valid_to=today + timedelta(days=rng.randint(1, 60)),
+                city=city,
+                category=category,
+                partner=rng.choice(partners),
+            )
+            for _ in range(count)
+        ),
+        batch_size=5000,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE promo_offer")
+        cursor.execute("ANALYZE promo_partner")
+
+
+def ilike(query):
+    return (
+        Offer.objects.with_related()
+        .filter(Q(title__icontains=query) | Q(description__icontains=query) | Q(partner__name__icontains=query))
+        .order_by("id")
+    )
+
+
+def full_text(query):
+    return search_offers(Offer.objects.with_related(), query).order_by("-search_rank", "-valid_from", "-id")
+
+
+def measure(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        queryset.count()
+        list(queryset[:PAGE_SIZE])
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offers", type=int, default=20_000, help="число акций в тестовых данных")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов на запрос (берется медиана)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        create_offers(args.offers, args.seed)
+        print(f"Первая страница поиска (COUNT + {PAGE_SIZE} строк), мс, {args.offers} акций")
+        print(f"{'запрос':>16} {'найдено':>8} {'ILIKE':>8} {'FTS':>8} {'ускорение':>10}")
+        for query in QUERIES:
+            legacy = measure(ilike(query), args.repeat)
+            fts = measure(full_text(query), args.repeat)
+            found = full_text(query).count()
+            print(f"{query:>16} {found:>8} {legacy:8.1f} {fts:8.1f} {legacy / fts:9.1f}x")
+        # Тестовые данные не сохраняются
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
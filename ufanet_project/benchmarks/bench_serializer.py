@@ -0,0 +1,103 @@
+"""
+Бенчмарк сериализации списка акций: OfferSerializer (ModelSerializer с вложенными
+сериализаторами) против OfferReadSerializer по строкам .values().
+
+Создает во временной транзакции N акций, измеряет выборку и сериализацию всех строк
+(как список API без пагинации) и откатывает транзакцию. Нужна база Postgres из настроек проекта.
+
+Запуск из каталога ufanet_project:
+    python -m benchmarks.bench_serializer --offers 10000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ufanet_project.settings")
+django.setup()
+
+from django.db import transaction  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from promo.models import Category, City, Offer, Partner  # noqa: E402
+from promo.serializers import OfferReadSerializer, OfferSerializer  # noqa: E402
+
+
+def create_offers(count, seed):
+    rng = random.Random(seed)
+    cities = City.objects.bulk_create(City(name=f"Город {index}") for index in range(10))
+    categories = Category.objects.bulk_create(Category(name=f"Категория {index}") for index in range(20))
+    partners = Partner.objects.bulk_create(
+        Partner(name=f"Партнер {index}", description="Описание партнера") for index in range(max(1, count // 100))
+    )
+    today = date.today()
+    Offer.objects.bulk_create(
+        (
+            Offer(
+                title=f"Акция {index}",
+                description="Описание акции " * 5,
+                discount=f"{rng.randint(5, 50)}%",
+                discount_value=0,
+                promo_code=f"PROMO{index}",
+                valid_from=today - timedelta(days=rng.randint(0, 60)),
+                valid_to=today + timedelta(days=rng.randint(1, 60)),
+                city=rng.choice(cities),
+                category=rng.choice(categories),
+                partner=rng.choice(partners),
+                image=f"offer_images/{index}.jpg",
+            )
+            for index in range(count)
+        ),
+        batch_size=5000,
+    )
+
+
+def model_serializer(request):
+    offers = Offer.objects.with_related().order_by("-valid_from", "-id")
+    return OfferSerializer(offers, many=True, context={"request": request}).data
+
+
+def read_serializer(request):
+    offers = OfferReadSerializer.values_queryset(Offer.objects.with_related().order_by("-valid_from", "-id"))
+    return OfferReadSerializer(offers, many=True, context={"request": request}).data
+
+
+def measure(serialize, request, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(request)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offers", type=int, default=10_000, help="число акций в тестовых данных")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов (берется медиана)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    request = APIRequestFactory().get("/api/offers/", HTTP_HOST="localhost")
+    with transaction.atomic():
+        create_offers(args.offers, args.seed)
+        if model_serializer(request) != read_serializer(request):
+            raise SystemExit("Ответы сериализаторов различаются")
+
+        legacy = measure(model_serializer, request, args.repeat)
+        fast = measure(read_serializer, request, args.repeat)
+        print(f"Выборка и сериализация {args.offers} акций, мс")
+        print(f"{'OfferSerializer':>20} {legacy:8.1f}")
+        print(f"{'OfferReadSerializer':>20} {fast:8.1f}")
+        print(f"{'ускорение':>20} {legacy / fast:7.1f}x")
+        # Тестовые данные не сохраняются
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
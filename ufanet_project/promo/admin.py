@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Category, City, Offer, Partner, TelegramSubscription
+from .models import Category, City, Offer, Partner, TelegramSubscription, TelegramSubscriptionFilter
 
 # Регистрируем модели для управления ими через админку
 admin.site.register(City)
@@ -22,3 +22,10 @@ class TelegramSubscriptionAdmin(admin.ModelAdmin):
     list_filter = ["is_active", "subscribed_at"]
     search_fields = ["user_id", "username"]
     readonly_fields = ["subscribed_at"]
+
+
+@admin.register(TelegramSubscriptionFilter)
+class TelegramSubscriptionFilterAdmin(admin.ModelAdmin):
+    list_display = ["user_id", "kind", "object_id"]
+    list_filter = ["kind"]
+    search_fields = ["user_id"]
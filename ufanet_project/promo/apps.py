@@ -8,3 +8,7 @@ class PromoConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "promo"
+
+    def ready(self):
+        # Подключает сигналы сброса кэша ответов API и создания вариантов изображений
+        from . import cache, images  # noqa: F401
@@ -0,0 +1,231 @@
+import asyncio
+import contextlib
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import permissions
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .cache import acache_response
+from .models import Category
+from .views import (
+    AllOffersListView,
+    CategoryListView,
+    OfferDetailView,
+    OfferListListView,
+    SearchOffersListView,
+)
+
+
+# Семафоры PROMO_ASYNC_DB_CONCURRENCY по циклам событий (у каждого процесса ASGI свой цикл)
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def _close_connections():
+    """
+    Закрывает соединения потока запроса, как обработчик request_finished (close_old_connections),
+    но сразу после обработки; соединения внутри atomic (тесты) не трогаются.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+@contextlib.asynccontextmanager
+async def db_slot():
+    """
+    Место среди одновременно обрабатываемых запросов процесса (PROMO_ASYNC_DB_CONCURRENCY).
+    Асинхронный ORM выполняет запросы в отдельном потоке каждого запроса со своим соединением,
+    поэтому без ограничения при большой конкуренции соединений не хватает (max_connections).
+    Соединение закрывается до освобождения места, а не после отправки ответа.
+    """
+    limit = settings.PROMO_ASYNC_DB_CONCURRENCY
+    if not limit:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    slots = _db_slots.get(loop)
+    if slots is None:
+        slots = _db_slots[loop] = asyncio.Semaphore(limit)
+    async with slots:
+        try:
+            yield
+        finally:
+            await sync_to_async(_close_connections)()
+
+
+class DBConcurrencyLimitMixin:
+    """
+    Асинхронное представление, обрабатывающее запрос на месте из db_slot().
+    TemplateResponse рендерится тут же: шаблон и контекстные процессоры тоже обращаются к БД и кэшу.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        async with db_slot():
+            response = await super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                await sync_to_async(response.render)()
+            return response
+
+
+class AsyncListMixin(DBConcurrencyLimitMixin):
+    """
+    ListView на асинхронном ORM: страница (или весь список) загружается в get,
+    поэтому get_context_data и шаблон работают с готовыми объектами и не обращаются к БД.
+    TemplateResponse рендерится в потоке запроса (см. DBConcurrencyLimitMixin).
+    """
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page_size = self.get_paginate_by(queryset)
+        if page_size:
+            self.object_list = queryset
+            self.loaded_page = await self.apaginate_queryset(queryset, page_size)
+        else:
+            self.object_list = [item async for item in queryset]
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.loaded_page
+
+
+class AsyncCategoryListView(AsyncListMixin, CategoryListView):
+    """Асинхронная главная страница со списком категорий (см. CategoryListView)."""
+
+
+class AsyncAllOffersListView(AsyncListMixin, AllOffersListView):
+    """Асинхронная страница всех акций (см. AllOffersListView)."""
+
+
+class AsyncOfferListListView(AsyncListMixin, OfferListListView):
+    """Асинхронная страница акций категории (см. OfferListListView)."""
+
+    async def get(self, request, *args, **kwargs):
+        self.category = await aget_object_or_404(Category, id=self.kwargs["category_id"])
+        return await super().get(request, *args, **kwargs)
+
+    def get_category(self):
+        return self.category
+
+
+class AsyncSearchOffersListView(AsyncListMixin, SearchOffersListView):
+    """Асинхронная страница поиска акций (см. SearchOffersListView)."""
+
+
+class AsyncOfferDetailView(DBConcurrencyLimitMixin, OfferDetailView):
+    """Асинхронная страница акции (см. OfferDetailView)."""
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await aget_object_or_404(self.get_queryset(), pk=self.kwargs[self.pk_url_kwarg])
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class AsyncAPIReadView(View):
+    """
+    Асинхронное чтение API: GET и HEAD списка или объекта в JSON.
+    Фильтры, пагинация, сериализатор, кэш и условные запросы берутся у ViewSet из fallback,
+    запросы к БД выполняются асинхронным ORM. Остальные методы и форматы (запись, OPTIONS,
+    browsable API), а также ViewSet с проверками доступа или ограничением частоты
+    обрабатывает сам синхронный fallback.
+    """
+
+    # Представление ViewSet из роутера DRF (ViewSet.as_view с действиями)
+    fallback = None
+    # Обработчиков методов нет, все запросы принимает асинхронный dispatch
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Запись передается в ViewSet, который сам проверяет доступ, как и при синхронном маршруте
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        async with db_slot():
+            if request.method in ("GET", "HEAD"):
+                view = self.get_viewset(request, *args, **kwargs)
+                if view is not None:
+                    return await self.read(view, *args, **kwargs)
+            return await sync_to_async(self.fallback)(request, *args, **kwargs)
+
+    def get_viewset(self, request, *args, **kwargs):
+        """
+        ViewSet для асинхронного чтения, настроенный так же, как в ViewSet.as_view и APIView.initial,
+        или None, если запрос должен обработать fallback.
+        """
+        view = self.fallback.cls(**self.fallback.initkwargs)
+        view.action_map = {"get": self.fallback.actions["get"], "head": self.fallback.actions["get"]}
+        for method, action in self.fallback.actions.items():
+            setattr(view, method, getattr(view, action))
+        view.head = view.get
+        view.args, view.kwargs = args, kwargs
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.format_kwarg = view.get_format_suffix(**kwargs)
+        view.headers = view.default_response_headers
+
+        if view.get_throttles() or not all(
+            isinstance(permission, permissions.AllowAny) for permission in view.get_permissions()
+        ):
+            return None
+        try:
+            renderer, media_type = view.perform_content_negotiation(view.request)
+        except NotAcceptable:
+            return None
+        if type(renderer) is not JSONRenderer:
+            return None
+        view.request.accepted_renderer, view.request.accepted_media_type = renderer, media_type
+        return view
+
+    async def read(self, view, *args, **kwargs):
+        request = view.request
+        read = self.list if view.action == "list" else self.retrieve
+        try:
+            response = await acache_response(request, view.cache_tables, lambda: read(view))
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        response = view.finalize_response(request, response, *args, **kwargs)
+        if not isinstance(response, Response):
+            # 304 на условный запрос
+            return response
+        # Ответ рендерится здесь: обработчик Django рендерил бы Response в отдельном потоке
+        response.render()
+        return HttpResponse(response.content, status=response.status_code, headers=response.headers)
+
+    async def filter_queryset(self, view, queryset):
+        """
+        filter_queryset ViewSet. FilterSet проверяет id города, категории и партнера запросом к БД,
+        поэтому с такими параметрами фильтрация выполняется в потоке.
+        """
+        filterset_class = getattr(view, "filterset_class", None)
+        if (
+            any(issubclass(backend, DjangoFilterBackend) for backend in view.filter_backends)
+            and filterset_class is not None
+            and set(view.request.query_params) & set(filterset_class.base_filters)
+        ):
+            return await sync_to_async(view.filter_queryset)(queryset)
+        return view.filter_queryset(queryset)
+
+    async def list(self, view):
+        queryset = await self.filter_queryset(view, view.get_queryset())
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+        if page is None:
+            return Response(view.get_serializer([item async for item in queryset], many=True).data)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+    async def retrieve(self, view):
+        queryset = await self.filter_queryset(view, view.get_queryset())
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            instance = await aget_object_or_404(queryset, **{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        return Response(view.get_serializer(instance).data)
@@ -0,0 +1,213 @@
+import datetime
+import functools
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .models import Category, City, Offer, Partner
+
+# Таблицы, изменения которых меняют ответы со списками акций (вложенные город, категория, партнер)
+OFFER_TABLES = ("promo_offer", "promo_city", "promo_category", "promo_partner")
+
+_VERSION_KEY = "promo:version:{}"
+
+
+def _new_version():
+    """Версия таблицы: время изменения (unix-время в секундах) и случайный токен."""
+    return f"{int(time.time())}.{uuid.uuid4().hex}"
+
+
+def table_versions(tables):
+    """
+    Текущие версии таблиц. Токен в версии случайный, а не счетчик: если ключ
+    вытеснен из кэша, новая версия не совпадет ни с одной из прежних.
+    """
+    keys = {table: _VERSION_KEY.format(table) for table in tables}
+    stored = cache.get_many(keys.values())
+    versions = []
+    for table, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            cache.add(key, _new_version(), None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+async def atable_versions(tables):
+    """table_versions для асинхронных представлений (асинхронный API кэша)."""
+    keys = {table: _VERSION_KEY.format(table) for table in tables}
+    stored = await cache.aget_many(keys.values())
+    versions = []
+    for table, key in keys.items():
+        version = stored.get(key)
+        if version is None:
+            await cache.aadd(key, _new_version(), None)
+            version = await cache.aget(key)
+        versions.append(version)
+    return versions
+
+
+def invalidate_tables(*tables):
+    """Сбрасывает закэшированные ответы, зависящие от таблиц: меняет их версии."""
+    cache.set_many({_VERSION_KEY.format(table): _new_version() for table in tables}, None)
+
+
+def invalidate_tables_on_commit(*tables):
+    """
+    Сбрасывает кэш сразу и еще раз после коммита, чтобы запрос, прочитавший
+    данные до коммита, не оставил в кэше старый ответ.
+    """
+    invalidate_tables(*tables)
+    transaction.on_commit(lambda: invalidate_tables(*tables))
+
+
+def response_cache_key(request, versions):
+    """
+    Ключ ответа: полный URL с query string, версии таблиц и текущая дата
+    (в ответах с акциями есть is_active и days_left, которые зависят от даты).
+    """
+    url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+    return f"promo:api:{timezone.localdate().isoformat()}:{':'.join(versions)}:{url}"
+
+
+def response_validators(request, versions):
+    """
+    ETag и Last-Modified ответа по версиям таблиц, без запросов к БД.
+    ETag учитывает дату и формат ответа (JSON или browsable API);
+    Last-Modified - самое позднее изменение таблиц, но не раньше начала текущего дня.
+    """
+    today = timezone.localdate()
+    tag = ":".join([today.isoformat(), request.accepted_media_type or "", *versions])
+    midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    changed = max(int(version.partition(".")[0]) for version in versions) if versions else 0
+    return quote_etag(hashlib.sha1(tag.encode()).hexdigest()), max(int(midnight.timestamp()), changed)
+
+
+def cache_response(tables=None):
+    """
+    Кэширует успешные GET-ответы действия ViewSet (данные до рендеринга) и отвечает
+    на условные запросы (If-None-Match, If-Modified-Since) кодом 304 без обращения к БД.
+    tables - таблицы, от которых зависит ответ; по умолчанию cache_tables ViewSet.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return method(self, request, *args, **kwargs)
+
+            versions = table_versions(tables or self.cache_tables)
+            etag, last_modified = response_validators(request, versions)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = _cached_response(versions, method, self, request, *args, **kwargs)
+            return _set_validators(response, etag, last_modified)
+
+        return wrapper
+
+    return decorator
+
+
+async def acache_response(request, tables, read):
+    """
+    cache_response для асинхронных представлений: read - корутина без аргументов,
+    которая строит Response; кэш и условные запросы - те же, что у синхронного чтения.
+    """
+    versions = await atable_versions(tables)
+    etag, last_modified = response_validators(request, versions)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        timeout = settings.PROMO_API_CACHE_TIMEOUT
+        key = response_cache_key(request, versions)
+        data = await cache.aget(key) if timeout else None
+        if data is not None:
+            response = Response(data)
+        else:
+            response = await read()
+            if timeout and response.status_code == 200:
+                await cache.aset(key, response.data, timeout)
+    return _set_validators(response, etag, last_modified)
+
+
+def _set_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+        # Клиент каждый раз проверяет актуальность ответа условным запросом
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _cached_response(versions, method, view, request, *args, **kwargs):
+    timeout = settings.PROMO_API_CACHE_TIMEOUT
+    if not timeout:
+        return method(view, request, *args, **kwargs)
+
+    key = response_cache_key(request, versions)
+    data = cache.get(key)
+    if data is not None:
+        return Response(data)
+    response = method(view, request, *args, **kwargs)
+    if response.status_code == 200:
+        cache.set(key, response.data, timeout)
+    return response
+
+
+class CachedReadMixin:
+    """
+    Кэш и условные запросы для list и retrieve ViewSet. Ответы сбрасываются при изменении
+    таблиц cache_tables: сигналами моделей в этом процессе и командой
+    consume_wal_invalidations по событиям wal-listener.
+    """
+
+    cache_tables = ()
+
+    @cache_response()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+# Города в памяти процесса: (версия promo_city, список)
+_cities = (None, [])
+
+
+def get_cities():
+    """
+    Список городов для шаблонов (контекстный процессор и представления).
+    Хранится в памяти процесса и перечитывается из БД, только когда сменилась
+    версия promo_city, поэтому в обычном режиме страница не делает запросов к городам.
+    """
+    global _cities
+    version = table_versions(["promo_city"])[0]
+    cached_version, cities = _cities
+    if version != cached_version:
+        cities = list(City.objects.all())
+        _cities = (version, cities)
+    return cities
+
+
+MODEL_TABLES = {model: model._meta.db_table for model in (City, Category, Partner, Offer)}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_on_change(sender, **kwargs):
+    """Сбрасывает кэш при изменении через ORM (см. invalidate_tables_on_commit)."""
+    table = MODEL_TABLES.get(sender)
+    if table is not None:
+        invalidate_tables_on_commit(table)
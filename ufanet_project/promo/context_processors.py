@@ -1,10 +1,11 @@
-from .models import City
+from .cache import get_cities
 
 
 def cities_processor(request):
     """
     Контекстный процессор для передачи списка городов и выбранного города во все шаблоны.
+    Города берутся из кэша процесса (get_cities), без запроса к БД на каждую страницу.
     """
-    cities = City.objects.all()
+    cities = get_cities()
     selected_city = request.GET.get("city", "")
     return {"cities": cities, "selected_city": selected_city}
@@ -0,0 +1,48 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+# Единицы скидки (Offer.discount_unit)
+PERCENT = "percent"
+RUB = "rub"
+BONUS = "bonus"
+# Скидка без числового значения, например "Подарок"
+NO_UNIT = ""
+
+# Наибольшее значение Offer.discount_value (max_digits=12, decimal_places=2)
+MAX_DISCOUNT_VALUE = Decimal("9999999999.99")
+
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_NUMBER_RE = re.compile(_NUMBER)
+# Число и единица сразу после него: "20%", "250 ₽", "500 руб.", "300 р", "1600 бонусов"
+_VALUE_RE = re.compile(rf"({_NUMBER})\s*(?:(%)|(₽|руб|р\.?(?![а-яё]))|(бонус|балл))", re.IGNORECASE)
+_UNITS = (PERCENT, RUB, BONUS)
+# Порог заказа перед числом: "от 1500 ₽" - условие акции, а не скидка
+_THRESHOLD_RE = re.compile(r"(?:^|\s)от\s*$", re.IGNORECASE)
+
+
+def parse_discount(text):
+    """
+    Разбирает строку скидки на число и единицу: "Скидка 20%" -> (20, "percent"),
+    "Скидка 250 ₽" -> (250, "rub"), "1600 бонусов" -> (1600, "bonus").
+    Единица берется сразу после числа; число с единицей после "от" - порог заказа, и скидкой
+    оно считается, только если других чисел с единицей нет ("При заказе от 1500 ₽ скидка 20%" -> (20, "percent")).
+    Если ни за одним числом нет единицы, первое число считается процентом ("20" -> (20, "percent")).
+    Строка без числа ("Подарок") и число больше MAX_DISCOUNT_VALUE -> (0, "").
+    """
+    text = text or ""
+    matches = list(_VALUE_RE.finditer(text))
+    match = next((match for match in matches if not _THRESHOLD_RE.search(text, 0, match.start())), None)
+    if match is None and matches:
+        match = matches[0]
+    if match is not None:
+        number = match.group(1)
+        unit = next(unit for unit, marker in zip(_UNITS, match.groups()[1:]) if marker)
+    else:
+        match = _NUMBER_RE.search(text)
+        if match is None:
+            return Decimal(0), NO_UNIT
+        number, unit = match.group(), PERCENT
+    value = Decimal(number.replace(",", "."))
+    if value > MAX_DISCOUNT_VALUE or value.quantize(Decimal("0.01"), ROUND_HALF_UP) > MAX_DISCOUNT_VALUE:
+        return Decimal(0), NO_UNIT
+    return value, unit
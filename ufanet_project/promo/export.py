@@ -0,0 +1,54 @@
+import itertools
+import json
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+
+class NDJSONRenderer(renderers.JSONRenderer):
+    """
+    NDJSON (?format=ndjson): по одному JSON-объекту на строку.
+    Выгрузка пишет строки сама (stream_offers), рендерер нужен для согласования формата
+    и для ответов с ошибками.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b"\n"
+
+
+def _dumps(item):
+    return json.dumps(
+        item, cls=encoders.JSONEncoder, ensure_ascii=not api_settings.UNICODE_JSON, separators=(",", ":")
+    )
+
+
+def _chunks(items, size):
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def stream_offers(queryset, serializer, ndjson):
+    """
+    Генератор выгрузки акций: NDJSON или JSON-массив.
+    Строки читаются серверным курсором (iterator) пачками по PROMO_EXPORT_CHUNK_SIZE
+    и отдаются по мере чтения, поэтому память не зависит от размера каталога.
+    """
+    chunk_size = settings.PROMO_EXPORT_CHUNK_SIZE
+    items = (_dumps(serializer.to_representation(row)) for row in queryset.iterator(chunk_size=chunk_size))
+    if ndjson:
+        for chunk in _chunks(items, chunk_size):
+            yield "".join(f"{item}\n" for item in chunk)
+        return
+
+    yield "["
+    separator = ""
+    for chunk in _chunks(items, chunk_size):
+        yield separator + ",".join(chunk)
+        separator = ","
+    yield "]"
@@ -0,0 +1,151 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from .cache import invalidate_tables_on_commit
+from .models import Category, Offer
+
+logger = logging.getLogger(__name__)
+
+# Форматы вариантов: расширение файла, формат Pillow и параметры сжатия
+VARIANT_FORMATS = {
+    "webp": ("webp", "WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("jpg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Поле изображения модели и JSON-поле с его вариантами
+IMAGE_FIELDS = {Offer: ("image", "image_variants"), Category: ("icon", "icon_variants")}
+
+
+def variant_name(name, width, fmt):
+    """
+    Путь варианта рядом с оригиналом: offer_images/a.png -> offer_images/variants/a.png-320.webp.
+    Имя файла оригинала сохраняется целиком, чтобы у a.png и a.jpg были разные варианты.
+    """
+    dirname, filename = os.path.split(name)
+    return os.path.join(dirname, "variants", f"{filename}-{width}.{VARIANT_FORMATS[fmt][0]}")
+
+
+def _prepare(image, fmt):
+    if fmt == "jpeg":
+        if image.mode in ("RGBA", "LA", "P"):
+            # JPEG без прозрачности: прозрачные области на белом фоне
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            return background
+        return image.convert("RGB")
+    return image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+
+def build_variants(name, storage=default_storage):
+    """
+    Создает уменьшенные и пережатые копии изображения (ширины PROMO_IMAGE_WIDTHS, WebP и JPEG).
+    Изображения не увеличиваются: вместо ширин больше оригинала берется ширина оригинала.
+    Возвращает описание вариантов: {"source": name, "webp": {"320": путь, ...}, "jpeg": {...}}.
+    """
+    with storage.open(name, "rb") as stream:
+        original = ImageOps.exif_transpose(Image.open(stream))
+        original.load()
+
+    variants = {"source": name, **{fmt: {} for fmt in VARIANT_FORMATS}}
+    for width in sorted(set(min(width, original.width) for width in settings.PROMO_IMAGE_WIDTHS)):
+        resized = original.copy()
+        resized.thumbnail((width, original.height), Image.LANCZOS)
+        for fmt, (_, pillow_format, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            _prepare(resized, fmt).save(buffer, pillow_format, **options)
+            path = variant_name(name, width, fmt)
+            if storage.exists(path):
+                storage.delete(path)
+            variants[fmt][str(width)] = storage.save(path, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def srcset(variants, fmt, url=None):
+    """
+    Значение атрибута srcset для формата: "url 320w, url 640w"; пустая строка, если вариантов нет.
+    url - функция, строящая ссылку по пути файла (по умолчанию default_storage.url).
+    """
+    url = url or default_storage.url
+    files = (variants or {}).get(fmt) or {}
+    return ", ".join(f"{url(path)} {width}w" for width, path in sorted(files.items(), key=lambda item: int(item[0])))
+
+
+def srcsets(variants, url=None):
+    """srcset для каждого формата вариантов ({"webp": ..., "jpeg": ...}) или None, если вариантов еще нет."""
+    if not (variants or {}).get("source"):
+        return None
+    return {fmt: srcset(variants, fmt, url) for fmt in VARIANT_FORMATS}
+
+
+def update_variants(model, pk, name):
+    """
+    Создает варианты изображения объекта и сохраняет их описание, если изображение не сменилось,
+    пока они создавались. Сохранение через update(), поэтому кэш сбрасывается явно.
+    """
+    field, variants_field = IMAGE_FIELDS[model]
+    try:
+        variants = build_variants(name)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception("Не удалось создать варианты изображения %s", name)
+        return False
+    if model.objects.filter(pk=pk, **{field: name}).update(**{variants_field: variants}):
+        invalidate_tables_on_commit(model._meta.db_table)
+    return True
+
+
+_executor = None
+
+
+def _run_in_worker(model, pk, name):
+    try:
+        update_variants(model, pk, name)
+    except Exception:
+        logger.exception("Ошибка при создании вариантов изображения %s", name)
+    finally:
+        # Соединения с БД у потоков пула свои
+        connections.close_all()
+
+
+def schedule_variants(model, pk, name):
+    """
+    Ставит создание вариантов в пул потоков (PROMO_IMAGE_WORKERS), чтобы не задерживать запрос.
+    При PROMO_IMAGE_WORKERS = 0 варианты создаются сразу в текущем потоке.
+    """
+    global _executor
+    if not settings.PROMO_IMAGE_WORKERS:
+        update_variants(model, pk, name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PROMO_IMAGE_WORKERS, thread_name_prefix="promo-images")
+    _executor.submit(_run_in_worker, model, pk, name)
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_save, sender=Category)
+def schedule_on_save(sender, instance, **kwargs):
+    """После сохранения с новым изображением создает варианты (после коммита), без изображения - удаляет их описание."""
+    if kwargs.get("raw"):
+        # loaddata: файлов может не быть, варианты создает команда build_image_variants
+        return
+    field, variants_field = IMAGE_FIELDS[sender]
+    name = getattr(instance, field).name or ""
+    variants = getattr(instance, variants_field) or {}
+    if not name:
+        if variants:
+            sender.objects.filter(pk=instance.pk).update(**{variants_field: {}})
+            setattr(instance, variants_field, {})
+        return
+    if variants.get("source") != name:
+        pk = instance.pk
+        transaction.on_commit(lambda: schedule_variants(sender, pk, name))
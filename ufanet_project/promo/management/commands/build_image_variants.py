@@ -0,0 +1,77 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from promo.images import IMAGE_FIELDS, update_variants
+from promo.models import Category, Offer
+
+MODELS = {"offer": Offer, "category": Category}
+
+
+def pending_images(model, force=False):
+    """(pk, имя файла) объектов с изображением, у которых нет вариантов для текущего файла."""
+    field, variants_field = IMAGE_FIELDS[model]
+    queryset = (
+        model.objects.exclude(**{field: ""})
+        .exclude(**{f"{field}__isnull": True})
+        .order_by("pk")
+        .values_list("pk", field, variants_field)
+    )
+    for pk, name, variants in queryset.iterator(chunk_size=1000):
+        if force or (variants or {}).get("source") != name:
+            yield pk, name
+
+
+def _in_worker(build):
+    """Обертка задачи для потока пула: у потоков свои соединения с БД, их нужно закрывать."""
+
+    def run(item):
+        try:
+            return build(item)
+        finally:
+            connections.close_all()
+
+    return run
+
+
+class Command(BaseCommand):
+    """
+    Создает варианты (уменьшенные копии WebP/JPEG) для уже загруженных изображений акций
+    и иконок категорий в пуле потоков (--workers 1 - в текущем потоке).
+    Новые изображения обрабатываются автоматически после сохранения.
+    """
+
+    help = "Создает уменьшенные копии существующих изображений акций и иконок категорий"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=["all", *MODELS], default="all")
+        parser.add_argument("--force", action="store_true", help="пересоздать варианты и для обработанных изображений")
+        parser.add_argument(
+            "--workers", type=int, default=max(settings.PROMO_IMAGE_WORKERS, 1), help="число потоков обработки"
+        )
+
+    def handle(self, *args, **options):
+        models = MODELS.values() if options["model"] == "all" else [MODELS[options["model"]]]
+        workers = max(options["workers"], 1)
+        if workers == 1:
+            self.build(models, options["force"], lambda build, batch: map(build, batch))
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="promo-images") as pool:
+            self.build(models, options["force"], lambda build, batch: pool.map(_in_worker(build), batch))
+
+    def build(self, models, force, run):
+        for model in models:
+            done = failed = 0
+            images = pending_images(model, force)
+            # Пачками, чтобы не держать в памяти весь список изображений
+            while batch := list(itertools.islice(images, 100)):
+                for result in run(lambda item: update_variants(model, *item), batch):
+                    done += 1
+                    failed += not result
+                self.stdout.write(f"{model._meta.verbose_name}: обработано {done}, ошибок {failed}")
+            self.stdout.write(
+                self.style.SUCCESS(f"{model._meta.verbose_name}: готово, изображений {done}, ошибок {failed}")
+            )
@@ -0,0 +1,70 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from promo.cache import OFFER_TABLES, invalidate_tables
+
+logger = logging.getLogger(__name__)
+
+
+def _deserialize(value):
+    try:
+        return json.loads(value.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def changed_tables(records):
+    """Таблицы promo, изменения которых пришли в пачке сообщений wal-listener."""
+    tables = set()
+    for record in records:
+        event = record.value
+        if isinstance(event, dict) and event.get("table") in OFFER_TABLES:
+            tables.add(event["table"])
+    return tables
+
+
+class Command(BaseCommand):
+    """
+    Сбрасывает кэш ответов API по событиям wal-listener (топики PROMO_WAL_TOPICS).
+    В отличие от сигналов моделей, учитывает и изменения в обход Django ORM
+    (SQL, QuerySet.update, импорт). Имеет смысл с общим кэшем (CACHE_URL).
+    """
+
+    help = "Сбрасывает кэш ответов API по событиям wal-listener из Kafka"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group-id", default="promo_cache_invalidation", help="группа потребителей Kafka")
+        parser.add_argument("--poll-timeout-ms", type=int, default=1000, help="таймаут ожидания сообщений")
+
+    def handle(self, *args, **options):
+        try:
+            from kafka import KafkaConsumer
+        except ImportError:
+            raise CommandError("Для команды нужен пакет kafka-python (pip install kafka-python)")
+
+        consumer = KafkaConsumer(
+            *settings.PROMO_WAL_TOPICS,
+            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+            group_id=options["group_id"],
+            # Старые события не нужны: при запуске кэш сбрасывается целиком
+            auto_offset_reset="latest",
+            value_deserializer=_deserialize,
+        )
+        # Изменения, сделанные пока команда не работала, неизвестны
+        invalidate_tables(*OFFER_TABLES)
+        self.stdout.write("Ожидание событий wal-listener для сброса кэша...")
+
+        try:
+            while True:
+                batch = consumer.poll(timeout_ms=options["poll_timeout_ms"])
+                tables = changed_tables(record for records in batch.values() for record in records)
+                if tables:
+                    invalidate_tables(*tables)
+                    logger.info("Сброшен кэш ответов API для таблиц: %s", ", ".join(sorted(tables)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            consumer.close()
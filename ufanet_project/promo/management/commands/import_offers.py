@@ -0,0 +1,244 @@
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from promo.cache import invalidate_tables_on_commit
+from promo.discounts import parse_discount
+from promo.models import Category, City, Offer, Partner
+
+# Поля строки входного файла; город, категория и партнер задаются названиями
+INPUT_FIELDS = ("title", "description", "discount", "promo_code", "valid_from", "valid_to", "city", "category", "partner")
+REQUIRED_FIELDS = ("title", "discount", "valid_from", "valid_to", "city", "category", "partner")
+
+# Столбцы промежуточной таблицы в порядке COPY; line - номер строки файла (последняя строка с ключом побеждает)
+STAGING_COLUMNS = (
+    "line",
+    "title",
+    "description",
+    "discount",
+    "discount_value",
+    "discount_unit",
+    "promo_code",
+    "valid_from",
+    "valid_to",
+    "city_id",
+    "category_id",
+    "partner_id",
+)
+# Поля, которые обновляются у существующей акции
+UPDATE_COLUMNS = STAGING_COLUMNS[2:9] + ("category_id",)
+
+STAGING_TABLE = "promo_offer_import"
+
+CREATE_STAGING_SQL = f"""
+CREATE TEMPORARY TABLE {STAGING_TABLE} (
+    line integer NOT NULL,
+    title varchar(200) NOT NULL,
+    description text NOT NULL,
+    discount varchar(50) NOT NULL,
+    discount_value numeric(12, 2) NOT NULL,
+    discount_unit varchar(10) NOT NULL,
+    promo_code varchar(50),
+    valid_from date NOT NULL,
+    valid_to date NOT NULL,
+    city_id bigint NOT NULL,
+    category_id bigint NOT NULL,
+    partner_id bigint NOT NULL
+) ON COMMIT DROP
+"""
+
+# Строки пачки без повторов естественного ключа (партнер, город, название)
+_STAGED = f"""
+    SELECT DISTINCT ON (partner_id, city_id, title) *
+    FROM {STAGING_TABLE}
+    ORDER BY partner_id, city_id, title, line DESC
+"""
+
+UPDATE_SQL = f"""
+UPDATE promo_offer AS offer
+SET {", ".join(f"{column} = staged.{column}" for column in UPDATE_COLUMNS)}
+FROM ({_STAGED}) AS staged
+WHERE offer.partner_id = staged.partner_id
+    AND offer.city_id = staged.city_id
+    AND offer.title = staged.title
+    AND ({", ".join(f"offer.{column}" for column in UPDATE_COLUMNS)})
+        IS DISTINCT FROM ({", ".join(f"staged.{column}" for column in UPDATE_COLUMNS)})
+"""
+
+INSERT_SQL = f"""
+INSERT INTO promo_offer ({", ".join(STAGING_COLUMNS[1:])})
+SELECT {", ".join(f"staged.{column}" for column in STAGING_COLUMNS[1:])}
+FROM ({_STAGED}) AS staged
+WHERE NOT EXISTS (
+    SELECT 1 FROM promo_offer AS offer
+    WHERE offer.partner_id = staged.partner_id AND offer.city_id = staged.city_id AND offer.title = staged.title
+)
+"""
+
+COPY_SQL = (
+    f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv, FORCE_NULL (promo_code))"
+)
+
+
+def read_rows(stream, input_format):
+    """Построчно читает CSV (с заголовком) или NDJSON: пары (номер строки, словарь полей)."""
+    if input_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as exc:
+            raise CommandError(f"Строка {line}: некорректный JSON ({exc})")
+        if not isinstance(row, dict):
+            raise CommandError(f"Строка {line}: ожидается JSON-объект")
+        yield line, row
+
+
+class NameMap:
+    """
+    Соответствие названий id для городов, категорий или партнеров.
+    Загружается из БД один раз; отсутствующие объекты создаются при первом упоминании.
+    """
+
+    def __init__(self, model, defaults=None):
+        self.model = model
+        self.defaults = defaults or {}
+        self.ids = {}
+        for pk, name in model.objects.order_by("-id").values_list("id", "name"):
+            # При одинаковых названиях используется объект с меньшим id
+            self.ids[name] = pk
+        self.created = 0
+
+    def resolve(self, name):
+        if name not in self.ids:
+            self.ids[name] = self.model.objects.create(name=name, **self.defaults).pk
+            self.created += 1
+        return self.ids[name]
+
+
+class Command(BaseCommand):
+    """
+    Импорт каталога акций из CSV или NDJSON.
+    Строки читаются потоком и пачками загружаются через COPY во временную таблицу, из которой
+    акции обновляются или добавляются по естественному ключу (партнер, город, название).
+    Память не зависит от размера файла; весь импорт выполняется в одной транзакции.
+    """
+
+    help = "Импортирует акции из CSV/NDJSON через COPY с обновлением по (партнер, город, название)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="файл CSV или NDJSON; - для чтения из stdin")
+        parser.add_argument(
+            "--format", choices=["csv", "ndjson"], help="формат входных данных (по умолчанию по расширению файла)"
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000, help="строк в одной пачке COPY")
+        parser.add_argument("--encoding", default="utf-8", help="кодировка файла")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Команда работает только с PostgreSQL (COPY)")
+        path = options["path"]
+        input_format = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size должен быть больше 0")
+
+        if path == "-":
+            self.import_stream(io.TextIOWrapper(sys.stdin.buffer, encoding=options["encoding"]), input_format, options)
+            return
+        try:
+            stream = open(path, encoding=options["encoding"], newline="")
+        except OSError as exc:
+            raise CommandError(f"Не удалось открыть {path}: {exc}")
+        with stream:
+            self.import_stream(stream, input_format, options)
+
+    def import_stream(self, stream, input_format, options):
+        started = time.monotonic()
+        total = inserted = updated = 0
+        with transaction.atomic():
+            names = {
+                "city": NameMap(City),
+                "category": NameMap(Category),
+                "partner": NameMap(Partner, defaults={"description": ""}),
+            }
+            with connection.cursor() as cursor:
+                cursor.execute(CREATE_STAGING_SQL)
+                rows = read_rows(stream, input_format)
+                while chunk := list(itertools.islice(rows, options["chunk_size"])):
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+                    for line, row in chunk:
+                        writer.writerow(self.staging_row(line, row, names))
+                    buffer.seek(0)
+
+                    cursor.copy_expert(COPY_SQL, buffer)
+                    cursor.execute(f"ANALYZE {STAGING_TABLE}")
+                    cursor.execute(UPDATE_SQL)
+                    updated += cursor.rowcount
+                    cursor.execute(INSERT_SQL)
+                    inserted += cursor.rowcount
+                    cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+
+                    total += len(chunk)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f"Обработано строк: {total} ({total / elapsed:.0f} строк/с)")
+                cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+
+            # COPY и SQL не отправляют сигналы моделей, поэтому кэш списков сбрасывается явно
+            invalidate_tables_on_commit(Offer._meta.db_table)
+
+        elapsed = time.monotonic() - started
+        created = ", ".join(f"{key}: {name_map.created}" for key, name_map in names.items())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импорт завершен за {elapsed:.1f} с: строк {total}, добавлено акций {inserted}, "
+                f"обновлено {updated}; создано новых объектов - {created}"
+            )
+        )
+
+    def staging_row(self, line, row, names):
+        """Строка промежуточной таблицы: проверенные поля, числовая скидка и id вместо названий."""
+        values = {field: str(row.get(field) or "").strip() for field in INPUT_FIELDS}
+        missing = [field for field in REQUIRED_FIELDS if not values[field]]
+        if missing:
+            raise CommandError(f"Строка {line}: не заполнены поля {', '.join(missing)}")
+        lengths = {field: Offer._meta.get_field(field).max_length for field in ("title", "discount", "promo_code")}
+        lengths.update((key, name_map.model._meta.get_field("name").max_length) for key, name_map in names.items())
+        for field, max_length in lengths.items():
+            if len(values[field]) > max_length:
+                raise CommandError(f"Строка {line}: {field} длиннее {max_length} символов")
+        try:
+            valid_from = date.fromisoformat(values["valid_from"])
+            valid_to = date.fromisoformat(values["valid_to"])
+        except ValueError:
+            raise CommandError(f"Строка {line}: даты должны быть в формате ГГГГ-ММ-ДД")
+        if valid_from > valid_to:
+            raise CommandError(f"Строка {line}: дата начала позже даты окончания")
+
+        discount_value, discount_unit = parse_discount(values["discount"])
+        return (
+            line,
+            values["title"],
+            values["description"],
+            values["discount"],
+            discount_value,
+            discount_unit,
+            values["promo_code"],
+            valid_from.isoformat(),
+            valid_to.isoformat(),
+            names["city"].resolve(values["city"]),
+            names["category"].resolve(values["category"]),
+            names["partner"].resolve(values["partner"]),
+        )
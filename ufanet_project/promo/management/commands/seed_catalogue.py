@@ -0,0 +1,293 @@
+import csv
+import io
+import itertools
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from promo.cache import OFFER_TABLES, invalidate_tables_on_commit
+from promo.discounts import parse_discount
+from promo.models import Category, City, Offer, Partner, TelegramSubscription
+
+CITY_NAMES = (
+    "Москва Санкт-Петербург Новосибирск Екатеринбург Казань Нижний-Новгород Челябинск Красноярск Самара Уфа "
+    "Ростов-на-Дону Омск Краснодар Воронеж Пермь Волгоград Саратов Тюмень Тольятти Ижевск Барнаул Ульяновск "
+    "Иркутск Хабаровск Ярославль Владивосток Махачкала Томск Оренбург Кемерово"
+).split()
+CATEGORY_NAMES = (
+    "Доставка еды",
+    "Рестораны и кафе",
+    "Красота и здоровье",
+    "Спорт и фитнес",
+    "Развлечения",
+    "Товары для дома",
+    "Одежда и обувь",
+    "Электроника",
+    "Путешествия",
+    "Образование",
+    "Авто",
+    "Детские товары",
+    "Для бизнеса",
+    "Зоотовары",
+    "Аптеки и оптика",
+)
+PARTNER_WORDS = (
+    "Вкусно Быстро Город Семейный Добрый Северный Уютный Первый Свежий Домашний Лучший Новый Мастер Центр "
+    "Студия Клуб Маркет Сервис Точка Мир Дом Лавка Бюро Сеть Планета"
+).split()
+TITLE_WORDS = (
+    "пицца суши кофе бургер роллы стрижка маникюр массаж абонемент фитнес бассейн кино квест боулинг "
+    "ноутбук смартфон наушники куртка кроссовки диван матрас шины мойка курс английский тур отель корм "
+    "витамины очки игрушки конструктор"
+).split()
+DESCRIPTION_WORDS = (
+    "скидка акция предложение выгодно каждый день только сегодня доставка бесплатно заказ клиент партнер "
+    "подарок бонус баллы карта кэшбэк условия действует при покупке от рублей новый постоянный сеть магазин "
+    "ресторан салон клуб сервис качество гарантия удобно быстро рядом с домом онлайн офлайн приложение сайт "
+    "промокод оплата картой выходные будни вечер утро семья друзья дети взрослые абонемент месяц год"
+).split()
+DISCOUNT_TEMPLATES = (
+    # (шаблон, минимум, максимум, вес)
+    ("Скидка {}%", 5, 70, 55),
+    ("{}%", 5, 50, 10),
+    ("Скидка {} ₽", 100, 3000, 15),
+    ("{} бонусов", 100, 5000, 10),
+    ("Подарок при заказе", 0, 0, 10),
+)
+# Длительность акций в днях и их доли: много коротких, есть годовые
+DURATIONS = ((7, 15), (14, 20), (30, 30), (60, 12), (90, 10), (180, 8), (365, 5))
+
+OFFER_COLUMNS = (
+    "title",
+    "description",
+    "discount",
+    "discount_value",
+    "discount_unit",
+    "promo_code",
+    "valid_from",
+    "valid_to",
+    "city_id",
+    "category_id",
+    "partner_id",
+    "image",
+)
+SUBSCRIPTION_COLUMNS = ("user_id", "username", "is_active", "subscribed_at")
+# Первый user_id синтетических подписок
+FIRST_USER_ID = 100_000_000
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа: первые объекты популярнее остальных."""
+    return list(itertools.accumulate(1 / (rank**exponent) for rank in range(1, count + 1)))
+
+
+def names(base, count, template):
+    """count названий: сначала из base, дальше - по шаблону с номером."""
+    return [base[index] if index < len(base) else template.format(index + 1) for index in range(count)]
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Загружает строки в таблицу через COPY; None записывается как NULL."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([r"\N" if value is None else value for value in row] for row in rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+class CatalogueGenerator:
+    """
+    Детерминированный генератор строк каталога: одинаковые seed, параметры и базовая дата
+    дают одинаковые данные. Популярность городов, категорий и партнеров распределена по Ципфу.
+    """
+
+    _discount_weights = list(itertools.accumulate(weight for *_, weight in DISCOUNT_TEMPLATES))
+    _duration_weights = list(itertools.accumulate(weight for _, weight in DURATIONS))
+
+    def __init__(self, seed, base_date):
+        self.rng = random.Random(seed)
+        self.base_date = base_date
+
+    def words(self, vocabulary, count):
+        return " ".join(self.rng.choices(vocabulary, k=count))
+
+    def partner(self, index):
+        name = f"{self.rng.choice(PARTNER_WORDS)} {self.rng.choice(PARTNER_WORDS)} {index + 1}"
+        return Partner(name=name, description=self.words(DESCRIPTION_WORDS, self.rng.randint(5, 40)).capitalize())
+
+    def discount(self):
+        template, low, high, _ = self.rng.choices(DISCOUNT_TEMPLATES, cum_weights=self._discount_weights)[0]
+        return template.format(self.rng.randint(low, high))
+
+    def offers(self, count, city_ids, category_ids, partner_ids, chunk_size):
+        """Пачки строк promo_offer для COPY."""
+        city_weights = zipf_weights(len(city_ids), 1.2)
+        category_weights = zipf_weights(len(category_ids), 0.8)
+        partner_weights = zipf_weights(len(partner_ids), 1.0)
+        rng = self.rng
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            cities = rng.choices(city_ids, cum_weights=city_weights, k=size)
+            categories = rng.choices(category_ids, cum_weights=category_weights, k=size)
+            partners = rng.choices(partner_ids, cum_weights=partner_weights, k=size)
+            rows = []
+            for index in range(size):
+                discount = self.discount()
+                discount_value, discount_unit = parse_discount(discount)
+                # Начало чаще недавнее, окна действия перекрываются; часть акций уже закончилась или еще не началась
+                valid_from = self.base_date - timedelta(days=min(int(rng.expovariate(1 / 90)), 730) - 14)
+                duration = rng.choices(DURATIONS, cum_weights=self._duration_weights)[0][0]
+                # Длина описания - логнормальная: в основном абзац, иногда несколько сотен слов
+                description_words = max(5, min(int(rng.lognormvariate(4, 0.7)), 600))
+                rows.append(
+                    (
+                        f"{self.words(TITLE_WORDS, rng.randint(1, 3)).capitalize()} - {discount.lower()}",
+                        self.words(DESCRIPTION_WORDS, description_words).capitalize(),
+                        discount,
+                        discount_value,
+                        discount_unit,
+                        f"PROMO{start + index + 1}" if rng.random() < 0.6 else None,
+                        valid_from.isoformat(),
+                        (valid_from + timedelta(days=duration)).isoformat(),
+                        cities[index],
+                        categories[index],
+                        partners[index],
+                        "",
+                    )
+                )
+            yield rows
+
+    def subscriptions(self, count, chunk_size, first_user_id=FIRST_USER_ID):
+        """
+        Пачки строк promo_telegramsubscription для COPY: уникальные user_id не меньше first_user_id,
+        большинство подписок активны.
+        """
+        rng = self.rng
+        base = timezone.make_aware(datetime.combine(self.base_date, datetime.min.time()))
+        for start in range(0, count, chunk_size):
+            rows = []
+            for index in range(start, min(start + chunk_size, count)):
+                subscribed_at = base - timedelta(seconds=int(rng.expovariate(1 / (180 * 86400))))
+                rows.append(
+                    (
+                        first_user_id + index * 10 + rng.randint(0, 9),
+                        f"user_{index + 1}" if rng.random() < 0.7 else None,
+                        "t" if rng.random() < 0.85 else "f",
+                        subscribed_at.isoformat(),
+                    )
+                )
+            yield rows
+
+
+class Command(BaseCommand):
+    """
+    Заполняет БД синтетическим каталогом заданного размера (до миллионов акций) для бенчмарков
+    и EXPLAIN-тестов. Справочники создаются bulk_create, акции и подписки - через COPY пачками.
+    Данные детерминированы: одинаковые --seed, размеры и --base-date дают одинаковый каталог,
+    а с --clear и одинаковые id. Без --clear каталог добавляется к существующему, user_id подписок
+    начинаются после уже занятых.
+    """
+
+    help = "Генерирует синтетический каталог: города, категории, партнеры, акции и подписки Telegram"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cities", type=int, default=30)
+        parser.add_argument("--categories", type=int, default=15)
+        parser.add_argument("--partners", type=int, default=2000)
+        parser.add_argument("--offers", type=int, default=100_000)
+        parser.add_argument("--subscriptions", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=1, help="зерно генератора случайных чисел")
+        parser.add_argument(
+            "--base-date",
+            type=date.fromisoformat,
+            default=None,
+            help="дата, относительно которой строятся сроки акций (ГГГГ-ММ-ДД, по умолчанию сегодня)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10_000, help="строк в одной пачке COPY")
+        parser.add_argument(
+            "--clear", action="store_true", help="удалить существующие акции, справочники и подписки (TRUNCATE)"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Команда работает только с PostgreSQL (COPY)")
+        if min(options["cities"], options["categories"], options["partners"]) < 1 and options["offers"]:
+            raise CommandError("Для акций нужны хотя бы один город, одна категория и один партнер")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size должен быть больше 0")
+
+        generator = CatalogueGenerator(options["seed"], options["base_date"] or timezone.localdate())
+        started = time.monotonic()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if options["clear"]:
+                    tables = [model._meta.db_table for model in (Offer, Partner, Category, City, TelegramSubscription)]
+                    # Отложенные проверки внешних ключей из внешней транзакции (тесты, бенчмарки) мешают TRUNCATE
+                    cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+                    cursor.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+                    cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+                    first_user_id = FIRST_USER_ID
+                else:
+                    # user_id уникален: без --clear новые подписки идут после уже существующих
+                    max_user_id = TelegramSubscription.objects.aggregate(max_user_id=Max("user_id"))["max_user_id"]
+                    first_user_id = max(FIRST_USER_ID, (max_user_id or 0) + 1)
+
+                city_ids = [
+                    city.id
+                    for city in City.objects.bulk_create(
+                        City(name=name) for name in names(CITY_NAMES, options["cities"], "Город {}")
+                    )
+                ]
+                category_ids = [
+                    category.id
+                    for category in Category.objects.bulk_create(
+                        Category(name=name) for name in names(CATEGORY_NAMES, options["categories"], "Категория {}")
+                    )
+                ]
+                partner_ids = [
+                    partner.id
+                    for partner in Partner.objects.bulk_create(
+                        (generator.partner(index) for index in range(options["partners"])), batch_size=5000
+                    )
+                ]
+
+                self.copy_chunks(
+                    cursor,
+                    Offer._meta.db_table,
+                    OFFER_COLUMNS,
+                    generator.offers(options["offers"], city_ids, category_ids, partner_ids, options["chunk_size"]),
+                    "акций",
+                )
+                self.copy_chunks(
+                    cursor,
+                    TelegramSubscription._meta.db_table,
+                    SUBSCRIPTION_COLUMNS,
+                    generator.subscriptions(options["subscriptions"], options["chunk_size"], first_user_id),
+                    "подписок",
+                )
+                for model in (City, Category, Partner, Offer, TelegramSubscription):
+                    cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+            # bulk_create и COPY не отправляют сигналы моделей
+            invalidate_tables_on_commit(*OFFER_TABLES)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Каталог создан за {time.monotonic() - started:.1f} с: городов {len(city_ids)}, "
+                f"категорий {len(category_ids)}, партнеров {len(partner_ids)}, акций {options['offers']}, "
+                f"подписок {options['subscriptions']}"
+            )
+        )
+
+    def copy_chunks(self, cursor, table, columns, chunks, label):
+        started = time.monotonic()
+        total = 0
+        for rows in chunks:
+            copy_rows(cursor, table, columns, rows)
+            total += len(rows)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"Загружено {label}: {total} ({total / elapsed:.0f} строк/с)")
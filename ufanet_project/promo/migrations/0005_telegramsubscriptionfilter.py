@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promo', '0004_telegramsubscription_alter_category_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramSubscriptionFilter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(verbose_name='ID пользователя Telegram')),
+                ('kind', models.CharField(choices=[('city', 'Город'), ('category', 'Категория'), ('partner', 'Партнёр')], max_length=20, verbose_name='Вид фильтра')),
+                ('object_id', models.IntegerField(verbose_name='ID объекта')),
+            ],
+            options={
+                'verbose_name': 'Фильтр подписки Telegram',
+                'verbose_name_plural': 'Фильтры подписок Telegram',
+                'constraints': [models.UniqueConstraint(fields=('user_id', 'kind', 'object_id'), name='unique_subscription_filter')],
+            },
+        ),
+    ]
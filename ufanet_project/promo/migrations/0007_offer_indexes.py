@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:07
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи в promo_offer (CREATE INDEX CONCURRENTLY)
+    atomic = False
+
+    dependencies = [
+        ('promo', '0006_offer_search_vector'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(fields=['-valid_from', '-id'], name='offer_valid_from_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(fields=['valid_to', 'valid_from'], name='offer_validity_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(fields=['city', 'category', '-valid_from', '-id'], name='offer_city_category_valid_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(fields=['title', 'id'], name='offer_title_id_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:16
+
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+
+
+# Размер пачки чтения и обновления при заполнении
+FILL_BATCH_SIZE = 5000
+
+# Копия разбора скидки из promo.discounts на момент миграции: изменения эвристики
+# в приложении не должны менять результат уже примененной миграции
+MAX_DISCOUNT_VALUE = Decimal("9999999999.99")
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_NUMBER_RE = re.compile(_NUMBER)
+_VALUE_RE = re.compile(rf"({_NUMBER})\s*(?:(%)|(₽|руб|р\.?(?![а-яё]))|(бонус|балл))", re.IGNORECASE)
+_UNITS = ("percent", "rub", "bonus")
+_THRESHOLD_RE = re.compile(r"(?:^|\s)от\s*$", re.IGNORECASE)
+
+
+def parse_discount(text):
+    """Строка скидки -> (число, единица), как promo.discounts.parse_discount в момент миграции."""
+    text = text or ""
+    matches = list(_VALUE_RE.finditer(text))
+    match = next((match for match in matches if not _THRESHOLD_RE.search(text, 0, match.start())), None)
+    if match is None and matches:
+        match = matches[0]
+    if match is not None:
+        number = match.group(1)
+        unit = next(unit for unit, marker in zip(_UNITS, match.groups()[1:]) if marker)
+    else:
+        match = _NUMBER_RE.search(text)
+        if match is None:
+            return Decimal(0), ""
+        number, unit = match.group(), "percent"
+    value = Decimal(number.replace(",", "."))
+    if value > MAX_DISCOUNT_VALUE or value.quantize(Decimal("0.01"), ROUND_HALF_UP) > MAX_DISCOUNT_VALUE:
+        return Decimal(0), ""
+    return value, unit
+
+
+def fill_discount_value(apps, schema_editor):
+    """
+    Заполняет числовую скидку существующих акций из строки discount.
+    Акции читаются пачками по id и обновляются одним UPDATE ... FROM (VALUES ...) на пачку,
+    поэтому память не растет с размером таблицы.
+    """
+    Offer = apps.get_model("promo", "Offer")
+    table = schema_editor.quote_name(Offer._meta.db_table)
+    last_id = 0
+    while True:
+        rows = list(
+            Offer.objects.filter(id__gt=last_id).order_by("id").values_list("id", "discount")[:FILL_BATCH_SIZE]
+        )
+        if not rows:
+            break
+        values = [(pk, *parse_discount(discount)) for pk, discount in rows]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} AS offer
+                SET discount_value = value.discount_value, discount_unit = value.discount_unit
+                FROM (VALUES {", ".join(["(%s, %s::numeric, %s)"] * len(values))})
+                    AS value (id, discount_value, discount_unit)
+                WHERE offer.id = value.id
+                """,
+                [item for row in values for item in row],
+            )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promo', '0007_offer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='discount_unit',
+            field=models.CharField(blank=True, choices=[('percent', '%'), ('rub', '₽'), ('bonus', 'Бонусы'), ('', 'Без числового значения')], default='', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='discount_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(fill_discount_value, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['discount_unit', 'discount_value', 'id'], name='offer_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['discount_value', 'id'], name='offer_discount_value_id_idx'),
+        ),
+    ]
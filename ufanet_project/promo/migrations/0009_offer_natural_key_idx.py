@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в promo_offer (CREATE INDEX CONCURRENTLY)
+    atomic = False
+
+    dependencies = [
+        ('promo', '0008_offer_discount_value'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(fields=['partner', 'city', 'title'], name='offer_natural_key_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promo', '0009_offer_natural_key_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='icon_variants',
+            field=models.JSONField(blank=True, db_default={}, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='image_variants',
+            field=models.JSONField(blank=True, db_default={}, default=dict, editable=False),
+        ),
+    ]
@@ -1,5 +1,14 @@
 # models.py
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .discounts import BONUS, NO_UNIT, PERCENT, RUB, parse_discount
+
+# Конфигурация полнотекстового поиска: русская морфология (стемминг) и стоп-слова
+SEARCH_CONFIG = "russian"
 
 
 class City(models.Model):
@@ -20,6 +29,8 @@ class Category(models.Model):
 
     name = models.CharField(max_length=100)
     icon = models.ImageField(upload_to="category_icons/", null=True, blank=True)
+    # Уменьшенные копии иконки (WebP/JPEG по ширинам), заполняются в promo.images
+    icon_variants = models.JSONField(default=dict, db_default={}, blank=True, editable=False)
 
     class Meta:
         ordering = ["id"]  # Сортировка по id
@@ -35,21 +46,46 @@ class Partner(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     # logo = models.ImageField(upload_to='partner_logos/', null=True, blank=True)
+    # Поисковый вектор названия, поддерживается самой БД (generated column)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         ordering = ["id"]  # Сортировка по id
+        indexes = [GinIndex(fields=["search_vector"], name="partner_search_vector_gin")]
 
     def __str__(self):
         """Возвращает строковое представление партнёра (его название)."""
         return self.name
 
 
+class OfferQuerySet(models.QuerySet):
+    """QuerySet акций с часто используемыми выборками."""
+
+    def with_related(self):
+        """
+        Загружает город, категорию и партнёра одним запросом (JOIN), без N+1 при сериализации.
+        Поисковые векторы нужны только в условиях запроса, поэтому не загружаются.
+        """
+        return self.select_related("city", "category", "partner").defer("search_vector", "partner__search_vector")
+
+
 class Offer(models.Model):
     """Модель акции или скидки, предоставляемой партнёром."""
 
     title = models.CharField(max_length=200)
     description = models.TextField()
+    DISCOUNT_UNIT_CHOICES = [(PERCENT, "%"), (RUB, "₽"), (BONUS, "Бонусы"), (NO_UNIT, "Без числового значения")]
+
     discount = models.CharField(max_length=50)
+    # Числовое значение скидки для фильтров и сортировки; заполняется из discount при сохранении
+    discount_value = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    discount_unit = models.CharField(
+        max_length=10, choices=DISCOUNT_UNIT_CHOICES, default=NO_UNIT, blank=True, editable=False
+    )
     promo_code = models.CharField(max_length=50, blank=True, null=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     partner = models.ForeignKey(Partner, on_delete=models.CASCADE)
@@ -57,13 +93,58 @@ class Offer(models.Model):
     valid_from = models.DateField()
     valid_to = models.DateField()
     image = models.ImageField(upload_to="offer_images/", null=True, blank=True)
+    # Уменьшенные копии изображения (WebP/JPEG по ширинам), заполняются в promo.images
+    image_variants = models.JSONField(default=dict, db_default={}, blank=True, editable=False)
+    # Поисковый вектор: название важнее описания, промокод - без стемминга
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("promo_code", weight="A", config="simple")
+        + SearchVector("description", weight="B", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = OfferQuerySet.as_manager()
 
     def __str__(self):
         """Возвращает строковое представление акции (её название)."""
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет акцию. Числовая скидка пересчитывается в sync_discount_value,
+        а при save(update_fields=[..., "discount"]) сохраняется вместе с discount.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "discount" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "discount_value", "discount_unit"}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["id"]  # Сортировка по id
+        indexes = [
+            GinIndex(fields=["search_vector"], name="offer_search_vector_gin"),
+            # Список API: сортировка по умолчанию и курсор (-valid_from, -id)
+            models.Index(fields=["-valid_from", "-id"], name="offer_valid_from_id_idx"),
+            # active, expiring_soon, ?active=true: диапазон по valid_to, valid_from проверяется по индексу
+            models.Index(fields=["valid_to", "valid_from"], name="offer_validity_idx"),
+            # Фильтры город + категория: API (в порядке списка, без сортировки) и страница категории с ?city=
+            models.Index(fields=["city", "category", "-valid_from", "-id"], name="offer_city_category_valid_idx"),
+            # Все акции на сайте: сортировка и "Показать еще" по (title, id)
+            models.Index(fields=["title", "id"], name="offer_title_id_idx"),
+            # min_discount/max_discount (диапазон в пределах единицы) с сортировкой по скидке
+            models.Index(fields=["discount_unit", "discount_value", "id"], name="offer_discount_idx"),
+            # Сортировка по скидке без фильтра по единице
+            models.Index(fields=["discount_value", "id"], name="offer_discount_value_id_idx"),
+            # Естественный ключ акции для import_offers: обновление по (партнер, город, название)
+            models.Index(fields=["partner", "city", "title"], name="offer_natural_key_idx"),
+        ]
+
+
+@receiver(pre_save, sender=Offer)
+def sync_discount_value(sender, instance, **kwargs):
+    """Пересчитывает числовую скидку из строки discount перед каждым сохранением, в том числе при loaddata."""
+    instance.discount_value, instance.discount_unit = parse_discount(instance.discount)
 
 
 class TelegramSubscription(models.Model):
@@ -109,3 +190,23 @@ class TelegramSubscription(models.Model):
     def get_all_subscribed_users(cls):
         """Получить список всех активных подписчиков."""
         return list(cls.objects.filter(is_active=True).values_list("user_id", flat=True))
+
+
+class TelegramSubscriptionFilter(models.Model):
+    """Фильтр подписки Telegram: уведомления только по выбранным городам, категориям или партнёрам."""
+
+    KIND_CHOICES = [("city", "Город"), ("category", "Категория"), ("partner", "Партнёр")]
+
+    user_id = models.BigIntegerField(verbose_name="ID пользователя Telegram")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Вид фильтра")
+    object_id = models.IntegerField(verbose_name="ID объекта")
+
+    class Meta:
+        verbose_name = "Фильтр подписки Telegram"
+        verbose_name_plural = "Фильтры подписок Telegram"
+        constraints = [
+            models.UniqueConstraint(fields=["user_id", "kind", "object_id"], name="unique_subscription_filter")
+        ]
+
+    def __str__(self):
+        return f"Фильтр {self.user_id}: {self.get_kind_display()} {self.object_id}"
@@ -0,0 +1,354 @@
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404, QueryDict
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+from rest_framework.settings import api_settings
+
+
+def keyset_ordering(ordering):
+    """
+    Ключ keyset-пагинации: первое поле сортировки и id в том же направлении.
+    Пара (поле, id) уникальна, поэтому позиция в выборке задается однозначно.
+    """
+    field = ordering[0]
+    return (field, "-id" if field.startswith("-") else "id")
+
+
+def keyset_position(instance, ordering):
+    """Позиция объекта (или строки .values()) в выборке: JSON-строка [значение поля сортировки, id]."""
+    field = ordering[0].lstrip("-")
+    if isinstance(instance, dict):
+        return json.dumps([str(instance[field]), instance["id"]])
+    return json.dumps([str(getattr(instance, field)), instance.pk])
+
+
+def keyset_filter(ordering, position, reverse=False):
+    """
+    Условие "после позиции" для сортировки keyset_ordering:
+    (поле > значение) или (поле = значение и id > id позиции), с учетом направления.
+    Дополнительное условие поле >= значение задает границу диапазона для индекса (поле, id),
+    поэтому глубокие страницы читаются из индекса с позиции, а не с начала.
+    """
+    value, pk = json.loads(position)
+    field = ordering[0]
+    attr = field.lstrip("-")
+    lookup = "lt" if field.startswith("-") != reverse else "gt"
+    after = Q(**{f"{attr}__{lookup}": value}) | Q(**{attr: value, f"pk__{lookup}": pk})
+    return Q(**{f"{attr}__{lookup}e": value}) & after
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк по статистике Postgres вместо COUNT(*).
+    Для выборки без условий берется reltuples из pg_class, для выборки с условиями -
+    оценка планировщика (EXPLAIN). Возвращает None, если оценки нет.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+            estimate = row[0] if row else -1
+        else:
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]["Plan"]["Plan Rows"]
+    # reltuples = -1, если по таблице еще не собиралась статистика
+    return int(estimate) if estimate >= 0 else None
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator с приблизительным количеством записей для очень больших таблиц.
+    Если оценка по статистике Postgres не меньше PROMO_APPROXIMATE_COUNT_THRESHOLD,
+    используется она, иначе - точный COUNT(*). При пороге 0 (по умолчанию) оценка выключена.
+    """
+
+    @cached_property
+    def count(self):
+        if self._uses_estimate():
+            estimate = self._estimate()
+            if estimate is not None:
+                return estimate
+        return super().count
+
+    async def acount(self):
+        """
+        count для асинхронных представлений: оценка или COUNT(*) через асинхронный ORM.
+        Значение сохраняется в count, поэтому page() и num_pages после него не обращаются к БД.
+        """
+        if "count" not in self.__dict__:
+            count = await sync_to_async(self._estimate)() if self._uses_estimate() else None
+            if count is None:
+                count = await self.object_list.acount()
+            self.__dict__["count"] = count
+        return self.count
+
+    def _uses_estimate(self):
+        return bool(settings.PROMO_APPROXIMATE_COUNT_THRESHOLD) and hasattr(self.object_list, "query")
+
+    def _estimate(self):
+        """Оценка количества, если она не меньше PROMO_APPROXIMATE_COUNT_THRESHOLD, иначе None."""
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= settings.PROMO_APPROXIMATE_COUNT_THRESHOLD:
+            return estimate
+        return None
+
+
+class ApproximateCountPageNumberPagination(PageNumberPagination):
+    """Пагинация API по номеру страницы с приблизительным count для больших таблиц."""
+
+    django_paginator_class = ApproximateCountPaginator
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений: количество и страница через асинхронный ORM."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        await paginator.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [item async for item in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class OfferCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация акций.
+    Следующая страница выбирается условием по ключу сортировки, а не OFFSET,
+    поэтому глубокие страницы не замедляются и не требуют COUNT(*).
+
+    В отличие от CursorPagination, позиция курсора - пара (поле сортировки, id),
+    поэтому много акций с одинаковой датой начала не превращаются в OFFSET внутри курсора.
+    """
+
+    ordering = ("-valid_from", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        return keyset_ordering(super().get_ordering(request, queryset, view))
+
+    def _get_position_from_instance(self, instance, ordering):
+        return keyset_position(instance, ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.paginate_results(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений: строки страницы через асинхронный ORM."""
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.paginate_results([item async for item in queryset])
+
+    def _cursor_position(self):
+        if self.cursor is None:
+            return 0, False, None
+        return self.cursor
+
+    def page_queryset(self, queryset, request, view=None):
+        """Выборка страницы (на одну строку больше размера страницы) без выполнения запроса."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        (offset, reverse, current_position) = self._cursor_position()
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(keyset_filter(self.ordering, current_position, reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Позиции уникальны, поэтому offset в собственных курсорах всегда 0
+        return queryset[offset : offset + self.page_size + 1]
+
+    def paginate_results(self, results):
+        """Страница и ссылки на соседние страницы по загруженным строкам page_queryset."""
+        (offset, reverse, current_position) = self._cursor_position()
+        self.page = list(results[: self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+def get_offer_paginator(request):
+    """
+    Выбирает пагинацию для списка акций.
+    По умолчанию - по номеру страницы (DEFAULT_PAGINATION_CLASS), с ?pagination=cursor
+    или при переходе по ссылке с ?cursor= - курсорная.
+    """
+    params = request.query_params
+    if params.get("pagination") == "cursor" or "cursor" in params:
+        return OfferCursorPagination()
+    return api_settings.DEFAULT_PAGINATION_CLASS()
+
+
+def encode_after(position):
+    """Кодирует позицию keyset-пагинации для параметра ?after= в URL страницы."""
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_after(token):
+    """Декодирует параметр ?after=; для некорректного значения - 404, как для неверного номера страницы."""
+    try:
+        position = base64.urlsafe_b64decode(token.encode()).decode()
+        value, pk = json.loads(position)
+        int(pk)
+    except (binascii.Error, UnicodeError, TypeError, ValueError):
+        raise Http404("Некорректный параметр after")
+    return position
+
+
+class LoadMoreMixin:
+    """
+    Режим "Показать еще" для ListView: с параметром ?after= страница выбирается
+    условием по ключу сортировки (keyset), без COUNT(*) и OFFSET.
+    Без ?after= представление работает как обычно, по номеру страницы,
+    но ссылка "Показать еще" на каждой странице ведет в keyset-режим.
+    """
+
+    # Первое поле сортировки для keyset; id добавляется автоматически
+    keyset_field = "id"
+    paginator_class = ApproximateCountPaginator
+
+    def get_keyset_ordering(self):
+        return keyset_ordering([self.keyset_field])
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        queryset = queryset.order_by(*ordering)
+        token = self.request.GET.get("after")
+        if token is None:
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            # Страница загружается один раз: и для шаблона, и для ссылки "Показать еще"
+            object_list = page.object_list = list(object_list)
+            self.next_after = self._next_after(object_list, ordering, page.has_next())
+            return paginator, page, object_list, is_paginated
+
+        position = decode_after(token)
+        try:
+            results = list(queryset.filter(keyset_filter(ordering, position))[: page_size + 1])
+        except (TypeError, ValueError, ValidationError):
+            raise Http404("Некорректный параметр after")
+        object_list = results[:page_size]
+        self.next_after = self._next_after(object_list, ordering, len(results) > page_size)
+        return None, None, object_list, False
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """
+        paginate_queryset для асинхронных представлений: те же режимы, количество и
+        страница загружаются асинхронным ORM.
+        """
+        ordering = self.get_keyset_ordering()
+        queryset = queryset.order_by(*ordering)
+        token = self.request.GET.get("after")
+        if token is None:
+            paginator = self.get_paginator(
+                queryset,
+                page_size,
+                orphans=self.get_paginate_orphans(),
+                allow_empty_first_page=self.get_allow_empty(),
+            )
+            await paginator.acount()
+            page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+            try:
+                page = paginator.page(paginator.num_pages if page_number == "last" else page_number)
+            except InvalidPage as exc:
+                raise Http404(f"Некорректный номер страницы: {exc}")
+            object_list = page.object_list = [item async for item in page.object_list]
+            self.next_after = self._next_after(object_list, ordering, page.has_next())
+            return paginator, page, object_list, page.has_other_pages()
+
+        position = decode_after(token)
+        try:
+            results = [item async for item in queryset.filter(keyset_filter(ordering, position))[: page_size + 1]]
+        except (TypeError, ValueError, ValidationError):
+            raise Http404("Некорректный параметр after")
+        object_list = results[:page_size]
+        self.next_after = self._next_after(object_list, ordering, len(results) > page_size)
+        return None, None, object_list, False
+
+    @staticmethod
+    def _next_after(object_list, ordering, has_next):
+        if not has_next or not object_list:
+            return None
+        return encode_after(keyset_position(object_list[-1], ordering))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_after"] = self.next_after
+        context["load_more_query"] = self.load_more_query()
+        return context
+
+    def load_more_query(self):
+        """
+        Query string ссылки "Показать еще": ?after= и остальные параметры запроса (кроме page),
+        закодированные QueryDict.urlencode, включая повторяющиеся ключи.
+        """
+        if not self.next_after:
+            return ""
+        query = QueryDict(mutable=True)
+        query["after"] = self.next_after
+        for key, values in self.request.GET.lists():
+            if key not in ("page", "after"):
+                query.setlist(key, values)
+        return query.urlencode()
@@ -0,0 +1,74 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework import filters
+
+from .models import SEARCH_CONFIG
+
+# Слова запроса: буквы и цифры; знаки препинания и операторы tsquery отбрасываются
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def search_query(text):
+    """
+    Строит полнотекстовый запрос с префиксным поиском по каждому слову:
+    "скид рестор" -> скид:* & рестор:*. Слова проходят русский стемминг.
+    Возвращает None, если в тексте нет слов.
+    """
+    words = _WORD_RE.findall(text or "")
+    if not words:
+        return None
+    return SearchQuery(" & ".join(f"{word}:*" for word in words), config=SEARCH_CONFIG, search_type="raw")
+
+
+def search_offers(queryset, text):
+    """
+    Полнотекстовый поиск акций по названию, описанию, промокоду и названию партнера.
+    Условия проверяются по GIN-индексам search_vector акции и партнера;
+    в выборку добавляется релевантность search_rank (больше - лучше).
+    """
+    query = search_query(text)
+    if query is None:
+        return queryset
+    rank = SearchRank(F("search_vector"), query) + SearchRank(F("partner__search_vector"), query)
+    return queryset.filter(Q(search_vector=query) | Q(partner__search_vector=query)).annotate(
+        # double precision: значение ранга точно переносится в курсор пагинации
+        search_rank=Cast(rank, FloatField())
+    )
+
+
+class OfferSearchFilter(filters.SearchFilter):
+    """SearchFilter для акций: полнотекстовый поиск search_offers вместо ILIKE по search_fields."""
+
+    def filter_queryset(self, request, queryset, view):
+        text = " ".join(self.get_search_terms(request))
+        if not text:
+            return queryset
+        return search_offers(queryset, text)
+
+
+class OfferOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter для акций: результаты поиска без явного ?ordering= сортируются по релевантности.
+    Публичные имена сортировки из ordering_aliases заменяются полями модели.
+    """
+
+    # ?ordering=discount - по числовому значению скидки, а не по строке ("5%" раньше "40%")
+    ordering_aliases = {"discount": "discount_value"}
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        fields = [self._resolve_alias(field) for field in fields]
+        return super().remove_invalid_fields(queryset, fields, view, request)
+
+    def _resolve_alias(self, field):
+        prefix = "-" if field.startswith("-") else ""
+        name = field.lstrip("-")
+        return prefix + self.ordering_aliases.get(name, name)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if "search_rank" in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return ["-search_rank", *(ordering or [])]
+        return ordering
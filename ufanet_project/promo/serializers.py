@@ -1,8 +1,19 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
 from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
 from rest_framework import serializers
 
+from .cache import invalidate_tables_on_commit
+from .discounts import parse_discount
+from .images import srcsets
 from .models import Category, City, Offer, Partner
 
+# Размер пачки INSERT/UPDATE при пакетной записи акций
+BULK_BATCH_SIZE = 500
+
 
 class CitySerializer(serializers.ModelSerializer):
     """
@@ -37,6 +48,129 @@ class PartnerSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "description"]
 
 
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который при пакетной записи берет объекты из context["prefetched"]
+    (заполняет OfferBulkSerializer), а не делает запрос на каждое значение.
+    """
+
+    def to_internal_value(self, data):
+        objects = self.context.get("prefetched", {}).get(self.queryset.model)
+        if objects is None:
+            return super().to_internal_value(data)
+        pk = related_pk(self.queryset.model, data)
+        if pk is None:
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in objects:
+            self.fail("does_not_exist", pk_value=data)
+        return objects[pk]
+
+
+def related_pk(model, value):
+    """Первичный ключ модели из значения запроса или None, если значение некорректно."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return model._meta.pk.to_python(value)
+    except DjangoValidationError:
+        return None
+
+
+class OfferIdListField(serializers.ListField):
+    """Список id существующих акций (пакетное удаление); ошибки по позициям, как у ListField."""
+
+    child = serializers.IntegerField()
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        existing = set(Offer.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        errors = {index: ["Акция не найдена."] for index, pk in enumerate(ids) if pk not in existing}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return ids
+
+
+class OfferBulkSerializer(serializers.ListSerializer):
+    """
+    Пакетная запись акций (OfferSerializer(many=True)).
+    Связанные город, категория и партнер загружаются одним запросом на модель для всего списка,
+    акции создаются bulk_create и обновляются bulk_update в одной транзакции.
+    Ошибки возвращаются списком по позициям элементов; при любой ошибке ничего не записывается.
+    При обновлении instance - список акций, а элементы данных содержат id.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.prefetch_related_objects(data)
+        return super().to_internal_value(data)
+
+    def prefetch_related_objects(self, data):
+        """Загружает объекты для PrefetchedPrimaryKeyRelatedField всех элементов в context["prefetched"]."""
+        related = {
+            name: field.queryset.model
+            for name, field in self.child.fields.items()
+            if isinstance(field, PrefetchedPrimaryKeyRelatedField)
+        }
+        ids = {model: set() for model in related.values()}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            for name, model in related.items():
+                pk = related_pk(model, item.get(name))
+                if pk is not None:
+                    ids[model].add(pk)
+        self.context["prefetched"] = {model: model.objects.in_bulk(pks) if pks else {} for model, pks in ids.items()}
+
+    @cached_property
+    def instances(self):
+        return {instance.pk: instance for instance in self.instance or ()}
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+        pk = related_pk(Offer, data.get("id")) if isinstance(data, dict) else None
+        if pk not in self.instances:
+            raise serializers.ValidationError({"id": ["Акция не найдена."]})
+        self.child.instance = self.instances[pk]
+        self.child.initial_data = data
+        validated = super().run_child_validation(data)
+        validated["id"] = pk
+        return validated
+
+    def validate(self, attrs):
+        ids = [item["id"] for item in attrs if "id" in item]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Одна акция указана в запросе несколько раз.")
+        return attrs
+
+    def create(self, validated_data):
+        offers = [Offer(**item) for item in validated_data]
+        for offer in offers:
+            offer.discount_value, offer.discount_unit = parse_discount(offer.discount)
+        with transaction.atomic():
+            Offer.objects.bulk_create(offers, batch_size=BULK_BATCH_SIZE)
+            invalidate_tables_on_commit("promo_offer")
+        return offers
+
+    def update(self, instances, validated_data):
+        offers = []
+        fields = set()
+        for item in validated_data:
+            offer = self.instances[item.pop("id")]
+            for attr, value in item.items():
+                setattr(offer, attr, value)
+            if "discount" in item:
+                offer.discount_value, offer.discount_unit = parse_discount(offer.discount)
+                fields.update(("discount_value", "discount_unit"))
+            fields.update(item)
+            offers.append(offer)
+        with transaction.atomic():
+            if fields:
+                Offer.objects.bulk_update(offers, sorted(fields), batch_size=BULK_BATCH_SIZE)
+            invalidate_tables_on_commit("promo_offer")
+        return offers
+
+
 class OfferSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Offer.
@@ -47,13 +181,12 @@ class OfferSerializer(serializers.ModelSerializer):
     city = CitySerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     partner = PartnerSerializer(read_only=True)
-    city_id = serializers.PrimaryKeyRelatedField(queryset=City.objects.all(), source="city", write_only=True)
-    category_id = serializers.PrimaryKeyRelatedField(
-        queryset=Category.objects.all(), source="category", write_only=True
-    )
-    partner_id = serializers.PrimaryKeyRelatedField(queryset=Partner.objects.all(), source="partner", write_only=True)
+    city_id = PrefetchedPrimaryKeyRelatedField(queryset=City.objects.all(), source="city", write_only=True)
+    category_id = PrefetchedPrimaryKeyRelatedField(queryset=Category.objects.all(), source="category", write_only=True)
+    partner_id = PrefetchedPrimaryKeyRelatedField(queryset=Partner.objects.all(), source="partner", write_only=True)
     is_active = serializers.SerializerMethodField()
     days_left = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Offer
@@ -62,6 +195,8 @@ class OfferSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "discount",
+            "discount_value",
+            "discount_unit",
             "promo_code",
             "valid_from",
             "valid_to",
@@ -74,8 +209,10 @@ class OfferSerializer(serializers.ModelSerializer):
             "is_active",
             "days_left",
             "image",
+            "image_srcset",
         ]
-        read_only_fields = ["is_active", "days_left"]
+        read_only_fields = ["is_active", "days_left", "discount_value", "discount_unit"]
+        list_serializer_class = OfferBulkSerializer
 
     def get_is_active(self, obj):
         """
@@ -95,6 +232,18 @@ class OfferSerializer(serializers.ModelSerializer):
             return (obj.valid_to - timezone.now().date()).days
         return None
 
+    def get_image_srcset(self, obj):
+        """
+        Уменьшенные копии изображения для атрибута srcset по форматам: {"webp": "url 320w, ...", "jpeg": ...}.
+        None, если изображения нет или копии еще создаются.
+        """
+        return srcsets(obj.image_variants, self._media_url)
+
+    def _media_url(self, path):
+        url = Offer._meta.get_field("image").storage.url(path)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
     def validate(self, data):
         """
         Проверяет корректность дат начала и окончания акции.
@@ -104,3 +253,108 @@ class OfferSerializer(serializers.ModelSerializer):
             if data["valid_from"] > data["valid_to"]:
                 raise serializers.ValidationError("Дата начала не может быть позже даты окончания")
         return data
+
+
+class OfferReadSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор акций только для чтения (списки и просмотр акции).
+    Формирует тот же ответ, что и OfferSerializer, но из строк .values() (см. values_queryset),
+    без объектов моделей и полей ModelSerializer: текущая дата берется один раз на запрос,
+    вложенные город, категория и партнер строятся один раз на каждый id.
+    """
+
+    # Поля строки .values(): поля акции и вложенных объектов одним запросом с JOIN
+    VALUE_FIELDS = (
+        "id",
+        "title",
+        "description",
+        "discount",
+        "discount_value",
+        "discount_unit",
+        "promo_code",
+        "valid_from",
+        "valid_to",
+        "image",
+        "image_variants",
+        "city_id",
+        "city__name",
+        "category_id",
+        "category__name",
+        "partner_id",
+        "partner__name",
+        "partner__description",
+    )
+    # Число со скидкой форматируется так же, как в OfferSerializer ("10.00")
+    discount_value_field = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # При many=True создается один дочерний сериализатор на весь список,
+        # поэтому дата и вложенные объекты общие для всех строк
+        self.today = timezone.now().date()
+        self._nested = {}
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        """Выборка акций строками .values() с полями для сериализатора."""
+        return queryset.values(*cls.VALUE_FIELDS)
+
+    def _nested_object(self, kind, pk, build):
+        key = (kind, pk)
+        if key not in self._nested:
+            self._nested[key] = build()
+        return self._nested[key]
+
+    @cached_property
+    def _image_url_prefix(self):
+        """
+        Общий префикс ссылок на изображения для файлового хранилища: URL файла -
+        base_url и путь к файлу. Для других хранилищ None, ссылка строится для каждой акции.
+        """
+        storage = Offer._meta.get_field("image").storage
+        if not isinstance(storage, FileSystemStorage):
+            return None
+        request = self.context.get("request")
+        return request.build_absolute_uri(storage.base_url) if request is not None else storage.base_url
+
+    def _image_url(self, name):
+        if not name:
+            return None
+        if self._image_url_prefix is not None:
+            return self._image_url_prefix + filepath_to_uri(name).lstrip("/")
+        url = Offer._meta.get_field("image").storage.url(name)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def to_representation(self, row):
+        valid_from, valid_to = row["valid_from"], row["valid_to"]
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "description": row["description"],
+            "discount": row["discount"],
+            "discount_value": self.discount_value_field.to_representation(row["discount_value"]),
+            "discount_unit": row["discount_unit"],
+            "promo_code": row["promo_code"],
+            "valid_from": valid_from.isoformat(),
+            "valid_to": valid_to.isoformat(),
+            "city": self._nested_object(
+                "city", row["city_id"], lambda: {"id": row["city_id"], "name": row["city__name"]}
+            ),
+            "category": self._nested_object(
+                "category", row["category_id"], lambda: {"id": row["category_id"], "name": row["category__name"]}
+            ),
+            "partner": self._nested_object(
+                "partner",
+                row["partner_id"],
+                lambda: {
+                    "id": row["partner_id"],
+                    "name": row["partner__name"],
+                    "description": row["partner__description"],
+                },
+            ),
+            "is_active": valid_from <= self.today <= valid_to,
+            "days_left": (valid_to - self.today).days if valid_to else None,
+            "image": self._image_url(row["image"]),
+            "image_srcset": srcsets(row["image_variants"], self._image_url),
+        }
@@ -0,0 +1,11 @@
+from django import template
+
+from .. import images
+
+register = template.Library()
+
+
+@register.filter
+def srcset(variants, fmt):
+    """Атрибут srcset уменьшенных копий изображения в формате fmt: {{ offer.image_variants|srcset:"webp" }}."""
+    return images.srcset(variants, fmt)
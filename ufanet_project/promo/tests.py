@@ -1,12 +1,40 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
 from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.test import Client, TestCase  # Импорт для обычных тестов
-from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, SimpleTestCase, TestCase, override_settings, tag  # Импорт для обычных тестов
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from django.utils import timezone
+from django.utils.html import escape
+from django.utils.http import urlencode
+from PIL import Image
 from rest_framework.test import APIClient, APITestCase
 
-from .models import Category, City, Offer, Partner
+from ufanet_project.test_runner import TestRunner
+
+from .models import Category, City, Offer, Partner, TelegramSubscription
+from .async_views import db_slot
+from .cache import get_cities, invalidate_tables_on_commit
+from .discounts import parse_discount
+from .management.commands.consume_wal_invalidations import changed_tables
+from .pagination import ApproximateCountPaginator, encode_after, estimate_count
+from .search import search_offers
+from .serializers import OfferReadSerializer, OfferSerializer
 
 
 class OfferAPITestCase(APITestCase):
@@ -257,8 +285,8 @@ class OfferAPITestCase(APITestCase):
         response = self.client.get(active_url)
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)  # Ожидаем 2 активные акции
-        offer_titles = [item["title"] for item in response.data]
+        self.assertEqual(response.data["count"], 2)  # Ожидаем 2 активные акции
+        offer_titles = [item["title"] for item in response.data["results"]]
         self.assertIn("Акция 1", offer_titles)
         self.assertIn("Акция 2", offer_titles)
         self.assertNotIn("Акция 3", offer_titles)
@@ -689,8 +717,1570 @@ class OfferAPITestCase(APITestCase):
         """
         response = self.client.get(self.active_offers_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)
-        offer_titles = [item["title"] for item in response.data]
+        self.assertEqual(response.data["count"], 2)
+        offer_titles = [item["title"] for item in response.data["results"]]
         self.assertIn("Акция 1 API", offer_titles)
         self.assertIn("Акция 2 API", offer_titles)
         self.assertNotIn("Акция 3 API", offer_titles)
+
+
+class OfferQueryCountTest(APITestCase):
+    """
+    Регрессионные тесты на N+1: число SQL-запросов для эндпоинтов и страниц
+    со списками акций не должно зависеть от количества акций.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.city = City.objects.create(name="Город")
+        self.category = Category.objects.create(name="Категория")
+        self.partner = Partner.objects.create(name="Партнер", description="Описание")
+        self.created = 0
+
+    def add_offers(self, count):
+        """
+        Создает акции с собственными городом, категорией или партнером,
+        чтобы ленивая загрузка связанных объектов давала отдельный запрос на каждую акцию.
+        """
+        for _ in range(count):
+            index = self.created
+            self.created += 1
+            Offer.objects.create(
+                title=f"Акция {index}",
+                description="Описание",
+                discount="10%",
+                valid_from=date.today() - timedelta(days=1),
+                valid_to=date.today() + timedelta(days=3),
+                city=self.city if index % 3 else City.objects.create(name=f"Город {index}"),
+                category=self.category if index % 3 != 1 else Category.objects.create(name=f"Категория {index}"),
+                partner=self.partner if index % 3 != 2 else Partner.objects.create(name=f"П {index}", description=""),
+            )
+
+    def count_queries(self, url, client=None):
+        # Города для шаблонов уже в кэше процесса, как в обычном режиме работы
+        get_cities()
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url, expected, client=None):
+        """Проверяет, что число запросов одинаково для 2 и 8 акций и равно expected."""
+        self.add_offers(2)
+        small = self.count_queries(url, client)
+        self.add_offers(6)
+        large = self.count_queries(url, client)
+        self.assertEqual(small, large, f"{url}: число запросов растет с количеством акций")
+        self.assertEqual(large, expected, url)
+
+    def test_offer_list_api(self):
+        """Список акций: COUNT для пагинации и один SELECT с JOIN"""
+        self.assert_constant_queries(reverse("offer-list"), 2)
+
+    def test_offer_actions_api(self):
+        """Действия active и expiring_soon: COUNT для пагинации и SELECT"""
+        self.assert_constant_queries(reverse("offer-active"), 2)
+        self.assert_constant_queries(reverse("offer-expiring-soon"), 2)
+        # Курсорная пагинация не выполняет COUNT
+        self.assert_constant_queries(reverse("offer-active") + "?pagination=cursor", 1)
+
+    def test_offer_list_cursor_api(self):
+        """Список акций в курсорном режиме: один SELECT без COUNT"""
+        self.assert_constant_queries(reverse("offer-list") + "?pagination=cursor", 1)
+
+    def test_related_offers_api(self):
+        """Акции города, категории и партнера: объект, COUNT и SELECT"""
+        self.assert_constant_queries(reverse("city-offers", args=[self.city.id]), 3)
+        self.assert_constant_queries(reverse("category-offers", args=[self.category.id]), 3)
+        self.assert_constant_queries(reverse("partner-active-offers", args=[self.partner.id]), 3)
+
+    def test_template_views(self):
+        """HTML-страницы со списками акций: без запросов к городам (они в кэше процесса)"""
+        client = Client()
+        self.assert_constant_queries(reverse("all_offers"), 2, client)
+        self.assert_constant_queries(reverse("offer_list", args=[self.category.id]), 2, client)
+        self.assert_constant_queries(reverse("search") + "?q=Акция", 1, client)
+
+    def test_load_more_view(self):
+        """Режим "Показать еще": только SELECT страницы, без COUNT"""
+        after = encode_after('["", 0]')
+        self.assert_constant_queries(reverse("all_offers") + f"?after={after}", 1, Client())
+
+
+class OfferActionPaginationTest(APITestCase):
+    """
+    Тесты пагинации дополнительных действий со списками акций.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.city = City.objects.create(name="Город")
+        category = Category.objects.create(name="Категория")
+        partner = Partner.objects.create(name="Партнер", description="Описание")
+        for index in range(25):
+            Offer.objects.create(
+                title=f"Акция {index}",
+                description="Описание",
+                discount="10%",
+                # Несколько акций с одинаковой датой начала: порядок между ними задает id
+                valid_from=date.today() - timedelta(days=index % 5),
+                valid_to=date.today() + timedelta(days=30),
+                city=self.city,
+                category=category,
+                partner=partner,
+            )
+
+    def test_action_is_paginated(self):
+        """Тест того, что действие возвращает одну страницу, а не весь список"""
+        response = self.client.get(reverse("city-offers", args=[self.city.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_cursor_pagination_walks_all_pages(self):
+        """Тест обхода всех страниц курсором без пропусков и повторов"""
+        url = reverse("offer-active") + "?pagination=cursor"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        expected = list(Offer.objects.order_by("-valid_from", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_offer_list_cursor_walks_all_pages(self):
+        """Тест курсорного режима основного списка: все акции по (-valid_from, -id) и обратный обход"""
+        url = reverse("offer-list") + "?pagination=cursor"
+        seen = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            pages.append(url)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(Offer.objects.order_by("-valid_from", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+        # Ссылка previous с последней страницы возвращает предыдущую страницу
+        response = self.client.get(pages[-1])
+        previous = self.client.get(response.data["previous"])
+        self.assertEqual([item["id"] for item in previous.data["results"]], expected[10:20])
+
+    def test_cursor_uses_ordering_param(self):
+        """Тест курсорного режима с ?ordering=: одинаковые скидки упорядочиваются по id"""
+        url = reverse("offer-list") + "?pagination=cursor&ordering=discount"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 25)
+
+    def test_invalid_cursor(self):
+        """Тест некорректного курсора"""
+        response = self.client.get(reverse("offer-list") + "?cursor=bad")
+        self.assertEqual(response.status_code, 404)
+
+    def test_load_more_walks_all_offers(self):
+        """Тест режима "Показать еще" на странице всех акций: порционный обход без повторов"""
+        client = Client()
+        response = client.get(reverse("all_offers"))
+        seen = [offer.id for offer in response.context["offers"]]
+        after = response.context["next_after"]
+        while after:
+            response = client.get(reverse("all_offers"), {"after": after})
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.context["is_paginated"])
+            seen.extend(offer.id for offer in response.context["offers"])
+            after = response.context["next_after"]
+
+        expected = list(Offer.objects.order_by("title", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_load_more_link_rendered(self):
+        """Тест ссылки "Показать еще" на страницах списков"""
+        client = Client()
+        response = client.get(reverse("all_offers"))
+        self.assertContains(response, "Показать еще")
+        self.assertContains(response, f"?{urlencode({'after': response.context['next_after']})}")
+
+        # Параметры запроса кодируются: &, #, + и пробелы не ломают ссылку
+        response = client.get(reverse("all_offers"), {"q": "кофе & чай #1+2", "tag": ["1", "2"], "page": 1})
+        self.assertEqual(
+            response.context["load_more_query"],
+            urlencode({"after": response.context["next_after"], "q": "кофе & чай #1+2", "tag": ["1", "2"]}, doseq=True),
+        )
+        self.assertContains(response, f'href="?{escape(response.context["load_more_query"])}"')
+
+        for index in range(10):
+            Category.objects.create(name=f"Категория {index}")
+        response = client.get(reverse("category_list"))
+        self.assertContains(response, "Показать еще")
+        response = client.get(reverse("category_list"), {"after": response.context["next_after"]})
+        self.assertEqual(len(response.context["categories"]), 3)
+        self.assertIsNone(response.context["next_after"])
+
+    def test_invalid_load_more_token(self):
+        """Тест некорректного параметра after"""
+        response = Client().get(reverse("all_offers"), {"after": "bad"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ApproximateCountTest(TestCase):
+    """
+    Тесты приблизительного количества записей по статистике Postgres.
+    """
+
+    def setUp(self):
+        city = City.objects.create(name="Город")
+        category = Category.objects.create(name="Категория")
+        partner = Partner.objects.create(name="Партнер", description="Описание")
+        for index in range(30):
+            Offer.objects.create(
+                title=f"Акция {index}",
+                description="Описание",
+                discount="10%",
+                valid_from=date.today(),
+                valid_to=date.today() + timedelta(days=30),
+                city=city,
+                category=category,
+                partner=partner,
+            )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE promo_offer")
+
+    def test_estimate_count(self):
+        """Тест оценки по reltuples для таблицы и по плану запроса для выборки с условием"""
+        self.assertEqual(estimate_count(Offer.objects.all()), 30)
+        estimate = estimate_count(Offer.objects.filter(title="Акция 1"))
+        self.assertIsInstance(estimate, int)
+        self.assertLess(estimate, 30)
+
+    @override_settings(PROMO_APPROXIMATE_COUNT_THRESHOLD=10)
+    def test_paginator_uses_estimate_above_threshold(self):
+        """Тест того, что выше порога COUNT(*) не выполняется"""
+        paginator = ApproximateCountPaginator(Offer.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 30)
+        self.assertNotIn("COUNT", queries[0]["sql"])
+
+    @override_settings(PROMO_APPROXIMATE_COUNT_THRESHOLD=1000)
+    def test_paginator_counts_exactly_below_threshold(self):
+        """Тест точного COUNT(*) для небольших выборок"""
+        paginator = ApproximateCountPaginator(Offer.objects.all(), 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 30)
+        self.assertIn("COUNT", queries[-1]["sql"])
+
+    def test_estimate_disabled_by_default(self):
+        """Тест того, что по умолчанию используется точный COUNT(*)"""
+        Offer.objects.filter(title="Акция 0").delete()
+        self.assertEqual(ApproximateCountPaginator(Offer.objects.all(), 10).count, 29)
+
+
+class OfferFullTextSearchTest(APITestCase):
+    """
+    Тесты полнотекстового поиска акций (HTML-поиск и параметр search в API).
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        city = City.objects.create(name="Уфа")
+        category = Category.objects.create(name="Еда")
+        coffee = Partner.objects.create(name="Кофейня Зерно", description="")
+        other = Partner.objects.create(name="Партнер", description="")
+        defaults = {
+            "discount": "10%",
+            "valid_from": date.today(),
+            "valid_to": date.today() + timedelta(days=30),
+            "city": city,
+            "category": category,
+        }
+        self.restaurants = Offer.objects.create(
+            title="Скидки в ресторанах", description="Ужин со скидкой", partner=other, **defaults
+        )
+        self.dinner = Offer.objects.create(
+            title="Вечернее меню", description="Скидка на ужин в ресторане", partner=other, **defaults
+        )
+        self.coffee = Offer.objects.create(
+            title="Кофе с собой", description="Второй бесплатно", partner=coffee, promo_code="SUMMER2025", **defaults
+        )
+
+    def search(self, text):
+        return list(search_offers(Offer.objects.with_related(), text).order_by("-search_rank", "id"))
+
+    def test_russian_stemming(self):
+        """Тест поиска по другой словоформе"""
+        self.assertEqual(self.search("ресторан"), [self.restaurants, self.dinner])
+        self.assertEqual(self.search("скидка ужин"), [self.restaurants, self.dinner])
+
+    def test_prefix_matching(self):
+        """Тест поиска по началу слова"""
+        self.assertEqual(self.search("кофе"), [self.coffee])
+        self.assertEqual(self.search("рест"), [self.restaurants, self.dinner])
+
+    def test_partner_and_promo_code(self):
+        """Тест поиска по названию партнера и промокоду"""
+        self.assertEqual(self.search("зерно"), [self.coffee])
+        self.assertEqual(self.search("summer"), [self.coffee])
+
+    def test_title_ranked_above_description(self):
+        """Тест того, что совпадение в названии релевантнее совпадения в описании"""
+        results = self.search("ресторанах")
+        self.assertEqual(results[0], self.restaurants)
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_query_without_words(self):
+        """Тест запроса без слов: выборка не меняется"""
+        self.assertEqual(search_offers(Offer.objects.all(), "!!! &|").count(), 3)
+
+    def test_html_search_ordered_by_rank(self):
+        """Тест HTML-поиска: результаты по релевантности"""
+        response = Client().get(reverse("search"), {"q": "ресторанах"})
+        self.assertEqual([offer.id for offer in response.context["offers"]], [self.restaurants.id, self.dinner.id])
+
+    def test_api_search(self):
+        """Тест параметра search в API: полнотекстовый поиск и сортировка по релевантности"""
+        response = self.client.get(reverse("offer-list"), {"search": "ресторанах"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.restaurants.id, self.dinner.id])
+
+        # Явный ?ordering= важнее релевантности
+        response = self.client.get(reverse("offer-list"), {"search": "ресторан", "ordering": "-valid_from"})
+        self.assertEqual(response.data["count"], 2)
+
+    def test_api_search_with_cursor(self):
+        """Тест курсорной пагинации результатов поиска (позиция - релевантность и id)"""
+        url = reverse("offer-list") + "?pagination=cursor&page_size=1&search=скидк"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(sorted(seen), [self.restaurants.id, self.dinner.id])
+
+
+# Акции для EXPLAIN-тестов: даты начала за ~4 года, срок действия 1-60 дней,
+# поэтому активна лишь небольшая часть акций, как в реальном каталоге
+SEED_OFFERS_SQL = """
+INSERT INTO promo_offer (
+    title, description, discount, discount_value, discount_unit,
+    category_id, partner_id, city_id, valid_from, valid_to, image
+)
+SELECT 'Акция ' || i, 'Описание', (i %% 100) || '%%', i %% 100, 'percent',
+       (%s::bigint[])[1 + i %% 10], (%s::bigint[])[1 + i %% 50], (%s::bigint[])[1 + (i / 10) %% 20],
+       current_date - 1200 + i %% 1500, current_date - 1200 + i %% 1500 + 1 + i %% 60, ''
+FROM generate_series(1, %s) AS i
+"""
+
+
+def plan_nodes(plan):
+    """Все узлы плана EXPLAIN (FORMAT JSON)."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+class SlowTagRunnerTest(SimpleTestCase):
+    """Тесты с тегом "slow" выполняются только по явному --tag slow."""
+
+    def test_slow_excluded_by_default(self):
+        self.assertEqual(TestRunner(verbosity=0).exclude_tags, {"slow"})
+        self.assertEqual(TestRunner(verbosity=0, exclude_tags=["api"]).exclude_tags, {"api", "slow"})
+
+    def test_slow_runs_when_requested(self):
+        runner = TestRunner(verbosity=0, tags=["slow"])
+        self.assertEqual(runner.tags, {"slow"})
+        self.assertEqual(runner.exclude_tags, set())
+
+
+@tag("slow")
+@override_settings(PROMO_API_CACHE_TIMEOUT=0)
+class OfferIndexPlanTest(APITestCase):
+    """
+    EXPLAIN-тесты индексов акций: основные списки на большом наборе данных
+    (по умолчанию 1 млн акций, переменная PROMO_EXPLAIN_ROWS) читают promo_offer
+    по индексам, без последовательного сканирования.
+    Обычный запуск тестов их пропускает (ufanet_project.test_runner.TestRunner);
+    запуск только этих тестов: python manage.py test promo --tag slow
+    """
+
+    rows = int(os.getenv("PROMO_EXPLAIN_ROWS", "1000000"))
+
+    @classmethod
+    def setUpTestData(cls):
+        cities = [City.objects.create(name=f"Город {index}").id for index in range(20)]
+        categories = [Category.objects.create(name=f"Категория {index}").id for index in range(10)]
+        partners = [Partner.objects.create(name=f"Партнер {index}", description="").id for index in range(50)]
+        cls.city, cls.category = cities[0], categories[0]
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_OFFERS_SQL, [categories, partners, cities, cls.rows])
+            cursor.execute("ANALYZE promo_offer")
+
+    def explain(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        return plan[0]["Plan"]
+
+    def offer_scans(self, plan):
+        """Способы чтения promo_offer в плане и использованные индексы."""
+        scans = set()
+        indexes = set()
+        for node in plan_nodes(plan):
+            if node.get("Relation Name") == "promo_offer":
+                scans.add(node["Node Type"])
+                if "Index Name" in node:
+                    indexes.add(node["Index Name"])
+            elif node["Node Type"] == "Bitmap Index Scan":
+                indexes.add(node["Index Name"])
+        return scans, indexes
+
+    def assert_index_scans(self, url, client=None, expected_index=None):
+        """
+        Выполняет запрос к странице и проверяет планы всех выборок акций (кроме COUNT для пагинации).
+        Возвращает ответ.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+
+        selects = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT") and 'FROM "promo_offer"' in query["sql"] and "COUNT(*)" not in query["sql"]
+        ]
+        self.assertTrue(selects, url)
+        for sql in selects:
+            scans, indexes = self.offer_scans(self.explain(sql))
+            self.assertNotIn("Seq Scan", scans, f"{url}: {sql}")
+            self.assertTrue(scans & {"Index Scan", "Index Only Scan", "Bitmap Heap Scan"}, f"{url}: {scans}")
+            if expected_index:
+                self.assertIn(expected_index, indexes, f"{url}: {indexes}")
+        return response
+
+    def test_offer_list(self):
+        """Список API по умолчанию (-valid_from, -id), первая и следующая страницы курсора"""
+        self.assert_index_scans(reverse("offer-list"), expected_index="offer_valid_from_id_idx")
+        response = self.assert_index_scans(
+            reverse("offer-list") + "?pagination=cursor", expected_index="offer_valid_from_id_idx"
+        )
+        self.assert_index_scans(response.data["next"], expected_index="offer_valid_from_id_idx")
+
+    def test_validity_actions(self):
+        """Действия active и expiring_soon"""
+        self.assert_index_scans(reverse("offer-active"))
+        self.assert_index_scans(reverse("offer-expiring-soon"))
+
+    def test_city_category_filter(self):
+        """Фильтр API по городу, категории и активности"""
+        url = reverse("offer-list") + f"?city={self.city}&category={self.category}&active=true"
+        self.assert_index_scans(url, expected_index="offer_city_category_valid_idx")
+
+    def test_discount_filter_and_ordering(self):
+        """Фильтр по диапазону скидки и сортировка по скидке"""
+        self.assert_index_scans(reverse("offer-list") + "?min_discount=95")
+        self.assert_index_scans(
+            reverse("offer-list") + "?min_discount=95&ordering=discount", expected_index="offer_discount_idx"
+        )
+        self.assert_index_scans(
+            reverse("offer-list") + "?ordering=-discount", expected_index="offer_discount_value_id_idx"
+        )
+
+    def test_category_page_queryset(self):
+        """Выборка страницы категории с фильтром по городу (OfferListListView)"""
+        queryset = Offer.objects.with_related().filter(category_id=self.category, city_id=self.city)
+        sql, params = queryset.query.sql_with_params()
+        scans, indexes = self.offer_scans(self.explain(sql, params))
+        self.assertNotIn("Seq Scan", scans)
+        self.assertIn("offer_city_category_valid_idx", indexes)
+
+    def test_all_offers_page(self):
+        """Все акции на сайте: сортировка по названию и режим «Показать еще»"""
+        client = Client()
+        response = self.assert_index_scans(reverse("all_offers"), client, expected_index="offer_title_id_idx")
+        url = reverse("all_offers") + f"?after={response.context['next_after']}"
+        self.assert_index_scans(url, client, expected_index="offer_title_id_idx")
+
+
+class OfferDiscountValueTest(APITestCase):
+    """
+    Тесты числовой скидки: разбор строки discount, синхронизация при сохранении,
+    фильтры min_discount/max_discount и сортировка.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.defaults = {
+            "description": "Описание",
+            "valid_from": date.today(),
+            "valid_to": date.today() + timedelta(days=30),
+            "city": City.objects.create(name="Город"),
+            "category": Category.objects.create(name="Категория"),
+            "partner": Partner.objects.create(name="Партнер", description=""),
+        }
+
+    def create(self, discount):
+        return Offer.objects.create(title=f"Акция {discount}", discount=discount, **self.defaults)
+
+    def test_parse_discount(self):
+        """Тест разбора строк скидок из фикстур"""
+        cases = {
+            "20%": (20, "percent"),
+            "Скидка 54%": (54, "percent"),
+            "20": (20, "percent"),
+            "12,5 %": (Decimal("12.5"), "percent"),
+            "Скидка 250 ₽": (250, "rub"),
+            "500 руб.": (500, "rub"),
+            "1600 бонусов": (1600, "bonus"),
+            "Скидка 300 р. на доставку": (300, "rub"),
+            "При заказе от 1500 ₽ скидка 20%": (20, "percent"),
+            "Скидка 300 ₽ при заказе от 1000 ₽": (300, "rub"),
+            "Скидка 5 на рассрочку": (5, "percent"),
+            "Подарок": (0, ""),
+            "": (0, ""),
+            "Скидка 9999999999.99 ₽": (Decimal("9999999999.99"), "rub"),
+            "Скидка 10000000000000 ₽": (0, ""),
+            "9999999999.999%": (0, ""),
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_discount(text), expected)
+
+    def test_value_synced_on_save(self):
+        """Тест пересчета числовой скидки при сохранении, в том числе с update_fields"""
+        offer = self.create("5%")
+        self.assertEqual((offer.discount_value, offer.discount_unit), (5, "percent"))
+
+        offer.discount = "Скидка 300 ₽"
+        offer.save(update_fields=["discount"])
+        offer.refresh_from_db()
+        self.assertEqual((offer.discount_value, offer.discount_unit), (300, "rub"))
+
+    def test_value_filled_on_loaddata(self):
+        """Тест заполнения числовой скидки при загрузке фикстуры"""
+        call_command("loaddata", "initial_data", verbosity=0)
+        offers = Offer.objects.exclude(discount_unit="")
+        self.assertTrue(offers.exists())
+        for offer in offers:
+            self.assertEqual((offer.discount_value, offer.discount_unit), parse_discount(offer.discount))
+
+    def test_value_synced_on_api_update(self):
+        """Тест пересчета числовой скидки при изменении через API"""
+        offer = self.create("5%")
+        response = self.client.patch(reverse("offer-detail", args=[offer.id]), {"discount": "45%"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["discount"], "45%")
+        self.assertEqual(Decimal(response.data["discount_value"]), 45)
+
+    def test_min_max_discount_compare_numbers(self):
+        """Тест фильтров по числу: "5%" меньше "40%", рубли не смешиваются с процентами"""
+        five, forty, hundred = self.create("5%"), self.create("40%"), self.create("100%")
+        self.create("Скидка 250 ₽")
+
+        response = self.client.get(reverse("offer-list"), {"min_discount": 10})
+        self.assertEqual({item["id"] for item in response.data["results"]}, {forty.id, hundred.id})
+
+        response = self.client.get(reverse("offer-list"), {"min_discount": 5, "max_discount": 40})
+        self.assertEqual({item["id"] for item in response.data["results"]}, {five.id, forty.id})
+
+        response = self.client.get(reverse("offer-list"), {"min_discount": 100, "discount_unit": "rub"})
+        self.assertEqual([item["discount"] for item in response.data["results"]], ["Скидка 250 ₽"])
+
+    def test_unit_next_to_number(self):
+        """Тест фильтра по акции с порогом заказа: единица берется у числа скидки"""
+        response = self.client.post(
+            reverse("offer-list"),
+            {
+                "title": "Пицца",
+                "description": "Описание",
+                "discount": "При заказе от 1500 ₽ скидка 20%",
+                "valid_from": date.today(),
+                "valid_to": date.today() + timedelta(days=30),
+                "city_id": self.defaults["city"].id,
+                "category_id": self.defaults["category"].id,
+                "partner_id": self.defaults["partner"].id,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["discount_value"], response.data["discount_unit"]), ("20.00", "percent"))
+
+        response = self.client.get(reverse("offer-list"), {"min_discount": 100})
+        self.assertEqual(response.data["results"], [])
+
+    def test_value_out_of_range(self):
+        """Тест числа больше discount_value: акция сохраняется без числовой скидки, а не с ошибкой 500"""
+        response = self.client.post(
+            reverse("offer-list"),
+            {
+                "title": "Акция",
+                "description": "Описание",
+                "discount": "Скидка 10000000000000 ₽",
+                "valid_from": date.today(),
+                "valid_to": date.today() + timedelta(days=30),
+                "city_id": self.defaults["city"].id,
+                "category_id": self.defaults["category"].id,
+                "partner_id": self.defaults["partner"].id,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        offer = Offer.objects.get(pk=response.data["id"])
+        self.assertEqual((offer.discount_value, offer.discount_unit), (0, ""))
+
+    def test_ordering_by_discount_is_numeric(self):
+        """Тест сортировки ?ordering=discount по числу, а не по строке"""
+        for discount in ("40%", "5%", "100%"):
+            self.create(discount)
+
+        response = self.client.get(reverse("offer-list"), {"ordering": "discount"})
+        self.assertEqual([item["discount"] for item in response.data["results"]], ["5%", "40%", "100%"])
+        response = self.client.get(reverse("offer-list"), {"ordering": "-discount"})
+        self.assertEqual([item["discount"] for item in response.data["results"]], ["100%", "40%", "5%"])
+
+
+@override_settings(PROMO_API_CACHE_TIMEOUT=300)
+class ApiResponseCacheTest(APITestCase):
+    """
+    Тесты кэша ответов API: попадания по URL с query string и сброс по таблицам
+    (сигналы моделей и события wal-listener).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.city = City.objects.create(name="Уфа")
+        self.partner = Partner.objects.create(name="Партнер", description="")
+        self.offer = Offer.objects.create(
+            title="Акция",
+            description="Описание",
+            discount="10%",
+            valid_from=date.today(),
+            valid_to=date.today() + timedelta(days=30),
+            city=self.city,
+            category=Category.objects.create(name="Еда"),
+            partner=self.partner,
+        )
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_repeated_request_served_from_cache(self):
+        """Тест повторного запроса без обращения к БД и отдельного ключа для другого query string"""
+        for url in (reverse("offer-list"), reverse("city-list"), reverse("offer-active")):
+            with self.subTest(url=url):
+                first, response = self.count_queries(url)
+                second, cached = self.count_queries(url)
+                self.assertGreater(first, 0)
+                self.assertEqual(second, 0)
+                self.assertEqual(cached.data, response.data)
+
+        queries, _ = self.count_queries(reverse("offer-list"), {"ordering": "discount"})
+        self.assertGreater(queries, 0)
+
+    def test_model_change_invalidates_dependent_lists(self):
+        """Тест сброса: изменение партнера сбрасывает списки акций, но не список городов"""
+        offers_url, cities_url = reverse("offer-list"), reverse("city-list")
+        self.count_queries(offers_url)
+        self.count_queries(cities_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.partner.name = "Новый партнер"
+            self.partner.save()
+
+        queries, response = self.count_queries(offers_url)
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.data["results"][0]["partner"]["name"], "Новый партнер")
+        self.assertEqual(self.count_queries(cities_url)[0], 0)
+
+    def test_api_write_invalidates_list(self):
+        """Тест сброса после изменения акции через API"""
+        self.count_queries(reverse("offer-list"))
+        self.client.patch(reverse("offer-detail", args=[self.offer.id]), {"title": "Новая акция"}, format="json")
+
+        _, response = self.count_queries(reverse("offer-list"))
+        self.assertEqual(response.data["results"][0]["title"], "Новая акция")
+
+    def test_wal_event_invalidates_list(self):
+        """Тест сброса по событию wal-listener для изменения в обход ORM"""
+        self.count_queries(reverse("offer-list"))
+        Offer.objects.filter(id=self.offer.id).update(title="Изменено через SQL")
+        self.assertEqual(self.count_queries(reverse("offer-list"))[0], 0)
+
+        event = SimpleNamespace(value={"action": "UPDATE", "table": "promo_offer", "data": {"id": self.offer.id}})
+        consumer = mock.Mock()
+        consumer.poll.side_effect = [{"wal_listener.promo_offers": [event]}, KeyboardInterrupt]
+        kafka = SimpleNamespace(KafkaConsumer=mock.Mock(return_value=consumer))
+        with mock.patch.dict(sys.modules, {"kafka": kafka}):
+            call_command("consume_wal_invalidations", stdout=mock.Mock())
+
+        consumer.close.assert_called_once()
+        _, response = self.count_queries(reverse("offer-list"))
+        self.assertEqual(response.data["results"][0]["title"], "Изменено через SQL")
+
+    def test_changed_tables_from_wal_batch(self):
+        """Тест выбора таблиц из пачки событий: только таблицы promo, некорректные сообщения пропускаются"""
+        records = [
+            SimpleNamespace(value={"table": "promo_partner", "action": "UPDATE"}),
+            SimpleNamespace(value={"table": "promo_telegramsubscription", "action": "INSERT"}),
+            SimpleNamespace(value=None),
+        ]
+        self.assertEqual(changed_tables(records), {"promo_partner"})
+
+    @override_settings(PROMO_API_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        """Тест выключения кэша через PROMO_API_CACHE_TIMEOUT=0"""
+        self.count_queries(reverse("city-list"))
+        self.assertGreater(self.count_queries(reverse("city-list"))[0], 0)
+
+
+@override_settings(PROMO_API_CACHE_TIMEOUT=0)
+class ConditionalGetTest(APITestCase):
+    """
+    Тесты условных запросов: ETag и Last-Modified по версиям таблиц, ответ 304 без запросов к БД
+    (кэш ответов выключен, чтобы 304 не объяснялся попаданием в него).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.city = City.objects.create(name="Уфа")
+        self.partner = Partner.objects.create(name="Партнер", description="")
+        self.offer = Offer.objects.create(
+            title="Акция",
+            description="Описание",
+            discount="10%",
+            valid_from=date.today(),
+            valid_to=date.today() + timedelta(days=30),
+            city=self.city,
+            category=Category.objects.create(name="Еда"),
+            partner=self.partner,
+        )
+
+    def test_not_modified_without_queries(self):
+        """Тест ответа 304 на If-None-Match для списков и объектов всех ViewSet"""
+        urls = [
+            reverse("offer-list"),
+            reverse("offer-detail", args=[self.offer.id]),
+            reverse("offer-active"),
+            reverse("city-list"),
+            reverse("category-list"),
+            reverse("partner-detail", args=[self.partner.id]),
+            reverse("partner-active-offers", args=[self.partner.id]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("no-cache", response["Cache-Control"])
+
+                with self.assertNumQueries(0):
+                    not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified["ETag"], response["ETag"])
+                self.assertFalse(not_modified.content)
+
+    def test_if_modified_since(self):
+        """Тест ответа 304 на If-Modified-Since"""
+        url = reverse("city-list")
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_change_updates_etag(self):
+        """Тест смены ETag после изменения таблицы: зависящие ответы отдаются заново, остальные - нет"""
+        offers_url, cities_url = reverse("offer-list"), reverse("city-list")
+        offers_etag = self.client.get(offers_url)["ETag"]
+        cities_etag = self.client.get(cities_url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.partner.name = "Новый партнер"
+            self.partner.save()
+
+        response = self.client.get(offers_url, HTTP_IF_NONE_MATCH=offers_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], offers_etag)
+        self.assertEqual(response.data["results"][0]["partner"]["name"], "Новый партнер")
+        self.assertEqual(self.client.get(cities_url, HTTP_IF_NONE_MATCH=cities_etag).status_code, 304)
+
+    def test_etag_depends_on_format(self):
+        """Тест разных ETag для JSON и browsable API"""
+        url = reverse("city-list")
+        json_etag = self.client.get(url, HTTP_ACCEPT="application/json")["ETag"]
+        html_etag = self.client.get(url, HTTP_ACCEPT="text/html")["ETag"]
+        self.assertNotEqual(json_etag, html_etag)
+
+
+class OfferReadSerializerTest(APITestCase):
+    """
+    Тесты быстрого сериализатора для чтения: ответ совпадает с OfferSerializer.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        city = City.objects.create(name="Уфа")
+        category = Category.objects.create(name="Еда")
+        partner = Partner.objects.create(name="Партнер", description="Описание партнера")
+        today = date.today()
+        for index, (valid_from, valid_to) in enumerate(
+            [(today, today + timedelta(days=5)), (today - timedelta(days=10), today - timedelta(days=1))]
+        ):
+            Offer.objects.create(
+                title=f"Акция {index}",
+                description="Описание",
+                discount="Скидка 250 ₽" if index else "15%",
+                promo_code=None if index else "PROMO",
+                valid_from=valid_from,
+                valid_to=valid_to,
+                city=city,
+                category=category,
+                partner=partner,
+                image="" if index else "offer_images/offer.jpg",
+            )
+
+    def expected(self, request):
+        offers = Offer.objects.with_related().order_by("-valid_from", "-id")
+        return OfferSerializer(offers, many=True, context={"request": request}).data
+
+    def test_list_matches_model_serializer(self):
+        """Тест списка, действия и просмотра акции: те же поля и значения, что у OfferSerializer"""
+        response = self.client.get(reverse("offer-list"))
+        expected = self.expected(response.wsgi_request)
+        self.assertEqual(response.data["results"], expected)
+        self.assertEqual(response.data["results"][0]["image"], "http://testserver/media/offer_images/offer.jpg")
+        self.assertEqual(self.client.get(reverse("offer-expiring-soon")).data["results"], expected[:1])
+
+        detail = self.client.get(reverse("offer-detail", args=[expected[1]["id"]]))
+        self.assertEqual(detail.data, expected[1])
+        self.assertEqual(self.client.get(reverse("offer-detail", args=[0])).status_code, 404)
+
+    def test_nested_objects_shared(self):
+        """Тест вложенных объектов: один словарь на город, категорию и партнера"""
+        rows = OfferReadSerializer.values_queryset(Offer.objects.all())
+        first, second = OfferReadSerializer(rows, many=True).data
+        self.assertIs(first["partner"], second["partner"])
+
+    def test_browsable_api(self):
+        """Тест браузерного API: форма создания строится по OfferSerializer"""
+        for url in (reverse("offer-list"), reverse("offer-detail", args=[Offer.objects.first().id])):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_ACCEPT="text/html")
+                self.assertContains(response, "Акция")
+                self.assertContains(response, 'name="city_id"')
+
+
+class OfferExportTest(APITestCase):
+    """
+    Тесты потоковой выгрузки каталога акций (/api/offers/export/).
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.city = City.objects.create(name="Уфа")
+        other_city = City.objects.create(name="Москва")
+        category = Category.objects.create(name="Еда")
+        partner = Partner.objects.create(name="Партнер", description="")
+        for index in range(5):
+            Offer.objects.create(
+                title=f"Акция {index}",
+                description="Описание",
+                discount=f"{10 + index}%",
+                valid_from=date.today() - timedelta(days=index),
+                valid_to=date.today() + timedelta(days=30),
+                city=self.city if index % 2 else other_city,
+                category=category,
+                partner=partner,
+            )
+
+    def export(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("offer-export"), params)
+            content = b"".join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if "COUNT(" in query["sql"]])
+        return response, content
+
+    @override_settings(PROMO_EXPORT_CHUNK_SIZE=2)
+    def test_json_array(self):
+        """Тест JSON-массива: все акции в порядке списка, как в ответе списка"""
+        response, content = self.export()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn('filename="offers.json"', response["Content-Disposition"])
+        expected = self.client.get(reverse("offer-list")).json()["results"]
+        self.assertEqual(json.loads(content), expected)
+
+    @override_settings(PROMO_EXPORT_CHUNK_SIZE=2)
+    def test_ndjson_with_filters(self):
+        """Тест NDJSON с фильтром, поиском и сортировкой"""
+        response, content = self.export({"format": "ndjson", "city": self.city.id, "ordering": "discount"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = content.splitlines()
+        self.assertEqual([json.loads(line)["title"] for line in lines], ["Акция 1", "Акция 3"])
+        self.assertTrue(content.endswith("\n"))
+
+        _, content = self.export({"format": "ndjson", "search": "Акция"})
+        self.assertEqual(len(content.splitlines()), 5)
+
+    def test_empty_and_invalid(self):
+        """Тест пустой выгрузки и ошибки фильтра"""
+        self.assertEqual(json.loads(self.export({"search": "кинотеатр"})[1]), [])
+        response = self.client.get(reverse("offer-export"), {"format": "ndjson", "min_discount": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("min_discount", json.loads(response.content))
+
+
+class OfferBulkTest(APITestCase):
+    """
+    Тесты пакетной записи акций (/api/offers/bulk/).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse("offer-bulk")
+        self.city = City.objects.create(name="Уфа")
+        self.category = Category.objects.create(name="Еда")
+        self.partner = Partner.objects.create(name="Партнер", description="")
+
+    def item(self, index, **overrides):
+        return {
+            "title": f"Акция {index}",
+            "description": "Описание",
+            "discount": f"{index}%",
+            "valid_from": str(date.today()),
+            "valid_to": str(date.today() + timedelta(days=10)),
+            "city_id": self.city.id,
+            "category_id": self.category.id,
+            "partner_id": self.partner.id,
+            **overrides,
+        }
+
+    def post(self, items):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, items, format="json")
+        return response, len(queries)
+
+    def test_create(self):
+        """Тест создания: bulk_create, числовая скидка, число запросов не зависит от размера пакета"""
+        response, small = self.post([self.item(index) for index in range(1, 3)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([offer["title"] for offer in response.data], ["Акция 1", "Акция 2"])
+        self.assertEqual(response.data[0]["city"], {"id": self.city.id, "name": "Уфа"})
+
+        response, large = self.post([self.item(index) for index in range(3, 30)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(small, large)
+        self.assertEqual(Offer.objects.count(), 29)
+        self.assertEqual(Offer.objects.get(title="Акция 25").discount_value, Decimal("25"))
+
+    def test_create_item_errors(self):
+        """Тест ошибок по позициям: пакет с ошибками не записывается"""
+        items = [
+            self.item(1),
+            self.item(2, city_id=0),
+            self.item(3, valid_from=str(date.today() + timedelta(days=30))),
+            self.item(4, partner_id="abc"),
+        ]
+        response, _ = self.post(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("city_id", response.data[1])
+        self.assertIn("non_field_errors", response.data[2])
+        self.assertIn("partner_id", response.data[3])
+        self.assertFalse(Offer.objects.exists())
+
+        self.assertEqual(self.post([])[0].status_code, 400)
+        self.assertEqual(self.post({"title": "Не список"})[0].status_code, 400)
+
+    def test_update(self):
+        """Тест частичного обновления с пересчетом скидки и ошибками по id"""
+        self.post([self.item(1), self.item(2)])
+        first, second = Offer.objects.order_by("id")
+        other = City.objects.create(name="Москва")
+        response = self.client.patch(
+            self.url,
+            [{"id": first.id, "discount": "Скидка 300 ₽"}, {"id": second.id, "title": "Новая", "city_id": other.id}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[1]["city"]["name"], "Москва")
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.discount_value, first.discount_unit), (Decimal("300"), "rub"))
+        self.assertEqual((second.title, second.city, second.discount), ("Новая", other, "2%"))
+
+        response = self.client.patch(self.url, [{"id": 0, "title": "Нет"}, {"title": "Без id"}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("id", response.data[0])
+        self.assertIn("id", response.data[1])
+
+        response = self.client.patch(self.url, [{"id": first.id}, {"id": first.id}], format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_delete(self):
+        """Тест удаления по списку id: неизвестный id отменяет удаление"""
+        self.post([self.item(1), self.item(2), self.item(3)])
+        ids = list(Offer.objects.values_list("id", flat=True))
+        response = self.client.delete(self.url, [ids[0], 0], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(1, response.data)
+        self.assertEqual(Offer.objects.count(), 3)
+
+        response = self.client.delete(self.url, ids[:2], format="json")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Offer.objects.values_list("id", flat=True)), ids[2:])
+
+    def delete(self, ids):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.delete(self.url, ids, format="json")
+        return response, len(queries), len(callbacks)
+
+    def test_delete_constant_overhead(self):
+        """Тест удаления: число запросов и сбросов кэша не зависит от размера пакета"""
+        self.post([self.item(index) for index in range(1, 31)])
+        ids = list(Offer.objects.order_by("id").values_list("id", flat=True))
+        response, small_queries, small_callbacks = self.delete(ids[:2])
+        self.assertEqual(response.status_code, 204)
+        response, large_queries, large_callbacks = self.delete(ids[2:])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((small_queries, small_callbacks), (large_queries, large_callbacks))
+        self.assertEqual(large_callbacks, 1)
+        self.assertFalse(Offer.objects.exists())
+
+    @override_settings(PROMO_API_CACHE_TIMEOUT=300)
+    def test_invalidates_cache(self):
+        """Тест сброса кэша списка после пакетной записи и удаления (они не отправляют сигналы)"""
+        self.client.get(reverse("offer-list"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post([self.item(1)])
+        self.assertEqual(self.client.get(reverse("offer-list")).data["count"], 1)
+        self.delete([Offer.objects.get().id])
+        self.assertEqual(self.client.get(reverse("offer-list")).data["count"], 0)
+
+
+class ImportOffersTest(TestCase):
+    """
+    Тесты команды import_offers (COPY во временную таблицу и обновление по естественному ключу).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(name="Уфа")
+        self.category = Category.objects.create(name="Еда")
+        self.partner = Partner.objects.create(name="Пиццерия", description="Описание")
+
+    def write_file(self, suffix, text):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w", encoding="utf-8") as stream:
+            stream.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def ndjson_row(self, **overrides):
+        row = {
+            "title": "Кофе",
+            "discount": "10%",
+            "valid_from": "2026-01-01",
+            "valid_to": "2026-12-31",
+            "city": "Уфа",
+            "category": "Еда",
+            "partner": "Пиццерия",
+        }
+        return json.dumps({**row, **overrides}, ensure_ascii=False)
+
+    def import_offers(self, path, **options):
+        output = io.StringIO()
+        call_command("import_offers", path, stdout=output, **options)
+        return output.getvalue()
+
+    def test_csv_insert_and_update(self):
+        """Тест CSV: добавление, повторный импорт обновляет акции по (партнер, город, название)"""
+        header = "title,description,discount,promo_code,valid_from,valid_to,city,category,partner\n"
+        path = self.write_file(
+            ".csv",
+            header
+            + "Пицца,\"Скидка, на пиццу\",20%,PIZZA,2026-01-01,2026-12-31,Уфа,Еда,Пиццерия\n"
+            + "Суши,,Скидка 300 ₽,,2026-01-01,2026-06-30,Казань,Рестораны,Суши-бар\n",
+        )
+        output = self.import_offers(path, chunk_size=1)
+        self.assertIn("Обработано строк: 2", output)
+        self.assertIn("добавлено акций 2, обновлено 0", output)
+
+        pizza = Offer.objects.get(title="Пицца")
+        self.assertEqual((pizza.city, pizza.partner, pizza.description), (self.city, self.partner, "Скидка, на пиццу"))
+        self.assertEqual((pizza.discount_value, pizza.discount_unit), (Decimal("20"), "percent"))
+        sushi = Offer.objects.get(title="Суши")
+        self.assertEqual((sushi.city.name, sushi.category.name, sushi.partner.name), ("Казань", "Рестораны", "Суши-бар"))
+        self.assertIsNone(sushi.promo_code)
+        self.assertEqual(sushi.discount_unit, "rub")
+
+        path = self.write_file(
+            ".csv",
+            header
+            + "Пицца,Новое описание,30%,PIZZA,2026-01-01,2027-01-31,Уфа,Еда,Пиццерия\n"
+            + "Суши,,Скидка 300 ₽,,2026-01-01,2026-06-30,Казань,Рестораны,Суши-бар\n",
+        )
+        self.assertIn("добавлено акций 0, обновлено 1", self.import_offers(path))
+        pizza.refresh_from_db()
+        self.assertEqual((pizza.description, pizza.discount_value), ("Новое описание", Decimal("30")))
+        self.assertEqual(pizza.valid_to, date(2027, 1, 31))
+        self.assertEqual(Offer.objects.count(), 2)
+
+    def test_ndjson_duplicate_key(self):
+        """Тест NDJSON: из повторов ключа в файле побеждает последняя строка; поиск по новой акции"""
+        rows = [self.ndjson_row(discount="10%"), self.ndjson_row(discount="15%")]
+        path = self.write_file(".ndjson", "\n".join(rows) + "\n\n")
+        self.import_offers(path)
+        self.assertEqual(list(Offer.objects.values_list("discount", flat=True)), ["15%"])
+        self.assertEqual(search_offers(Offer.objects.all(), "кофе").count(), 1)
+
+    def test_discount_out_of_range(self):
+        """Тест скидки больше discount_value: строка импортируется без числовой скидки"""
+        path = self.write_file(".ndjson", self.ndjson_row(discount="Скидка 10000000000000 ₽") + "\n")
+        self.import_offers(path)
+        offer = Offer.objects.get()
+        self.assertEqual((offer.discount_value, offer.discount_unit), (0, ""))
+
+    def test_invalid_row(self):
+        """Тест ошибки в строке: номер строки в сообщении, импорт откатывается целиком"""
+        path = self.write_file(
+            ".csv",
+            "title,discount,valid_from,valid_to,city,category,partner\n"
+            "Пицца,20%,2026-01-01,2026-12-31,Уфа,Еда,Пиццерия\n"
+            "Суши,20%,31.12.2026,2026-12-31,Уфа,Еда,Пиццерия\n",
+        )
+        with self.assertRaisesMessage(CommandError, "Строка 3: даты"):
+            self.import_offers(path, chunk_size=1)
+        self.assertFalse(Offer.objects.exists())
+
+    def test_invalidates_cache(self):
+        """Тест сброса кэша списков после импорта"""
+        client = APIClient()
+        self.assertEqual(client.get(reverse("offer-list")).data["count"], 0)
+        path = self.write_file(".ndjson", self.ndjson_row())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_offers(path)
+        self.assertEqual(client.get(reverse("offer-list")).data["count"], 1)
+
+
+class SeedCatalogueTest(TestCase):
+    """
+    Тесты команды seed_catalogue (синтетический каталог для бенчмарков и EXPLAIN-тестов).
+    """
+
+    def seed(self, **options):
+        options = {
+            "cities": 5,
+            "categories": 4,
+            "partners": 20,
+            "offers": 600,
+            "subscriptions": 50,
+            "base_date": date(2026, 1, 15),
+            "chunk_size": 250,
+            "clear": True,
+            **options,
+        }
+        call_command("seed_catalogue", stdout=io.StringIO(), **options)
+
+    def snapshot(self):
+        return (
+            list(Offer.objects.order_by("id").values_list()),
+            list(Partner.objects.order_by("id").values_list("id", "name", "description")),
+            list(TelegramSubscription.objects.order_by("id").values_list()),
+        )
+
+    def test_counts_and_consistency(self):
+        """Тест размеров, числовой скидки и сроков акций"""
+        City.objects.create(name="Старый город")
+        self.seed()
+        self.assertEqual(City.objects.count(), 5)
+        self.assertFalse(City.objects.filter(name="Старый город").exists())
+        self.assertEqual(Category.objects.count(), 4)
+        self.assertEqual(Partner.objects.count(), 20)
+        self.assertEqual(Offer.objects.count(), 600)
+        self.assertEqual(TelegramSubscription.objects.count(), 50)
+
+        for offer in Offer.objects.all():
+            self.assertEqual((offer.discount_value, offer.discount_unit), parse_discount(offer.discount))
+            self.assertLess(offer.valid_from, offer.valid_to)
+        base = date(2026, 1, 15)
+        self.assertTrue(Offer.objects.filter(valid_to__lt=base).exists())
+        self.assertTrue(Offer.objects.filter(valid_from__lte=base, valid_to__gte=base).exists())
+        self.assertTrue(search_offers(Offer.objects.all(), "скидка").exists())
+
+    def test_skewed_cities(self):
+        """Тест перекоса: первый (популярный) город получает больше акций, чем последний"""
+        self.seed()
+        counts = dict(Offer.objects.values_list("city__name").annotate(count=Count("id")))
+        self.assertGreater(counts["Москва"], 3 * counts.get("Казань", 0))
+
+    def test_repeat_without_clear(self):
+        """Тест повторного запуска без --clear: каталог добавляется, user_id подписок не пересекаются"""
+        TelegramSubscription.objects.create(user_id=100_000_005)
+        self.seed(clear=False)
+        self.seed(clear=False)
+        self.assertEqual(City.objects.count(), 10)
+        self.assertEqual(Offer.objects.count(), 1200)
+        self.assertEqual(TelegramSubscription.objects.count(), 101)
+
+    def test_deterministic(self):
+        """Тест детерминированности: одинаковые параметры дают одинаковые данные, другой seed - другие"""
+        self.seed(seed=7)
+        first = self.snapshot()
+        self.seed(seed=7)
+        self.assertEqual(self.snapshot(), first)
+        self.seed(seed=8)
+        self.assertNotEqual(self.snapshot()[0], first[0])
+
+
+class CitiesCacheTest(TestCase):
+    """
+    Тесты кэша городов в памяти процесса (контекстный процессор и представления).
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(name="Уфа")
+
+    def test_cities_loaded_once(self):
+        """Тест повторного получения городов без запроса к БД"""
+        self.assertEqual(get_cities(), [self.city])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cities(), [self.city])
+
+    def test_city_write_invalidates(self):
+        """Тест перечитывания после изменения городов"""
+        get_cities()
+        with self.captureOnCommitCallbacks(execute=True):
+            moscow = City.objects.create(name="Москва")
+        self.assertEqual(get_cities(), [self.city, moscow])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            moscow.delete()
+        self.assertEqual(get_cities(), [self.city])
+
+    def test_page_render_without_city_queries(self):
+        """Тест страниц: города в контексте и меню без запросов к promo_city"""
+        client = Client()
+        client.get(reverse("category_list"))
+        for url in (reverse("category_list"), reverse("all_offers"), reverse("search") + "?q=акция"):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(list(response.context["cities"]), [self.city])
+                self.assertContains(response, "Уфа")
+                self.assertFalse([query for query in queries if 'FROM "promo_city"' in query["sql"]])
+
+
+
+class ImageVariantsTest(APITestCase):
+    """
+    Тесты уменьшенных копий изображений (WebP/JPEG для srcset) и команды build_image_variants.
+    """
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, PROMO_IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media.name
+
+        self.city = City.objects.create(name="Уфа")
+        self.category = Category.objects.create(name="Еда")
+        self.partner = Partner.objects.create(name="Партнер", description="Описание")
+
+    def upload(self, width, height=None, name="photo.png"):
+        buffer = io.BytesIO()
+        Image.new("RGBA", (width, height or width // 2), (200, 50, 50, 128)).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def create_offer(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = Offer.objects.create(
+                title="Пицца",
+                description="Скидка на пиццу",
+                discount="10%",
+                valid_from=date.today(),
+                valid_to=date.today() + timedelta(days=10),
+                city=self.city,
+                category=self.category,
+                partner=self.partner,
+                image=image,
+            )
+        offer.refresh_from_db()
+        return offer
+
+    def widths(self, variants, fmt):
+        return {
+            int(width): Image.open(os.path.join(self.media_root, path)).size[0]
+            for width, path in variants[fmt].items()
+        }
+
+    def test_variants_created_after_save(self):
+        """Тест создания вариантов всех ширин в WebP и JPEG после сохранения"""
+        offer = self.create_offer(self.upload(2000))
+        self.assertEqual(offer.image_variants["source"], offer.image.name)
+        for fmt in ("webp", "jpeg"):
+            self.assertEqual(self.widths(offer.image_variants, fmt), {320: 320, 640: 640, 1280: 1280})
+        self.assertEqual(Image.open(os.path.join(self.media_root, offer.image_variants["jpeg"]["320"])).mode, "RGB")
+
+    def test_same_stem_different_extension(self):
+        """Тест изображений с одним именем и разными расширениями: варианты не перезаписывают друг друга"""
+        png = self.create_offer(self.upload(800, name="sale.png"))
+        buffer = io.BytesIO()
+        Image.new("RGB", (900, 300), (10, 200, 10)).save(buffer, "JPEG")
+        jpg = self.create_offer(SimpleUploadedFile("sale.jpg", buffer.getvalue(), content_type="image/jpeg"))
+        png.refresh_from_db()
+
+        self.assertEqual(os.path.basename(png.image_variants["webp"]["320"]), "sale.png-320.webp")
+        self.assertEqual(os.path.basename(jpg.image_variants["webp"]["320"]), "sale.jpg-320.webp")
+        self.assertEqual(self.widths(png.image_variants, "webp"), {320: 320, 640: 640, 800: 800})
+        self.assertEqual(self.widths(jpg.image_variants, "webp"), {320: 320, 640: 640, 900: 900})
+
+    def test_small_image_not_upscaled(self):
+        """Тест маленького изображения: варианты не больше оригинала"""
+        offer = self.create_offer(self.upload(500))
+        self.assertEqual(self.widths(offer.image_variants, "webp"), {320: 320, 500: 500})
+
+    def test_srcset_in_api_and_pages(self):
+        """Тест srcset в ответах API и <picture> на страницах"""
+        offer = self.create_offer(self.upload(800))
+        response = self.client.get(reverse("offer-detail", args=[offer.id]))
+        srcset = response.json()["image_srcset"]
+        self.assertEqual(set(srcset), {"webp", "jpeg"})
+        self.assertIn("-320.webp 320w", srcset["webp"])
+        self.assertIn("-800.jpg 800w", srcset["jpeg"])
+        self.assertEqual(
+            OfferSerializer(offer).data["image_srcset"],
+            {fmt: value.replace("http://testserver", "") for fmt, value in srcset.items()},
+        )
+
+        client = Client()
+        for url in (reverse("offer_detail", args=[offer.id]), reverse("all_offers")):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertContains(response, '<source type="image/webp"')
+                self.assertContains(response, "-640.webp 640w")
+
+    def test_image_replaced_and_cleared(self):
+        """Тест новых вариантов при замене изображения и их удаления вместе с изображением"""
+        offer = self.create_offer(self.upload(800))
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.image = self.upload(400, name="other.png")
+            offer.save()
+        offer.refresh_from_db()
+        self.assertEqual(offer.image_variants["source"], offer.image.name)
+        self.assertEqual(self.widths(offer.image_variants, "webp"), {320: 320, 400: 400})
+
+        offer.image = None
+        offer.save()
+        offer.refresh_from_db()
+        self.assertEqual(offer.image_variants, {})
+        self.assertIsNone(self.client.get(reverse("offer-detail", args=[offer.id])).json()["image_srcset"])
+
+    def test_broken_image_skipped(self):
+        """Тест поврежденного файла: ошибка в журнале, акция без вариантов"""
+        image = SimpleUploadedFile("broken.png", b"not an image", content_type="image/png")
+        with self.assertLogs("promo.images", "ERROR"):
+            offer = self.create_offer(image)
+        self.assertEqual(offer.image_variants, {})
+
+    def test_build_image_variants_command(self):
+        """Тест команды: варианты создаются только для изображений без них"""
+        offer = self.create_offer(self.upload(700))
+        Offer.objects.filter(pk=offer.pk).update(image_variants={})
+        processed = self.create_offer(self.upload(700, name="done.png"))
+
+        output = io.StringIO()
+        call_command("build_image_variants", "--model", "offer", "--workers", "1", stdout=output)
+        self.assertIn("готово, изображений 1, ошибок 0", output.getvalue())
+        offer.refresh_from_db()
+        self.assertEqual(offer.image_variants["source"], offer.image.name)
+        self.assertEqual(self.widths(offer.image_variants, "jpeg"), {320: 320, 640: 640, 700: 700})
+
+        output = io.StringIO()
+        call_command("build_image_variants", "--model", "offer", "--workers", "1", "--force", stdout=output)
+        self.assertIn("готово, изображений 2, ошибок 0", output.getvalue())
+        self.assertEqual(Offer.objects.get(pk=processed.pk).image_variants["source"], processed.image.name)
+
+
+@override_settings(PROMO_API_CACHE_TIMEOUT=0)
+class AsyncViewsTest(TestCase):
+    """
+    Тесты асинхронных представлений чтения (ufanet_project.async_urls, ASGI):
+    ответы совпадают с синхронными, запись и browsable API обрабатывают ViewSet.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(name="Уфа")
+        other_city = City.objects.create(name="Москва")
+        self.category = Category.objects.create(name="Еда")
+        self.partner = Partner.objects.create(name="Партнер", description="Описание партнера")
+        today = date.today()
+        self.offers = [
+            Offer.objects.create(
+                title=f"Акция {index:02}",
+                description="Скидка на пиццу" if index % 3 == 0 else "Скидка на кофе",
+                discount=f"{5 + index}%",
+                valid_from=today - timedelta(days=index),
+                valid_to=today + timedelta(days=10),
+                city=self.city if index % 2 else other_city,
+                category=self.category,
+                partner=self.partner,
+            )
+            for index in range(25)
+        ]
+
+    def async_get(self, url, **headers):
+        with override_settings(ROOT_URLCONF="ufanet_project.async_urls"):
+            return async_to_sync(self.async_client.get)(url, headers=headers)
+
+    def assertSameResponse(self, url, **headers):
+        expected = self.client.get(url, headers=headers)
+        response = self.async_get(url, **headers)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response["Content-Type"], expected["Content-Type"])
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.get("ETag"), expected.get("ETag"))
+        return response
+
+    def test_async_routes(self):
+        """Тест маршрутов ASGI: чтение через асинхронные представления, действия - через ViewSet"""
+        for url in ("/api/offers/", f"/api/offers/{self.offers[0].id}/", "/api/cities/", "/offers/", "/search/"):
+            with self.subTest(url=url):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(url, "ufanet_project.async_urls").func))
+        for url in ("/api/offers/active/", "/api/offers/export/", "/api/offers.json", "/admin/"):
+            with self.subTest(url=url):
+                self.assertFalse(asyncio.iscoroutinefunction(resolve(url, "ufanet_project.async_urls").func))
+
+    def test_api_responses_match_sync(self):
+        """Тест API: те же данные, ссылки пагинации, ошибки и ETag, что у синхронных ViewSet"""
+        urls = [
+            "/api/offers/",
+            "/api/offers/?page=3",
+            "/api/offers/?page=last",
+            "/api/offers/?pagination=cursor",
+            f"/api/offers/?city={self.city.id}&ordering=discount",
+            "/api/offers/?search=pizza",
+            "/api/offers/?min_discount=10&max_discount=20&active=true",
+            f"/api/offers/{self.offers[3].id}/",
+            "/api/cities/",
+            "/api/cities/?search=Уф",
+            f"/api/categories/{self.category.id}/",
+            "/api/partners/",
+            # Ошибки: несуществующий город, страница и акция
+            "/api/offers/?city=999999",
+            "/api/offers/?page=100",
+            "/api/offers/?cursor=invalid",
+            "/api/offers/0/",
+            "/api/offers/abc/",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertSameResponse(url)
+
+        first = self.async_get("/api/offers/?pagination=cursor").json()
+        self.assertSameResponse(first["next"].removeprefix("http://testserver"))
+
+    def test_search_matches_sync(self):
+        """Тест полнотекстового поиска: порядок по релевантности, как у синхронного списка"""
+        # ?search=пицц
+        response = self.assertSameResponse("/api/offers/?search=%D0%BF%D0%B8%D1%86%D1%86")
+        self.assertEqual(response.json()["count"], 9)
+
+    def test_conditional_get(self):
+        """Тест условного запроса: 304 по ETag без обращения к БД"""
+        response = self.async_get("/api/offers/")
+        with self.assertNumQueries(0):
+            not_modified = self.async_get("/api/offers/", if_none_match=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    @override_settings(PROMO_API_CACHE_TIMEOUT=60)
+    def test_response_cache_shared_with_sync(self):
+        """Тест кэша ответов: асинхронное чтение использует тот же кэш, что и ViewSet"""
+        expected = self.client.get("/api/offers/").json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.async_get("/api/offers/").json(), expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.filter(pk=self.offers[0].pk).update(title="Новое название")
+            invalidate_tables_on_commit("promo_offer")
+        self.assertEqual(self.async_get("/api/offers/").json()["results"][0]["title"], "Новое название")
+
+    def test_write_and_browsable_api_fallback(self):
+        """Тест записи и browsable API через асинхронный маршрут: обрабатывает синхронный ViewSet"""
+        with override_settings(ROOT_URLCONF="ufanet_project.async_urls"):
+            client = Client(enforce_csrf_checks=True)
+            response = client.post(
+                "/api/cities/", {"name": "Казань"}, content_type="application/json", HTTP_HOST="testserver"
+            )
+            self.assertEqual(response.status_code, 201)
+            response = client.delete(f"/api/cities/{response.json()['id']}/")
+            self.assertEqual(response.json()["action"], "DELETE")
+
+        response = self.async_get("/api/offers/", accept="text/html")
+        self.assertContains(response, 'name="city_id"')
+
+    def test_pages_match_sync(self):
+        """Тест страниц сайта: тот же HTML, что у синхронных представлений, и 404"""
+        after = self.client.get("/offers/").context["next_after"]
+        urls = [
+            "/",
+            "/offers/",
+            "/offers/?page=2",
+            f"/offers/?after={after}",
+            f"/category/{self.category.id}/",
+            f"/category/{self.category.id}/?city={self.city.id}",
+            f"/offer/{self.offers[0].id}/",
+            "/search/?q=кофе",
+            "/search/",
+            "/offers/?page=100",
+            "/offers/?after=bad",
+            "/category/0/",
+            "/offer/0/",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertSameResponse(url)
+
+        response = self.async_get("/search/?q=кофе")
+        self.assertEqual(len(response.context["offers"]), 16)
+        self.assertEqual(list(response.context["cities"]), list(City.objects.order_by("id")))
+
+    @override_settings(PROMO_ASYNC_DB_CONCURRENCY=1, ROOT_URLCONF="ufanet_project.async_urls")
+    def test_db_concurrency_limit(self):
+        """Тест PROMO_ASYNC_DB_CONCURRENCY: запрос ждет, пока место занято, затем обрабатывается"""
+
+        async def run():
+            async with db_slot():
+                api = asyncio.ensure_future(self.async_client.get("/api/offers/"))
+                page = asyncio.ensure_future(self.async_client.get(f"/offer/{self.offers[0].id}/"))
+                await asyncio.sleep(0.05)
+                self.assertFalse(api.done() or page.done())
+            return await api, await page
+
+        for response in async_to_sync(run)():
+            self.assertEqual(response.status_code, 200)
@@ -1,7 +1,7 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import async_views, views
 from .views import CategoryViewSet, CityViewSet, OfferViewSet, PartnerViewSet
 
 # Роутер для API endpoints
@@ -24,3 +24,31 @@ urlpatterns = [
     # API endpoints
     path("api/", include(router.urls)),  # Все API endpoints через роутер
 ]
+
+# URL patterns для ASGI (ufanet_project.async_urls, PROMO_ASYNC_VIEWS): страницы сайта и
+# чтение списков и объектов API через асинхронные представления
+async_urlpatterns = [
+    path("", async_views.AsyncCategoryListView.as_view(), name="category_list"),
+    path("category/<int:category_id>/", async_views.AsyncOfferListListView.as_view(), name="offer_list"),
+    path("offer/<int:offer_id>/", async_views.AsyncOfferDetailView.as_view(), name="offer_detail"),
+    path("search/", async_views.AsyncSearchOffersListView.as_view(), name="search"),
+    path("offers/", async_views.AsyncAllOffersListView.as_view(), name="all_offers"),
+    # Маршруты роутера в том же порядке (действия раньше detail); у list и detail без суффикса
+    # формата - асинхронное представление, остальные (действия, .json) остаются синхронными
+    path(
+        "api/",
+        include(
+            [
+                re_path(
+                    pattern.pattern.regex.pattern,
+                    async_views.AsyncAPIReadView.as_view(fallback=pattern.callback),
+                    name=pattern.name,
+                )
+                if getattr(pattern.callback, "actions", {}).get("get") in ("list", "retrieve")
+                and "format" not in pattern.pattern.regex.groupindex
+                else pattern
+                for pattern in router.urls
+            ]
+        ),
+    ),
+]
@@ -1,21 +1,38 @@
+from django.conf import settings
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Q
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
 from django.views.generic import DetailView, ListView
 from django_filters import rest_framework as django_filters
-from rest_framework import filters, status, viewsets
+from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .cache import OFFER_TABLES, CachedReadMixin, cache_response, invalidate_tables_on_commit
+from .discounts import PERCENT
+from .export import NDJSONRenderer, stream_offers
 from .models import Category, City, Offer, Partner
-from .serializers import CategorySerializer, CitySerializer, OfferSerializer, PartnerSerializer
-
-
-class CategoryListView(ListView):
+from .pagination import LoadMoreMixin, get_offer_paginator
+from .search import OfferOrderingFilter, OfferSearchFilter, search_offers
+from .serializers import (
+    CategorySerializer,
+    CitySerializer,
+    OfferIdListField,
+    OfferReadSerializer,
+    OfferSerializer,
+    PartnerSerializer,
+    related_pk,
+)
+
+
+class CategoryListView(LoadMoreMixin, ListView):
     """
     Отображает список всех категорий акций.
-    Использует пагинацию для оптимизации загрузки данных.
+    Использует пагинацию для оптимизации загрузки данных,
+    с ?after= - режим "Показать еще" без COUNT(*) и OFFSET.
     """
 
     model = Category
@@ -24,27 +41,29 @@ class CategoryListView(ListView):
     paginate_by = 8
 
 
-class AllOffersListView(ListView):
+class AllOffersListView(LoadMoreMixin, ListView):
     """
     Представление для отображения всех акций с возможностью фильтрации по городу.
-    Реализует пагинацию и фильтрацию на стороне сервера.
+    Реализует пагинацию и фильтрацию на стороне сервера,
+    с ?after= - режим "Показать еще" без COUNT(*) и OFFSET.
     """
 
     model = Offer
     template_name = "promo/offer_list.html"
     context_object_name = "offers"
     paginate_by = 6
+    keyset_field = "title"
 
     def get_queryset(self):
         """Возвращает отсортированный по названию queryset всех акций."""
-        return Offer.objects.all().order_by("title")
+        return Offer.objects.with_related().order_by("title")
 
     def get_context_data(self, **kwargs):
         """
-        Расширяет контекст данными о городах и выбранном городе для фильтрации.
+        Расширяет контекст выбранным городом для фильтрации
+        (список городов добавляет контекстный процессор cities_processor).
         """
         context = super().get_context_data(**kwargs)
-        context["cities"] = City.objects.all()
         city_id = self.request.GET.get("city")
         if city_id:
             context["selected_city"] = city_id
@@ -67,20 +86,22 @@ class OfferListListView(ListView):
         Проверяет валидность city_id перед фильтрацией.
         """
         category_id = self.kwargs["category_id"]
-        queryset = Offer.objects.filter(category__id=category_id)
+        queryset = Offer.objects.with_related().filter(category__id=category_id)
         city_id = self.request.GET.get("city")
         if city_id and city_id.isdigit():
             queryset = queryset.filter(city_id=city_id)
         return queryset
 
+    def get_category(self):
+        """Категория страницы; 404, если ее нет."""
+        return get_object_or_404(Category, id=self.kwargs["category_id"])
+
     def get_context_data(self, **kwargs):
         """
-        Добавляет в контекст данные о категории, городах и выбранном городе.
+        Добавляет в контекст данные о категории и выбранном городе.
         """
         context = super().get_context_data(**kwargs)
-        category_id = self.kwargs["category_id"]
-        context["category"] = get_object_or_404(Category, id=category_id)
-        context["cities"] = City.objects.all()
+        context["category"] = self.get_category()
         city_id = self.request.GET.get("city")
         if city_id:
             context["selected_city"] = city_id
@@ -94,6 +115,7 @@ class OfferDetailView(DetailView):
     """
 
     model = Offer
+    queryset = Offer.objects.with_related()
     template_name = "promo/offer_detail.html"
     context_object_name = "offer"
     pk_url_kwarg = "offer_id"
@@ -103,6 +125,7 @@ class SearchOffersListView(ListView):
     """
     Реализует поиск акций по названию, описанию и имени партнера.
     Поддерживает фильтрацию по городу и пагинацию результатов.
+    Поиск полнотекстовый (см. search_offers), результаты упорядочены по релевантности.
     """
 
     model = Offer
@@ -112,16 +135,16 @@ class SearchOffersListView(ListView):
     def get_queryset(self):
         """
         Выполняет поиск по нескольким полям с учетом фильтра по городу.
-        Использует Q-объекты для построения сложных запросов.
+        Использует полнотекстовый поиск Postgres с русской морфологией и поиском по префиксу.
         """
-        queryset = Offer.objects.all()
+        queryset = Offer.objects.with_related()
         query = self.request.GET.get("q")
         city = self.request.GET.get("city")
 
         if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) | Q(description__icontains=query) | Q(partner__name__icontains=query)
-            )
+            queryset = search_offers(queryset, query)
+            if "search_rank" in queryset.query.annotations:
+                queryset = queryset.order_by("-search_rank", "-valid_from", "-id")
 
         if city and city.isdigit():
             queryset = queryset.filter(city_id=city)
@@ -130,18 +153,31 @@ class SearchOffersListView(ListView):
 
     def get_context_data(self, **kwargs):
         """
-        Добавляет в контекст поисковый запрос и данные для фильтрации по городу.
+        Добавляет в контекст поисковый запрос и выбранный город.
         """
         context = super().get_context_data(**kwargs)
         context["query"] = self.request.GET.get("q", "")
-        context["cities"] = City.objects.all()
         city_id = self.request.GET.get("city")
         if city_id:
             context["selected_city"] = city_id
         return context
 
 
-class CityViewSet(viewsets.ModelViewSet):
+class OfferListActionMixin:
+    """
+    Общая выдача списков акций для дополнительных действий ViewSet.
+    Действия возвращают акции постранично, как и основной список.
+    """
+
+    def offers_response(self, queryset):
+        """Возвращает страницу акций (по номеру страницы или курсором, см. get_offer_paginator)."""
+        paginator = get_offer_paginator(self.request)
+        page = paginator.paginate_queryset(OfferReadSerializer.values_queryset(queryset), self.request, view=self)
+        serializer = OfferReadSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+
+class CityViewSet(CachedReadMixin, OfferListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с городами через API.
     Поддерживает поиск по названию и получение акций для конкретного города.
@@ -151,6 +187,7 @@ class CityViewSet(viewsets.ModelViewSet):
     serializer_class = CitySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ["name"]
+    cache_tables = ("promo_city",)
 
     # def destroy(self, request, *args, **kwargs):
     #     instance = self.get_object()
@@ -176,15 +213,15 @@ class CityViewSet(viewsets.ModelViewSet):
         )
 
     @action(detail=True, methods=["get"])
+    @cache_response(OFFER_TABLES)
     def offers(self, request, pk=None):
         """Возвращает список всех акций для выбранного города."""
         city = self.get_object()
-        offers = Offer.objects.filter(city=city)
-        serializer = OfferSerializer(offers, many=True)
-        return Response(serializer.data)
+        offers = Offer.objects.with_related().filter(city=city)
+        return self.offers_response(offers)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReadMixin, OfferListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с категориями через API.
     Поддерживает поиск по названию и получение акций по категории.
@@ -194,17 +231,18 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ["name"]
+    cache_tables = ("promo_category",)
 
     @action(detail=True, methods=["get"])
+    @cache_response(OFFER_TABLES)
     def offers(self, request, pk=None):
         """Возвращает список всех акций в выбранной категории."""
         category = self.get_object()
-        offers = Offer.objects.filter(category=category)
-        serializer = OfferSerializer(offers, many=True)
-        return Response(serializer.data)
+        offers = Offer.objects.with_related().filter(category=category)
+        return self.offers_response(offers)
 
 
-class PartnerViewSet(viewsets.ModelViewSet):
+class PartnerViewSet(CachedReadMixin, OfferListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с партнерами через API.
     Поддерживает поиск по названию и описанию, получение активных акций.
@@ -214,14 +252,17 @@ class PartnerViewSet(viewsets.ModelViewSet):
     serializer_class = PartnerSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ["name", "description"]
+    cache_tables = ("promo_partner",)
 
     @action(detail=True, methods=["get"])
+    @cache_response(OFFER_TABLES)
     def active_offers(self, request, pk=None):
         """Возвращает список активных акций для выбранного партнера."""
         partner = self.get_object()
-        offers = Offer.objects.filter(partner=partner, valid_from__lte=timezone.now(), valid_to__gte=timezone.now())
-        serializer = OfferSerializer(offers, many=True)
-        return Response(serializer.data)
+        offers = Offer.objects.with_related().filter(
+            partner=partner, valid_from__lte=timezone.now(), valid_to__gte=timezone.now()
+        )
+        return self.offers_response(offers)
 
 
 class OfferFilter(django_filters.FilterSet):
@@ -231,13 +272,23 @@ class OfferFilter(django_filters.FilterSet):
     диапазону скидок и статусу активности.
     """
 
-    min_discount = django_filters.NumberFilter(field_name="discount", lookup_expr="gte")
-    max_discount = django_filters.NumberFilter(field_name="discount", lookup_expr="lte")
+    min_discount = django_filters.NumberFilter(method="filter_discount")
+    max_discount = django_filters.NumberFilter(method="filter_discount")
+    discount_unit = django_filters.ChoiceFilter(field_name="discount_unit", choices=Offer.DISCOUNT_UNIT_CHOICES)
     active = django_filters.BooleanFilter(method="filter_active")
 
     class Meta:
         model = Offer
-        fields = ["city", "category", "partner", "min_discount", "max_discount", "active"]
+        fields = ["city", "category", "partner", "min_discount", "max_discount", "discount_unit", "active"]
+
+    def filter_discount(self, queryset, name, value):
+        """
+        Фильтрует акции по числовому значению скидки (индекс по единице и значению).
+        Значения сравниваются в пределах одной единицы: discount_unit, по умолчанию проценты.
+        """
+        unit = self.form.cleaned_data.get("discount_unit") or PERCENT
+        lookup = "gte" if name == "min_discount" else "lte"
+        return queryset.filter(discount_unit=unit, **{f"discount_value__{lookup}": value})
 
     def filter_active(self, queryset, name, value):
         """
@@ -249,32 +300,112 @@ class OfferFilter(django_filters.FilterSet):
         return queryset
 
 
-class OfferViewSet(viewsets.ModelViewSet):
+class OfferViewSet(CachedReadMixin, OfferListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet для работы с акциями через API.
     Поддерживает фильтрацию, поиск, сортировку и специальные действия.
     """
 
-    queryset = Offer.objects.all()
+    queryset = Offer.objects.with_related()
     serializer_class = OfferSerializer
-    filter_backends = [django_filters.DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [django_filters.DjangoFilterBackend, OfferSearchFilter, OfferOrderingFilter]
     filterset_class = OfferFilter
+    # Поиск полнотекстовый по search_vector (название, описание, промокод, партнер);
+    # search_fields нужен для формы поиска в браузерном API
     search_fields = ["title", "description", "promo_code"]
-    ordering_fields = ["valid_from", "valid_to", "discount"]
-    ordering = ["-valid_from"]
+    # ?ordering=discount сортирует по числовому значению скидки (см. OfferOrderingFilter)
+    ordering_fields = ["valid_from", "valid_to", "discount_value"]
+    # id - уникальный ключ для стабильного порядка акций с одинаковой датой начала
+    ordering = ["-valid_from", "-id"]
+    cache_tables = OFFER_TABLES
+
+    def is_read_request(self):
+        """
+        Чтение списка или акции: такие запросы идут через OfferReadSerializer по строкам .values().
+        Формы browsable API и OPTIONS используют OfferSerializer (запрос с другим методом).
+        """
+        return self.action in ("list", "retrieve") and self.request.method in permissions.SAFE_METHODS
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.is_read_request():
+            return OfferReadSerializer.values_queryset(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.is_read_request():
+            return OfferReadSerializer
+        return super().get_serializer_class()
+
+    @property
+    def paginator(self):
+        """Пагинация списка: по номеру страницы или курсором (?pagination=cursor), см. get_offer_paginator."""
+        if not hasattr(self, "_paginator"):
+            self._paginator = get_offer_paginator(self.request)
+        return self._paginator
+
+    @action(detail=False, methods=["post", "patch", "delete"])
+    def bulk(self, request):
+        """
+        Пакетная запись акций (до PROMO_BULK_MAX_SIZE за запрос, одна транзакция):
+        POST - список новых акций, PATCH - список изменений с id, DELETE - список id.
+        При ошибках возвращает 400 с ошибками по позициям элементов и ничего не записывает.
+        """
+        max_length = settings.PROMO_BULK_MAX_SIZE
+        if request.method == "DELETE":
+            ids = OfferIdListField(allow_empty=False, max_length=max_length).run_validation(request.data)
+            queryset = Offer.objects.filter(pk__in=ids)
+            with transaction.atomic():
+                # Одним DELETE без загрузки строк и сигналов post_delete по каждой акции
+                # (на акции нет внешних ключей); кэш сбрасывается один раз, как при bulk_create
+                queryset._raw_delete(queryset.db)
+                invalidate_tables_on_commit("promo_offer")
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == "POST":
+            serializer = self.get_serializer(data=request.data, many=True, allow_empty=False, max_length=max_length)
+        else:
+            items = request.data if isinstance(request.data, list) else []
+            ids = [related_pk(Offer, item.get("id")) for item in items[:max_length] if isinstance(item, dict)]
+            offers = list(Offer.objects.with_related().filter(pk__in=[pk for pk in ids if pk is not None]))
+            serializer = self.get_serializer(
+                offers, data=request.data, many=True, partial=True, allow_empty=False, max_length=max_length
+            )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED if request.method == "POST" else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=["get"], renderer_classes=[JSONRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Выгрузка всего каталога акций с фильтрами, поиском и сортировкой списка, без пагинации.
+        ?format=ndjson - по акции на строку, иначе JSON-массив. Ответ потоковый и не кэшируется.
+        """
+        queryset = OfferReadSerializer.values_queryset(self.filter_queryset(Offer.objects.with_related()))
+        serializer = OfferReadSerializer(context=self.get_serializer_context())
+        ndjson = request.accepted_renderer.format == NDJSONRenderer.format
+        response = StreamingHttpResponse(
+            stream_offers(queryset, serializer, ndjson), content_type=request.accepted_renderer.media_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="offers.{request.accepted_renderer.format}"'
+        return response
 
     @action(detail=False, methods=["get"])
+    @cache_response()
     def active(self, request):
         """Возвращает список всех активных акций."""
-        offers = Offer.objects.filter(valid_from__lte=timezone.now(), valid_to__gte=timezone.now())
-        serializer = self.get_serializer(offers, many=True)
-        return Response(serializer.data)
+        offers = Offer.objects.with_related().filter(
+            valid_from__lte=timezone.now(), valid_to__gte=timezone.now()
+        )
+        return self.offers_response(offers)
 
     @action(detail=False, methods=["get"])
+    @cache_response()
     def expiring_soon(self, request):
         """Возвращает список акций, срок действия которых истекает в течение недели."""
-        offers = Offer.objects.filter(
+        offers = Offer.objects.with_related().filter(
             valid_to__gte=timezone.now(), valid_to__lte=timezone.now() + timezone.timedelta(days=7)
         )
-        serializer = self.get_serializer(offers, many=True)
-        return Response(serializer.data)
+        return self.offers_response(offers)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ufanet_project.settings")
+# Под ASGI чтение обслуживают асинхронные представления (ufanet_project.async_urls)
+os.environ.setdefault("PROMO_ASYNC_VIEWS", "True")
 
 application = get_asgi_application()
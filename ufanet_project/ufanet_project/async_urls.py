@@ -0,0 +1,17 @@
+"""
+URL configuration for ufanet_project under ASGI (PROMO_ASYNC_VIEWS).
+
+Те же маршруты, что в urls.py, но страницы сайта и чтение API обслуживают
+асинхронные представления (promo.urls.async_urlpatterns).
+"""
+
+from django.urls import include, path
+
+from promo.urls import async_urlpatterns
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("", include(async_urlpatterns)),
+    *sync_urlpatterns,
+]
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "promo.apps.PromoConfig",
     "rest_framework",
     "django_filters",
@@ -69,7 +70,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "ufanet_project.urls"
+# Асинхронные представления чтения (promo.async_views) вместо синхронных;
+# asgi.py включает их по умолчанию, WSGI и manage.py runserver используют синхронные
+PROMO_ASYNC_VIEWS = os.getenv("PROMO_ASYNC_VIEWS", "False") == "True"
+# Сколько асинхронных запросов процесса одновременно работают с БД: под ASGI у каждого
+# запроса свое соединение, остальные ждут очереди; 0 - без ограничения
+PROMO_ASYNC_DB_CONCURRENCY = int(os.getenv("PROMO_ASYNC_DB_CONCURRENCY", "20"))
+
+ROOT_URLCONF = "ufanet_project.async_urls" if PROMO_ASYNC_VIEWS else "ufanet_project.urls"
 
 TEMPLATES = [
     {
@@ -150,13 +158,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Тесты с тегом "slow" выполняются только при явном python manage.py test --tag slow
+TEST_RUNNER = "ufanet_project.test_runner.TestRunner"
+
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "promo.pagination.ApproximateCountPageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
@@ -165,3 +176,41 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
 }
+
+# Порог, начиная с которого количество записей в пагинации берется из статистики
+# Postgres (reltuples/EXPLAIN), а не считается COUNT(*). 0 - всегда точный COUNT(*).
+PROMO_APPROXIMATE_COUNT_THRESHOLD = int(os.getenv("PROMO_APPROXIMATE_COUNT_THRESHOLD", "0"))
+
+# Кэш. По умолчанию - память процесса; для нескольких процессов web и сброса кэша
+# по событиям wal-listener нужен общий кэш, например CACHE_URL=redis://redis:6379/1
+CACHE_URL = os.getenv("CACHE_URL")
+if CACHE_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "promo"}}
+
+# Время жизни закэшированных ответов API в секундах; 0 - кэш ответов выключен.
+# Без общего кэша по умолчанию выключен: в памяти процесса запись сбрасывает кэш только
+# того процесса web, который ее обработал, остальные отдавали бы устаревшие ответы
+PROMO_API_CACHE_TIMEOUT = int(os.getenv("PROMO_API_CACHE_TIMEOUT", "300" if CACHE_URL else "0"))
+
+# Размер пачки строк серверного курсора при выгрузке /api/offers/export/
+PROMO_EXPORT_CHUNK_SIZE = int(os.getenv("PROMO_EXPORT_CHUNK_SIZE", "2000"))
+
+# Максимум акций в одном запросе пакетной записи /api/offers/bulk/
+PROMO_BULK_MAX_SIZE = int(os.getenv("PROMO_BULK_MAX_SIZE", "1000"))
+
+# Ширины уменьшенных копий изображений акций и иконок категорий (srcset) и число потоков,
+# которые их создают после сохранения; 0 - создавать сразу в потоке запроса
+PROMO_IMAGE_WIDTHS = [320, 640, 1280]
+PROMO_IMAGE_WORKERS = int(os.getenv("PROMO_IMAGE_WORKERS", "2"))
+
+# Kafka с событиями wal-listener для команды consume_wal_invalidations
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+PROMO_WAL_TOPICS = [
+    "wal_listener.promo_offers",
+    "wal_listener.promo_categories",
+    "wal_listener.cities",
+    "wal_listener.partners",
+]
+
@@ -0,0 +1,13 @@
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Стандартный запуск тестов Django, который по умолчанию пропускает тесты с тегом "slow"
+    (EXPLAIN-тесты на 1 млн акций). Они выполняются только при явном --tag slow.
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if not tags:
+            exclude_tags = {*(exclude_tags or ()), "slow"}
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)